@@ -17,10 +17,16 @@ from homeassistant.core import callback
 from homeassistant.helpers.selector import (
     BooleanSelector,
     BooleanSelectorConfig,
+    LabelSelector,
+    LabelSelectorConfig,
     NumberSelector,
     NumberSelectorConfig,
+    NumberSelectorMode,
+    ObjectSelector,
+    ObjectSelectorConfig,
     SelectSelector,
     SelectSelectorConfig,
+    SelectSelectorMode,
     TargetSelector,
     TargetSelectorConfig,
     TextSelector,
@@ -29,18 +35,43 @@ from homeassistant.helpers.selector import (
 )
 
 from custom_components.elasticsearch.const import (
+    ADVANCED_OPTION_DEFAULTS,
+    CONF_AGGREGATION_DOMAINS,
+    CONF_AGGREGATION_LABELS,
+    CONF_AGGREGATION_WINDOW,
     CONF_AUTHENTICATION_TYPE,
+    CONF_BULK_COMPRESSION_THRESHOLD,
+    CONF_BULK_MAX_IN_FLIGHT,
     CONF_CHANGE_DETECTION_TYPE,
+    CONF_CHANGED_ATTRIBUTES_ONLY,
+    CONF_DEAD_LETTER_DATASTREAM,
+    CONF_DEADBAND_DEVICE_CLASSES,
+    CONF_DEADBAND_LABELS,
+    CONF_DEADBAND_MAX_SILENCE,
+    CONF_DOMAIN_RATE_LIMIT,
+    CONF_ENTITY_RATE_LIMIT,
     CONF_EXCLUDE_TARGETS,
+    CONF_FORMAT_IN_EXECUTOR,
+    CONF_IGNORED_ATTRIBUTE_CHANGES,
     CONF_INCLUDE_TARGETS,
     CONF_POLLING_FREQUENCY,
+    CONF_POLLING_MAX_AGE,
+    CONF_POLLING_SHARDS,
+    CONF_PUBLISH_FLUSH_THRESHOLD,
     CONF_PUBLISH_FREQUENCY,
+    CONF_PUBLISH_MAX_FREQUENCY,
+    CONF_QUEUE_MAX_SIZE,
+    CONF_QUEUE_OVERFLOW_POLICY,
+    CONF_SPILL_MAX_SIZE,
+    CONF_SPILL_TO_DISK,
     CONF_SSL_CA_PATH,
     CONF_SSL_VERIFY_HOSTNAME,
     CONF_TAGS,
     CONF_TARGETS_TO_EXCLUDE,
     CONF_TARGETS_TO_INCLUDE,
+    ONE_HOUR,
     ONE_MINUTE,
+    QueueOverflowPolicy,
     StateChangeType,
 )
 from custom_components.elasticsearch.const import DOMAIN as ELASTIC_DOMAIN
@@ -387,15 +418,63 @@ class ElasticOptionsFlowHandler(config_entries.OptionsFlow):
         if user_input is not None:
             self.options.update(user_input)
 
-            self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+            if self.show_advanced_options:
+                return await self.async_step_advanced()
 
-            return self.async_create_entry(title="", data=self.options)
+            return self._async_save_options()
 
         return self.async_show_form(
             step_id="options",
             data_schema=self._build_options_schema(),
         )
 
+    @async_log_enter_exit_debug
+    async def async_step_advanced(
+        self,
+        user_input: dict | None = None,
+    ) -> ConfigFlowResult:
+        """Advanced Options, only offered to users with advanced mode enabled."""
+        errors: dict[str, str] = {}
+
+        if user_input is not None:
+            for key in (CONF_DEADBAND_DEVICE_CLASSES, CONF_DEADBAND_LABELS):
+                if not self._valid_deadbands(user_input.get(key, {})):
+                    errors[key] = "invalid_deadband"
+
+            if not errors:
+                self.options.update(user_input)
+
+                return self._async_save_options()
+
+        return self.async_show_form(
+            step_id="advanced",
+            data_schema=self._build_advanced_options_schema(),
+            errors=errors,
+        )
+
+    @callback
+    def _async_save_options(self) -> ConfigFlowResult:
+        """Reload the integration with the updated options."""
+        self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+
+        return self.async_create_entry(title="", data=self.options)
+
+    @staticmethod
+    def _valid_deadbands(thresholds: Any) -> bool:
+        """Return True if every deadband threshold is an absolute number or a percentage like "5%"."""
+        if not isinstance(thresholds, dict):
+            return False
+
+        for threshold in thresholds.values():
+            if isinstance(threshold, bool):
+                return False
+            try:
+                float(threshold.strip().removesuffix("%") if isinstance(threshold, str) else threshold)
+            except (TypeError, ValueError):
+                return False
+
+        return True
+
     @log_enter_exit_debug
     def _build_options_schema(self) -> vol.Schema:
         """Build the options schema."""
@@ -479,3 +558,145 @@ class ElasticOptionsFlowHandler(config_entries.OptionsFlow):
                 ),
             }
         )
+
+    @log_enter_exit_debug
+    def _build_advanced_options_schema(self) -> vol.Schema:
+        """Build the advanced options schema."""
+
+        def schema(key: str) -> dict[str, Any]:
+            return {"schema": key, "default": self.options.get(key, ADVANCED_OPTION_DEFAULTS[key])}
+
+        return vol.Schema(
+            {
+                vol.Optional(**schema(CONF_QUEUE_MAX_SIZE)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=1000000,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="events",
+                    )
+                ),
+                vol.Optional(**schema(CONF_QUEUE_OVERFLOW_POLICY)): SelectSelector(
+                    SelectSelectorConfig(
+                        translation_key="queue_overflow_policy",
+                        options=[policy.value for policy in QueueOverflowPolicy],
+                        mode=SelectSelectorMode.DROPDOWN,
+                    )
+                ),
+                vol.Optional(**schema(CONF_SPILL_TO_DISK)): BooleanSelector(
+                    BooleanSelectorConfig(),
+                ),
+                vol.Optional(**schema(CONF_SPILL_MAX_SIZE)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=1024 * 1024,
+                        max=10 * 1024 * 1024 * 1024,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="bytes",
+                    )
+                ),
+                vol.Optional(**schema(CONF_BULK_MAX_IN_FLIGHT)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=1,
+                        max=8,
+                        step=1,
+                    )
+                ),
+                vol.Optional(**schema(CONF_BULK_COMPRESSION_THRESHOLD)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=100 * 1024 * 1024,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="bytes",
+                    )
+                ),
+                vol.Optional(**schema(CONF_PUBLISH_FLUSH_THRESHOLD)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=1000000,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="events",
+                    )
+                ),
+                vol.Optional(**schema(CONF_PUBLISH_MAX_FREQUENCY)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=3600,
+                        step=10,
+                        unit_of_measurement="seconds",
+                    )
+                ),
+                vol.Optional(**schema(CONF_POLLING_MAX_AGE)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=24 * ONE_HOUR,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="seconds",
+                    )
+                ),
+                vol.Optional(**schema(CONF_POLLING_SHARDS)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=1,
+                        max=60,
+                        step=1,
+                    )
+                ),
+                vol.Optional(**schema(CONF_AGGREGATION_WINDOW)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=3600,
+                        step=10,
+                        unit_of_measurement="seconds",
+                    )
+                ),
+                vol.Optional(**schema(CONF_AGGREGATION_DOMAINS)): SelectSelector(
+                    SelectSelectorConfig(options=[], custom_value=True, multiple=True)
+                ),
+                vol.Optional(**schema(CONF_AGGREGATION_LABELS)): LabelSelector(
+                    LabelSelectorConfig(multiple=True),
+                ),
+                vol.Optional(**schema(CONF_DEADBAND_DEVICE_CLASSES)): ObjectSelector(
+                    ObjectSelectorConfig(),
+                ),
+                vol.Optional(**schema(CONF_DEADBAND_LABELS)): ObjectSelector(
+                    ObjectSelectorConfig(),
+                ),
+                vol.Optional(**schema(CONF_DEADBAND_MAX_SILENCE)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=24 * ONE_HOUR,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="seconds",
+                    )
+                ),
+                vol.Optional(**schema(CONF_IGNORED_ATTRIBUTE_CHANGES)): SelectSelector(
+                    SelectSelectorConfig(options=[], custom_value=True, multiple=True)
+                ),
+                vol.Optional(**schema(CONF_CHANGED_ATTRIBUTES_ONLY)): BooleanSelector(
+                    BooleanSelectorConfig(),
+                ),
+                vol.Optional(**schema(CONF_ENTITY_RATE_LIMIT)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=1000,
+                        step=0.1,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="events/second",
+                    )
+                ),
+                vol.Optional(**schema(CONF_DOMAIN_RATE_LIMIT)): NumberSelector(
+                    NumberSelectorConfig(
+                        min=0,
+                        max=1000,
+                        step=0.1,
+                        mode=NumberSelectorMode.BOX,
+                        unit_of_measurement="events/second",
+                    )
+                ),
+                vol.Optional(**schema(CONF_FORMAT_IN_EXECUTOR)): BooleanSelector(
+                    BooleanSelectorConfig(),
+                ),
+                vol.Optional(**schema(CONF_DEAD_LETTER_DATASTREAM)): BooleanSelector(
+                    BooleanSelectorConfig(),
+                ),
+            }
+        )
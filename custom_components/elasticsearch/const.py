@@ -9,6 +9,16 @@ ELASTIC_DOMAIN: str = "elasticsearch"
 
 ELASTIC_MINIMUM_VERSION: tuple[int, int] = (8, 14)
 
+# Seconds the capabilities probed from the cluster info are cached for
+CAPABILITIES_CACHE_TTL: int = 3600
+
+# Seconds a successful response from the cluster stands in for a ping when checking the connection
+PASSIVE_HEALTH_TTL: int = 300
+
+# Seconds to wait before the first attempt to reconnect to an unreachable cluster, doubling up to the maximum
+RECONNECT_BACKOFF_MIN: int = 5
+RECONNECT_BACKOFF_MAX: int = 300
+
 CONF_PUBLISH_FREQUENCY: str = "publish_frequency"
 CONF_POLLING_FREQUENCY: str = "polling_frequency"
 CONF_AUTHENTICATION_TYPE: str = "authentication_type"
@@ -28,12 +38,75 @@ CONF_SSL_CA_PATH: str = "ssl_ca_path"
 
 CONF_TAGS: str = "tags"
 
+CONF_QUEUE_MAX_SIZE: str = "queue_max_size"
+CONF_QUEUE_OVERFLOW_POLICY: str = "queue_overflow_policy"
+
+CONF_SPILL_TO_DISK: str = "spill_to_disk"
+CONF_SPILL_MAX_SIZE: str = "spill_max_size"
+
+CONF_BULK_MAX_IN_FLIGHT: str = "bulk_max_in_flight"
+CONF_BULK_COMPRESSION_THRESHOLD: str = "bulk_compression_threshold"
+
+CONF_PUBLISH_FLUSH_THRESHOLD: str = "publish_flush_threshold"
+CONF_PUBLISH_MAX_FREQUENCY: str = "publish_max_frequency"
+
+CONF_POLLING_MAX_AGE: str = "polling_max_age"
+CONF_POLLING_SHARDS: str = "polling_shards"
+
+CONF_AGGREGATION_WINDOW: str = "aggregation_window"
+CONF_AGGREGATION_DOMAINS: str = "aggregation_domains"
+CONF_AGGREGATION_LABELS: str = "aggregation_labels"
+
+CONF_DEADBAND_DEVICE_CLASSES: str = "deadband_device_classes"
+CONF_DEADBAND_LABELS: str = "deadband_labels"
+CONF_DEADBAND_MAX_SILENCE: str = "deadband_max_silence"
+
+CONF_IGNORED_ATTRIBUTE_CHANGES: str = "ignored_attribute_changes"
+CONF_CHANGED_ATTRIBUTES_ONLY: str = "changed_attributes_only"
+
+CONF_ENTITY_RATE_LIMIT: str = "entity_rate_limit"
+CONF_DOMAIN_RATE_LIMIT: str = "domain_rate_limit"
+
+CONF_FORMAT_IN_EXECUTOR: str = "format_in_executor"
+
+CONF_DEAD_LETTER_DATASTREAM: str = "dead_letter_datastream"
+
 # For trimming keys with values that are None, empty lists, or empty objects
 SKIP_VALUES = [None, [], {}]
 
 ONE_MINUTE: int = 60
 ONE_HOUR: int = 60 * 60
 
+SPILL_DEFAULT_MAX_SIZE: int = 100 * 1024 * 1024
+
+# Defaults of the advanced options, which config entries only store once they are changed
+ADVANCED_OPTION_DEFAULTS: MappingProxyType[str, Any] = MappingProxyType(
+    {
+        CONF_QUEUE_MAX_SIZE: 0,
+        CONF_QUEUE_OVERFLOW_POLICY: "drop_oldest",
+        CONF_SPILL_TO_DISK: False,
+        CONF_SPILL_MAX_SIZE: SPILL_DEFAULT_MAX_SIZE,
+        CONF_BULK_MAX_IN_FLIGHT: 1,
+        CONF_BULK_COMPRESSION_THRESHOLD: 0,
+        CONF_PUBLISH_FLUSH_THRESHOLD: 0,
+        CONF_PUBLISH_MAX_FREQUENCY: 0,
+        CONF_POLLING_MAX_AGE: 0,
+        CONF_POLLING_SHARDS: 1,
+        CONF_AGGREGATION_WINDOW: 0,
+        CONF_AGGREGATION_DOMAINS: [],
+        CONF_AGGREGATION_LABELS: [],
+        CONF_DEADBAND_DEVICE_CLASSES: {},
+        CONF_DEADBAND_LABELS: {},
+        CONF_DEADBAND_MAX_SILENCE: 0,
+        CONF_IGNORED_ATTRIBUTE_CHANGES: [],
+        CONF_CHANGED_ATTRIBUTES_ONLY: False,
+        CONF_ENTITY_RATE_LIMIT: 0,
+        CONF_DOMAIN_RATE_LIMIT: 0,
+        CONF_FORMAT_IN_EXECUTOR: False,
+        CONF_DEAD_LETTER_DATASTREAM: False,
+    }
+)
+
 DATASTREAM_TYPE: str = "metrics"
 DATASTREAM_DATASET_PREFIX: str = "homeassistant"
 DATASTREAM_NAMESPACE: str = "default"
@@ -41,6 +114,10 @@ DATASTREAM_NAMESPACE: str = "default"
 # Set to match the datastream prefix name
 DATASTREAM_METRICS_INDEX_TEMPLATE_NAME: str = DATASTREAM_TYPE + "-" + DATASTREAM_DATASET_PREFIX
 
+# Documents rejected by Elasticsearch, covered by the same privileges as the metrics datastreams
+DATASTREAM_DEAD_LETTER_DATASET: str = DATASTREAM_DATASET_PREFIX + ".dead_letter"
+DATASTREAM_DEAD_LETTER_INDEX_TEMPLATE_NAME: str = DATASTREAM_TYPE + "-" + DATASTREAM_DEAD_LETTER_DATASET
+
 PUBLISH_REASON_POLLING: str = "Polling"
 PUBLISH_REASON_STATE_CHANGE: str = "State change"
 PUBLISH_REASON_ATTR_CHANGE: str = "Attribute change"
@@ -84,6 +161,14 @@ class StateChangeType(Enum):
         return PUBLISH_REASON_POLLING
 
 
+class QueueOverflowPolicy(Enum):
+    """Behavior of a bounded event queue when an event arrives and the queue is full."""
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    COALESCE = "coalesce"
+
+
 class CAPABILITIES:
     """Elasticsearch CAPABILITIES constants."""
 
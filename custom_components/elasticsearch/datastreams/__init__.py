@@ -1,5 +1,6 @@
 """datastreams module for Elasticsearch integration."""
 
+from .dead_letter_template import dead_letter_index_template_definition
 from .index_template import index_template_definition
 
-__all__ = ["index_template_definition"]
+__all__ = ["dead_letter_index_template_definition", "index_template_definition"]
@@ -0,0 +1,50 @@
+"""Defines the index template for the dead letter data stream."""
+
+from typing import Any
+
+# Takes precedence over the Home Assistant metrics template, which also matches the dead letter data stream
+dead_letter_index_template_definition: dict[str, Any] = {
+    "index_patterns": ["metrics-homeassistant.dead_letter-*"],
+    "template": {
+        "mappings": {
+            "dynamic": "false",
+            "properties": {
+                "@timestamp": {"type": "date"},
+                "data_stream": {
+                    "properties": {
+                        "type": {"type": "constant_keyword", "value": "metrics"},
+                        "dataset": {"type": "constant_keyword"},
+                        "namespace": {"type": "constant_keyword"},
+                    }
+                },
+                "hass": {
+                    "properties": {
+                        "entity": {
+                            "properties": {
+                                "id": {"type": "keyword"},
+                                "rejections": {"type": "long"},
+                            }
+                        }
+                    }
+                },
+                "error": {
+                    "properties": {
+                        "type": {"type": "keyword"},
+                        "message": {"type": "match_only_text"},
+                    }
+                },
+                "event": {
+                    "properties": {
+                        # The rejected document is kept in _source only, so it can never be rejected again
+                        "original": {"type": "keyword", "index": False, "doc_values": False},
+                    }
+                },
+            },
+        },
+        "settings": {"codec": "best_compression"},
+        "lifecycle": {"data_retention": "30d"},
+    },
+    "priority": 501,
+    "data_stream": {},
+    "version": 1,
+}
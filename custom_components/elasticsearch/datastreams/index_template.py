@@ -65,6 +65,17 @@ index_template_definition: dict[str, Any] = {
                                         "integer": {"ignore_malformed": True, "type": "integer"},
                                     }
                                 },
+                                "aggregation": {
+                                    "type": "object",
+                                    "properties": {
+                                        "min": {"type": "float"},
+                                        "max": {"type": "float"},
+                                        "avg": {"type": "float"},
+                                        "last": {"type": "float"},
+                                        "count": {"type": "long"},
+                                        "start": {"type": "date"},
+                                    },
+                                },
                                 "platform": {"type": "keyword"},
                                 "unit_of_measurement": {"type": "keyword"},
                                 "state": {"properties": {"class": {"type": "keyword"}}},
@@ -147,5 +158,5 @@ index_template_definition: dict[str, Any] = {
     "ignore_missing_component_templates": "metrics-homeassistant@custom",
     "priority": 500,
     "data_stream": {},
-    "version": 5,
+    "version": 6,
 }
@@ -1,9 +1,23 @@
 """Custom JSON encoder for Elasticsearch."""
 
 import json
+from collections.abc import Iterable
 from typing import Any
 
 from elasticsearch8.serializer import JSONSerializer
+from elasticsearch8.serializer import NdjsonSerializer as BaseNdjsonSerializer
+
+try:
+    import orjson
+
+    _HAS_ORJSON = True
+except ImportError:  # pragma: no cover
+    _HAS_ORJSON = False
+
+# Leave dates and dataclasses to default() so they serialize the same as with the json module
+ORJSON_OPTIONS: int = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS if _HAS_ORJSON else 0
+
+_SCALAR_TYPES: frozenset[type] = frozenset({str, int, bool, type(None)})
 
 
 def convert_set_to_list(data: Any) -> Any:
@@ -26,20 +40,94 @@ def convert_set_to_list(data: Any) -> Any:
     return data
 
 
+def _is_exponent_float(value: float) -> bool:
+    """Return True if the json module writes the float in exponent notation, or as NaN or Infinity."""
+    return value != 0 and not 1e-4 <= abs(value) < 1e16
+
+
+def has_exponent_float(data: Any) -> bool:
+    """Return True if data contains a float which the json module writes in exponent notation.
+
+    orjson spells these differently (1e16 instead of 1e+16, 0.00001 instead of 1e-05), as well as
+    NaN and Infinity, so these documents are serialized with the json module instead. This runs for
+    every document, so the common scalar types are checked inline rather than by recursing.
+    """
+
+    if isinstance(data, float):
+        return _is_exponent_float(data)
+
+    items: Iterable[Any]
+
+    if isinstance(data, dict):
+        items = data.values()
+    elif isinstance(data, list | tuple | set | frozenset):
+        items = data
+    else:
+        return False
+
+    for item in items:
+        item_type = type(item)
+
+        if item_type in _SCALAR_TYPES:
+            continue
+
+        if item_type is float:
+            if _is_exponent_float(item):
+                return True
+        elif has_exponent_float(item):
+            return True
+
+    return False
+
+
 class Serializer(JSONSerializer):
-    """JSONSerializer which serializes sets to lists."""
+    """JSONSerializer which serializes sets to lists.
+
+    Uses orjson when it is installed, falling back to the json module for anything orjson would
+    reject or write differently, so the output is byte-for-byte identical with either backend.
+    """
+
+    def __init__(self, use_orjson: bool = True) -> None:
+        """Initialize the serializer."""
+        self._use_orjson: bool = use_orjson and _HAS_ORJSON
+
+    @property
+    def backend(self) -> str:
+        """Return the name of the JSON library used for serialization."""
+        return "orjson" if self._use_orjson else "json"
 
     def json_dumps(self, data: Any) -> bytes:
         """Serialize data to JSON."""
 
+        if self._use_orjson and not has_exponent_float(data):
+            try:
+                return orjson.dumps(data, default=self._orjson_default, option=ORJSON_OPTIONS)
+            except TypeError:
+                # Non-str keys, integers over 64 bits, lone surrogates, unserializable types
+                pass
+
         return json.dumps(
             data, default=self.default, ensure_ascii=False, separators=(",", ":"), cls=Encoder
         ).encode("utf-8", "surrogatepass")
 
+    def _orjson_default(self, data: Any) -> Any:
+        """Convert types orjson does not support, bailing out to the json module where it would differ."""
+
+        converted = self.default(data)
+
+        if has_exponent_float(converted):
+            msg = "Float requires exponent notation"
+            raise TypeError(msg)
+
+        return converted
+
     def default(self, data: Any) -> Any:
         """Entry point."""
 
-        return super().default(convert_set_to_list(data))
+        if isinstance(data, set):
+            return convert_set_to_list(data)
+
+        return super().default(data)
 
 
 class Encoder(json.JSONEncoder):
@@ -48,4 +136,23 @@ class Encoder(json.JSONEncoder):
     def default(self, o: Any) -> Any:
         """Entry point."""
 
-        return super().default(convert_set_to_list(o))
+        if isinstance(o, set):
+            return convert_set_to_list(o)
+
+        return super().default(o)
+
+
+class CompressedBody(bytes):
+    """A request body which is already compressed and must be sent as it is."""
+
+
+class NdjsonSerializer(BaseNdjsonSerializer):
+    """NdjsonSerializer which sends compressed bodies without appending a newline."""
+
+    def dumps(self, data: Any) -> bytes:
+        """Entry point."""
+
+        if isinstance(data, CompressedBody):
+            return bytes(data)
+
+        return super().dumps(data)
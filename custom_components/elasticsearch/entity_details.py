@@ -4,11 +4,13 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
+from homeassistant.core import Event, callback
 from homeassistant.helpers import (
     area_registry,
     device_registry,
     entity_registry,
     floor_registry,
+    label_registry,
 )
 from homeassistant.helpers.device_registry import DeviceEntry
 from homeassistant.helpers.entity_registry import RegistryEntry
@@ -16,6 +18,7 @@ from homeassistant.helpers.entity_registry import RegistryEntry
 from .logger import LOGGER as BASE_LOGGER
 
 if TYPE_CHECKING:  # pragma: no cover
+    from collections.abc import Callable
     from logging import Logger
     from typing import Any
 
@@ -230,6 +233,66 @@ class ExtendedEntityDetails:
         self.area_registry: area_registry.AreaRegistry = area_registry.async_get(hass)
         self.floor_registry: floor_registry.FloorRegistry = floor_registry.async_get(hass)
 
+        # The extended details of each entity as a dict, until the registries change
+        self._documents: dict[str, dict[str, Any]] = {}
+        self._cancel_listeners: list[Callable[[], None]] = []
+
+    async def async_init(self) -> None:
+        """Start caching extended details, invalidating them when the registries change."""
+
+        self._cancel_listeners = [
+            self._hass.bus.async_listen(
+                entity_registry.EVENT_ENTITY_REGISTRY_UPDATED, self._handle_entity_registry_updated
+            ),
+            *[
+                self._hass.bus.async_listen(event_type, self._handle_registry_updated)
+                for event_type in (
+                    device_registry.EVENT_DEVICE_REGISTRY_UPDATED,
+                    area_registry.EVENT_AREA_REGISTRY_UPDATED,
+                    floor_registry.EVENT_FLOOR_REGISTRY_UPDATED,
+                    label_registry.EVENT_LABEL_REGISTRY_UPDATED,
+                )
+            ],
+        ]
+
+    @callback
+    def _handle_entity_registry_updated(
+        self, event: Event[entity_registry.EventEntityRegistryUpdatedData]
+    ) -> None:
+        """Forget the details of an entity when its registry entry changes."""
+        self._documents.pop(event.data["entity_id"], None)
+
+        if "old_entity_id" in event.data:
+            self._documents.pop(event.data["old_entity_id"], None)
+
+    @callback
+    def _handle_registry_updated(self, event: Event) -> None:
+        """Forget the details of all entities when a device, area, floor, or label changes."""
+        self._documents.clear()
+
+    def stop(self) -> None:
+        """Stop caching extended details."""
+        for cancel_listener in self._cancel_listeners:
+            cancel_listener()
+
+        self._cancel_listeners = []
+        self._documents.clear()
+
+    def async_get_dict(self, entity_id: str) -> dict[str, Any]:
+        """Retrieve extended entity details as a dict.
+
+        The dict is cached between calls once async_init has run, so it must not be modified.
+        """
+        document = self._documents.get(entity_id)
+
+        if document is None:
+            document = self.async_get(entity_id).to_dict()
+
+            if self._cancel_listeners:
+                self._documents[entity_id] = document
+
+        return document
+
     def async_get(self, entity_id: str) -> ExtendedRegistryEntry:
         """Retrieve extended entity details."""
         device: DeviceEntry | None = None
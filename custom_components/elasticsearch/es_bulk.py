@@ -0,0 +1,441 @@
+"""Builds pre-serialized NDJSON bodies for the Elasticsearch Bulk API, and handles the documents it rejects."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import zlib
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterable, Awaitable, Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from functools import lru_cache
+from logging import Logger
+from time import monotonic
+from typing import Any
+
+from custom_components.elasticsearch.const import (
+    DATASTREAM_DEAD_LETTER_DATASET,
+    DATASTREAM_NAMESPACE,
+    DATASTREAM_TYPE,
+)
+from custom_components.elasticsearch.encoder import Serializer
+from custom_components.elasticsearch.logger import LOGGER as BASE_LOGGER
+
+# Matches the default chunk size of the elasticsearch helpers' streaming bulk
+BULK_CHUNK_SIZE: int = 500
+
+# Elasticsearch recommends bulk requests of a few megabytes
+BULK_MAX_CHUNK_BYTES: int = 5 * 1024 * 1024
+
+# Documents rejected with a retryable error are sent up to this many times in total
+BULK_MAX_ATTEMPTS: int = 5
+
+# Seconds before a document is retried, doubling with each attempt up to the maximum
+BULK_RETRY_BACKOFF: float = 2
+BULK_RETRY_MAX_BACKOFF: float = 300
+
+# Documents waiting to be retried, beyond which the oldest are dropped
+BULK_RETRY_MAX_SIZE: int = 10_000
+
+# Documents waiting to be published to the dead letter datastream, beyond which the oldest are dropped
+DEAD_LETTER_MAX_PENDING: int = 1_000
+
+
+@dataclass
+class BulkOutcome:
+    """The outcome of the documents in a bulk request.
+
+    Failed documents are listed by their position in the request, with the error reported for them.
+    Duplicates are documents which were already indexed, as resending is at-least-once.
+    """
+
+    succeeded: int = 0
+    duplicates: int = 0
+    retryable: list[tuple[int, dict[str, Any]]] = field(default_factory=list)
+    rejected: list[tuple[int, dict[str, Any]]] = field(default_factory=list)
+
+    @staticmethod
+    def is_retryable(status: int) -> bool:
+        """Return True if a document which failed with the status may be accepted when sent again."""
+        return status == 429 or status >= 500
+
+    @staticmethod
+    def is_duplicate(action: str, status: int) -> bool:
+        """Return True if a document failed because it was already indexed.
+
+        Documents of time series datastreams have an id derived from their dimensions and timestamp, so
+        a resent document is rejected with a version conflict on create.
+        """
+        return action == "create" and status == 409
+
+
+def split_items(body: bytes) -> list[tuple[bytes, bytes]]:
+    """Return the action and document lines of each item in a bulk body, including their newlines."""
+    lines = body.split(b"\n")
+
+    return [(lines[index] + b"\n", lines[index + 1] + b"\n") for index in range(0, len(lines) - 1, 2)]
+
+
+class BulkBodyBuilder:
+    """Serialize documents into NDJSON bulk lines, once per document."""
+
+    def __init__(
+        self,
+        serializer: Serializer | None = None,
+        chunk_size: int = BULK_CHUNK_SIZE,
+        max_chunk_bytes: int = BULK_MAX_CHUNK_BYTES,
+    ) -> None:
+        """Initialize the builder."""
+        self._serializer: Serializer = serializer if serializer is not None else Serializer()
+        self._chunk_size: int = chunk_size
+        self._max_chunk_bytes: int = max_chunk_bytes
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def action_line(datastream_type: str, datastream_dataset: str, datastream_namespace: str) -> bytes:
+        """Return the serialized create action for a datastream, including the trailing newline."""
+        index = f"{datastream_type}-{datastream_dataset}-{datastream_namespace}"
+
+        return Serializer().dumps({"create": {"_index": index}}) + b"\n"
+
+    @staticmethod
+    def lane(document: dict[str, Any], lanes: int) -> int:
+        """Return the lane of a document, which is stable for each entity."""
+        if lanes <= 1:
+            return 0
+
+        return zlib.crc32(str(document.get("hass.entity.id", "")).encode()) % lanes
+
+    def to_lines(self, document: dict[str, Any]) -> tuple[bytes, bytes]:
+        """Return the action line and the document line for a document."""
+        return (
+            self.action_line(
+                document["data_stream.type"],
+                document["data_stream.dataset"],
+                document["data_stream.namespace"],
+            ),
+            self._serializer.dumps(document) + b"\n",
+        )
+
+    async def chunks(self, documents: AsyncIterable[dict[str, Any]]) -> AsyncGenerator[list[bytes], Any]:
+        """Yield the bulk lines of the documents in chunks bounded by document count and size."""
+        async for _, lines in self.lane_chunks(documents, lanes=1):
+            yield lines
+
+    async def lane_chunks(
+        self, documents: AsyncIterable[dict[str, Any]], lanes: int
+    ) -> AsyncGenerator[tuple[int, list[bytes]], Any]:
+        """Yield the bulk lines of the documents in chunks, each holding the documents of a single lane.
+
+        All documents of an entity are in the same lane, and the chunks of a lane are yielded in order.
+        """
+        lines: list[list[bytes]] = [[] for _ in range(lanes)]
+        sizes: list[int] = [0] * lanes
+
+        async for document in documents:
+            for chunk in self._add(document, lines, sizes):
+                yield chunk
+
+        for lane, remaining in enumerate(lines):
+            if remaining:
+                yield lane, remaining
+
+    def build_lane_chunks(
+        self, documents: Iterable[dict[str, Any]], lanes: int
+    ) -> list[tuple[int, list[bytes]]]:
+        """Return the chunks lane_chunks would yield for the documents, without the event loop."""
+        lines: list[list[bytes]] = [[] for _ in range(lanes)]
+        sizes: list[int] = [0] * lanes
+        chunks: list[tuple[int, list[bytes]]] = []
+
+        for document in documents:
+            chunks.extend(self._add(document, lines, sizes))
+
+        chunks.extend((lane, remaining) for lane, remaining in enumerate(lines) if remaining)
+
+        return chunks
+
+    def _add(
+        self, document: dict[str, Any], lines: list[list[bytes]], sizes: list[int]
+    ) -> Iterator[tuple[int, list[bytes]]]:
+        """Add the bulk lines of a document to its lane, yielding the chunks of the lane that are full."""
+        lane = self.lane(document, len(lines))
+        action, source = self.to_lines(document)
+        size = len(action) + len(source)
+
+        if lines[lane] and sizes[lane] + size > self._max_chunk_bytes:
+            yield lane, lines[lane]
+            lines[lane], sizes[lane] = [], 0
+
+        lines[lane].extend((action, source))
+        sizes[lane] += size
+
+        if len(lines[lane]) >= self._chunk_size * 2:
+            yield lane, lines[lane]
+            lines[lane], sizes[lane] = [], 0
+
+
+async def iterate_chunks(
+    chunks: Iterator[tuple[int, list[bytes]]],
+) -> AsyncGenerator[tuple[int, list[bytes]], Any]:
+    """Yield chunks that were built ahead of time, leaving those not yet yielded in the iterator."""
+    for chunk in chunks:
+        yield chunk
+
+
+class BulkSender:
+    """Send bulk chunks with a limited number of requests in flight.
+
+    Chunks of the same lane are sent one after another, in order, so the documents of an entity reach
+    Elasticsearch in the order they were queued. Chunks of different lanes are sent concurrently.
+    """
+
+    def __init__(self, send: Callable[[bytes], Awaitable[Any]], max_in_flight: int = 1) -> None:
+        """Initialize the sender."""
+        self._send: Callable[[bytes], Awaitable[Any]] = send
+        self._max_in_flight: int = max(1, max_in_flight)
+
+        self.unsent: list[bytes] = []
+
+    @property
+    def max_in_flight(self) -> int:
+        """Return the maximum number of requests in flight."""
+        return self._max_in_flight
+
+    async def send(self, chunks: AsyncIterable[tuple[int, list[bytes]]]) -> int:
+        """Send the chunks and return the number of chunks sent.
+
+        On failure, no further chunks are sent, requests in flight are awaited, and the first error is
+        raised. The lines of chunks that were not sent are then available in unsent, including the chunks
+        left in the iterable, which is drained so no document taken off the queue is lost.
+        """
+        self.unsent = []
+
+        semaphore = asyncio.Semaphore(self._max_in_flight)
+        pending: dict[asyncio.Task[None], list[bytes]] = {}
+        tails: dict[int, asyncio.Task[None]] = {}
+        sent = 0
+        error: BaseException | None = None
+
+        async def send_after(previous: asyncio.Task[None] | None, lines: list[bytes]) -> None:
+            # Raises without sending if the previous chunk of the lane failed
+            if previous is not None:
+                await previous
+
+            async with semaphore:
+                await self._send(b"".join(lines))
+
+        def collect() -> None:
+            nonlocal sent, error
+
+            for task in [task for task in pending if task.done()]:
+                lines = pending.pop(task)
+
+                if task.exception() is None:
+                    sent += 1
+                    continue
+
+                self.unsent.extend(lines)
+                error = error if error is not None else task.exception()
+
+        try:
+            async for lane, lines in chunks:
+                task = asyncio.create_task(send_after(tails.get(lane), lines))
+                tails[lane] = task
+                pending[task] = lines
+
+                if len(pending) >= self._max_in_flight:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    collect()
+
+                if error is not None:
+                    break
+
+            if pending:
+                await asyncio.wait(pending)
+                collect()
+
+            if error is not None:
+                async for _, lines in chunks:
+                    self.unsent.extend(lines)
+
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+        if error is not None:
+            raise error
+
+        return sent
+
+
+class BulkRetryQueue:
+    """Hold documents rejected with a retryable error until they are due to be sent again.
+
+    Each document is retried after an exponential backoff on the number of attempts made to send it, until
+    it has been attempted the maximum number of times.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = BULK_MAX_ATTEMPTS,
+        backoff: float = BULK_RETRY_BACKOFF,
+        max_backoff: float = BULK_RETRY_MAX_BACKOFF,
+        max_size: int = BULK_RETRY_MAX_SIZE,
+    ) -> None:
+        """Initialize the retry queue."""
+        self._max_attempts: int = max_attempts
+        self._backoff: float = backoff
+        self._max_backoff: float = max_backoff
+
+        # Due time, attempts made, action line, document line
+        self._items: deque[tuple[float, int, bytes, bytes]] = deque(maxlen=max_size)
+
+        self.requeued: int = 0
+        self.exhausted: int = 0
+        self.dropped: int = 0
+
+    def __len__(self) -> int:
+        """Return the number of documents waiting to be retried."""
+        return len(self._items)
+
+    def add(self, action: bytes, source: bytes, attempts: int) -> bool:
+        """Schedule a document for another attempt, or return False if it has used all of its attempts."""
+        if attempts >= self._max_attempts:
+            self.exhausted += 1
+            return False
+
+        if len(self._items) == self._items.maxlen:
+            self.dropped += 1
+
+        backoff = min(self._max_backoff, self._backoff * 2 ** min(attempts - 1, 16))
+        self._items.append((monotonic() + backoff, attempts, action, source))
+        self.requeued += 1
+
+        return True
+
+    def pop_due(self, limit: int = BULK_CHUNK_SIZE) -> list[tuple[int, bytes, bytes]]:
+        """Remove and return up to limit documents that are due, with the attempts made to send them."""
+        now = monotonic()
+        due: list[tuple[int, bytes, bytes]] = []
+        waiting: list[tuple[float, int, bytes, bytes]] = []
+
+        while self._items and len(due) < limit:
+            item = self._items.popleft()
+
+            if item[0] <= now:
+                due.append(item[1:])
+            else:
+                waiting.append(item)
+
+        self._items.extendleft(reversed(waiting))
+
+        return due
+
+    def restore(self, items: list[tuple[int, bytes, bytes]]) -> None:
+        """Return documents removed by pop_due which could not be sent, to be retried first."""
+        now = monotonic()
+
+        self._items.extendleft(
+            (now, attempts, action, source) for attempts, action, source in reversed(items)
+        )
+
+    def stats(self) -> dict[str, int]:
+        """Return the retry queue statistics."""
+        return {
+            "pending": len(self._items),
+            "requeued": self.requeued,
+            "exhausted": self.exhausted,
+            "dropped": self.dropped,
+        }
+
+
+class DeadLetterSink:
+    """Collect the documents which Elasticsearch rejected for good, counted by the type of error and entity.
+
+    With the dead letter datastream enabled, each rejected document is also kept as a string, with the error
+    reported for it, until it is published to the datastream.
+    """
+
+    def __init__(
+        self,
+        log: Logger = BASE_LOGGER,
+        datastream: bool = False,
+        max_pending: int = DEAD_LETTER_MAX_PENDING,
+    ) -> None:
+        """Initialize the sink."""
+        self._logger: Logger = log
+        self._datastream: bool = datastream
+
+        self._pending: deque[dict[str, Any]] = deque(maxlen=max_pending)
+
+        self.errors: dict[str, int] = {}
+        self.entities: dict[str, int] = {}
+        self.dropped: int = 0
+
+    @staticmethod
+    def entity_id(source: bytes) -> str:
+        """Return the id of the entity a rejected document was about."""
+        try:
+            return str(json.loads(source).get("hass.entity.id", "unknown"))
+        except (ValueError, AttributeError):
+            return "unknown"
+
+    def add(self, source: bytes, error: dict[str, Any]) -> None:
+        """Add a rejected document with the error reported for it."""
+        details = error.get("error") or {}
+        error_type = str(details.get("type", error.get("status", "unknown")))
+        entity_id = self.entity_id(source)
+
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+        self.entities[entity_id] = self.entities.get(entity_id, 0) + 1
+        self._logger.debug("Discarding document rejected with [%s]: %s", error_type, source)
+
+        if not self._datastream:
+            return
+
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+
+        self._pending.append(
+            {
+                "@timestamp": datetime.now(tz=UTC).isoformat(),
+                "hass.entity.id": entity_id,
+                "hass.entity.rejections": self.entities[entity_id],
+                "error.type": error_type,
+                "error.message": str(details.get("reason", "")),
+                "event.original": source.rstrip(b"\n").decode("utf-8", "replace"),
+                "data_stream.type": DATASTREAM_TYPE,
+                "data_stream.dataset": DATASTREAM_DEAD_LETTER_DATASET,
+                "data_stream.namespace": DATASTREAM_NAMESPACE,
+            }
+        )
+
+    def pop_documents(self) -> list[dict[str, Any]]:
+        """Remove and return the documents waiting to be published to the dead letter datastream."""
+        documents = list(self._pending)
+        self._pending.clear()
+
+        return documents
+
+    def restore(self, documents: list[dict[str, Any]]) -> None:
+        """Return documents removed by pop_documents which could not be published, to be published first."""
+        # Beyond the maximum, the newest documents are dropped
+        self.dropped += max(0, len(self._pending) + len(documents) - (self._pending.maxlen or 0))
+        self._pending.extendleft(reversed(documents))
+
+    def stats(self) -> dict[str, Any]:
+        """Return the dead letter statistics."""
+        stats: dict[str, Any] = {
+            "documents": sum(self.errors.values()),
+            "errors": dict(self.errors),
+            "entities": dict(sorted(self.entities.items(), key=lambda item: item[1], reverse=True)),
+        }
+
+        if self._datastream:
+            stats["pending"] = len(self._pending)
+            stats["dropped"] = self.dropped
+
+        return stats
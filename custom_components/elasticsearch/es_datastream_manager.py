@@ -6,10 +6,14 @@ Elasticsearch index templates for Home Assistant datastreams.
 
 from logging import Logger
 
+from custom_components.elasticsearch.datastreams.dead_letter_template import (
+    dead_letter_index_template_definition,
+)
 from custom_components.elasticsearch.datastreams.index_template import index_template_definition
 from custom_components.elasticsearch.es_gateway import ElasticsearchGateway
 
 from .const import (
+    DATASTREAM_DEAD_LETTER_INDEX_TEMPLATE_NAME,
     DATASTREAM_METRICS_INDEX_TEMPLATE_NAME,
 )
 from .logger import LOGGER as BASE_LOGGER
@@ -24,6 +28,7 @@ class DatastreamManager:
     def __init__(
         self,
         gateway: ElasticsearchGateway,
+        dead_letter: bool = False,
         log: Logger = BASE_LOGGER,
     ) -> None:
         """Initialize index management."""
@@ -31,6 +36,7 @@ class DatastreamManager:
         self._logger = log
 
         self._gateway: ElasticsearchGateway = gateway
+        self._dead_letter: bool = dead_letter
 
     @async_log_enter_exit_debug
     async def async_init(self) -> None:
@@ -40,6 +46,9 @@ class DatastreamManager:
         elif await self._needs_index_template_update():
             await self._update_index_template()
 
+        if self._dead_letter:
+            await self._install_dead_letter_index_template()
+
     @async_log_enter_exit_debug
     async def _needs_index_template(self) -> bool:
         """Check if the ES cluster needs the index template installed."""
@@ -98,3 +107,29 @@ class DatastreamManager:
         for datastream in datastreams.get("data_streams", []):
             self._logger.info("Rolling over datastream [%s]", datastream["name"])
             await self._gateway.rollover_datastream(datastream=datastream["name"])
+
+    @async_log_enter_exit_debug
+    async def _install_dead_letter_index_template(self) -> None:
+        """Install or update the index template of the dead letter datastream.
+
+        Its mappings are not dynamic, so an update applies from the next rollover without a conflict.
+        """
+        matching_templates = await self._gateway.get_index_template(
+            name=DATASTREAM_DEAD_LETTER_INDEX_TEMPLATE_NAME,
+            ignore=[404],
+        )
+
+        matching_template = (matching_templates.get("index_templates") or [{}])[0]
+
+        imported_version = matching_template.get("index_template", {}).get("version", 0)
+        new_version = dead_letter_index_template_definition.get("version", 0)
+
+        if imported_version == new_version:
+            return
+
+        self._logger.info("Installing index template for the dead letter datastream")
+
+        await self._gateway.put_index_template(
+            name=DATASTREAM_DEAD_LETTER_INDEX_TEMPLATE_NAME,
+            body=dead_letter_index_template_definition,
+        )
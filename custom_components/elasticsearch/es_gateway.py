@@ -2,23 +2,34 @@
 
 from __future__ import annotations  # noqa: I001
 
+import random
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from time import monotonic
 from types import MappingProxyType
 from typing import TYPE_CHECKING
 from custom_components.elasticsearch.errors import InsufficientPrivileges, UnsupportedVersion
-from custom_components.elasticsearch.const import ES_CHECK_PERMISSIONS_DATASTREAM, ELASTIC_MINIMUM_VERSION
+from custom_components.elasticsearch.const import (
+    CAPABILITIES,
+    CAPABILITIES_CACHE_TTL,
+    ES_CHECK_PERMISSIONS_DATASTREAM,
+    ELASTIC_MINIMUM_VERSION,
+    PASSIVE_HEALTH_TTL,
+    RECONNECT_BACKOFF_MAX,
+    RECONNECT_BACKOFF_MIN,
+)
 
 from .logger import LOGGER as BASE_LOGGER
 from .logger import log_enter_exit_debug
 from typing import Any
 
 if TYPE_CHECKING:  # pragma: no cover
-    from collections.abc import AsyncGenerator
     from logging import Logger
 
     from elasticsearch8._async.client import AsyncElasticsearch as AsyncElasticsearch8
 
+    from custom_components.elasticsearch.es_bulk import BulkOutcome
+
 
 @dataclass
 class GatewaySettings(ABC):
@@ -34,6 +45,7 @@ class GatewaySettings(ABC):
     verify_hostname: bool = True
     minimum_version: tuple[int, int] | None = None
     minimum_privileges: MappingProxyType[str, Any] = MappingProxyType[str, Any]({})
+    compression_threshold: int = 0
 
     @abstractmethod
     def to_client(self) -> AsyncElasticsearch8:
@@ -53,6 +65,7 @@ class GatewaySettings(ABC):
             "minimum_version": self.minimum_version,
             # Perform a shallow copy of the mapping proxy to allow serialization
             "minimum_privileges": self.minimum_privileges.copy(),
+            "compression_threshold": self.compression_threshold,
         }
 
 
@@ -72,12 +85,28 @@ class ElasticsearchGateway(ABC):
 
         self._previous_ping: bool | None = None
 
+        self._capabilities: dict[str, Any] = {}
+        self._capabilities_time: float | None = None
+
+        # When the cluster last responded successfully, which is cleared when a request fails
+        self._last_contact: float | None = None
+
+        # While the circuit is open, the connection is considered down until the next reconnection attempt
+        self._reconnect_attempts: int = 0
+        self._next_reconnect: float | None = None
+
+        # Bulk request bodies before compression, and as sent
+        self._bulk_requests: int = 0
+        self._bulk_compressed_requests: int = 0
+        self._bulk_bytes: int = 0
+        self._bulk_bytes_on_wire: int = 0
+
     @log_enter_exit_debug
     async def async_init(self) -> None:
         """I/O bound init."""
 
-        # Test the connection
-        await self.info()
+        # Test the connection, probing the capabilities used by the checks below
+        await self.capabilities(refresh=True)
         self._previous_ping = True
 
         # Minimum version check
@@ -120,11 +149,100 @@ class ElasticsearchGateway(ABC):
     async def info(self) -> dict:
         """Retrieve info about the connected elasticsearch cluster."""
 
+    async def capabilities(self, refresh: bool = False) -> dict[str, Any]:
+        """Return the capabilities of the cluster, probing the cluster info when they are missing or stale."""
+
+        if (
+            refresh
+            or self._capabilities_time is None
+            or monotonic() - self._capabilities_time >= CAPABILITIES_CACHE_TTL
+        ):
+            info: dict = await self.info()
+
+            self._capabilities = self._build_capabilities(info)
+            self._capabilities_time = monotonic()
+            self.record_contact(success=True)
+
+        return self._capabilities
+
+    def record_contact(self, success: bool) -> None:
+        """Record the outcome of a request to the cluster, tracking its health passively.
+
+        A failure opens the circuit: no request is made to check the connection until the next reconnection
+        attempt, which is scheduled with a jittered exponential backoff. A success closes the circuit.
+        """
+
+        if success:
+            self._last_contact = monotonic()
+            self._reconnect_attempts = 0
+            self._next_reconnect = None
+            return
+
+        if self._previous_ping:
+            self._logger.error("Connection to Elasticsearch has been lost.")
+
+        # The connection is down, so the first successful check reports it as reestablished
+        self._previous_ping = False
+
+        self._last_contact = None
+        self._reconnect_attempts += 1
+
+        backoff = min(
+            RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_MIN * 2 ** min(self._reconnect_attempts - 1, 16)
+        )
+
+        # Spread out reconnection attempts, so clients do not all return to a recovering cluster at once
+        self._next_reconnect = monotonic() + random.uniform(backoff / 2, backoff)
+
+    def circuit_open(self) -> bool:
+        """Return True if the connection is down and it is not yet time to attempt to reconnect."""
+        return self._next_reconnect is not None and monotonic() < self._next_reconnect
+
+    def _recently_healthy(self) -> bool:
+        """Return True if the connection was up and the cluster responded successfully since the last check."""
+        return (
+            self._previous_ping is True
+            and self._last_contact is not None
+            and monotonic() - self._last_contact < PASSIVE_HEALTH_TTL
+        )
+
+    def record_bulk_request(self, size: int, size_on_wire: int) -> None:
+        """Record the size of a bulk request body before compression and as sent."""
+        self._bulk_requests += 1
+        self._bulk_bytes += size
+        self._bulk_bytes_on_wire += size_on_wire
+
+        if size_on_wire != size:
+            self._bulk_compressed_requests += 1
+
+    def stats(self) -> dict[str, Any]:
+        """Return the gateway statistics."""
+        return {
+            "bulk_requests": self._bulk_requests,
+            "bulk_compressed_requests": self._bulk_compressed_requests,
+            "bulk_bytes": self._bulk_bytes,
+            "bulk_bytes_on_wire": self._bulk_bytes_on_wire,
+        }
+
     async def check_connection(self) -> bool:
-        """Check if the connection to the Elasticsearch cluster is working."""
+        """Check if the connection to the Elasticsearch cluster is working.
+
+        A recent successful response, such as a bulk request, shows the connection is working, so the
+        cluster is only pinged after a failed request or a while without any. After a failure, the
+        connection is reported down without a request until the next reconnection attempt is due.
+        """
+
+        if self.circuit_open():
+            assert self._next_reconnect is not None
+
+            self._logger.debug(
+                "Connection to Elasticsearch is down. Attempting to reconnect in %ss.",
+                round(self._next_reconnect - monotonic(), 1),
+            )
+            return False
 
         previous_ping = self._previous_ping
-        new_ping = await self.ping()
+        new_ping = True if self._recently_healthy() else await self.ping()
 
         # Our first connection check
         if previous_ping is None:
@@ -184,8 +302,8 @@ class ElasticsearchGateway(ABC):
         """Rollover a datastream."""
 
     @abstractmethod
-    async def bulk(self, actions: AsyncGenerator[dict[str, Any], Any]) -> None:
-        """Perform a bulk operation."""
+    async def bulk_ndjson(self, body: bytes) -> BulkOutcome:
+        """Perform a bulk operation using a pre-serialized NDJSON body, returning the outcome of its documents."""
 
     @abstractmethod
     async def stop(self) -> None:
@@ -195,9 +313,31 @@ class ElasticsearchGateway(ABC):
 
     async def _is_supported_version(self) -> bool:
         """Check if the Elasticsearch version is supported."""
-        info: dict = await self.info()
+        return bool((await self.capabilities())[CAPABILITIES.SUPPORTED])
 
-        return self._is_serverless(info) or self._meets_minimum_version(info, ELASTIC_MINIMUM_VERSION)
+    def _build_capabilities(self, cluster_info: dict) -> dict[str, Any]:
+        """Derive the capabilities of the cluster from its info."""
+
+        version_number_parts = cluster_info["version"]["number"].split(".")
+        build_flavor = cluster_info["version"]["build_flavor"]
+        serverless = self._is_serverless(cluster_info)
+
+        def since(major: int, minor: int) -> bool:
+            return self._meets_minimum_version(cluster_info, (major, minor))
+
+        return {
+            CAPABILITIES.MAJOR: int(version_number_parts[0]),
+            CAPABILITIES.MINOR: int(version_number_parts[1]),
+            CAPABILITIES.BUILD_FLAVOR: build_flavor,
+            CAPABILITIES.SERVERLESS: serverless,
+            CAPABILITIES.OSS: build_flavor == "oss",
+            CAPABILITIES.SUPPORTED: serverless or since(*ELASTIC_MINIMUM_VERSION),
+            CAPABILITIES.TIMESERIES_DATASTREAM: serverless or since(8, 7),
+            CAPABILITIES.IGNORE_MISSING_COMPONENT_TEMPLATES: serverless or since(8, 7),
+            CAPABILITIES.DATASTREAM_LIFECYCLE_MANAGEMENT: serverless or since(8, 11),
+            # Serverless manages shards itself, there are no rollover conditions to set
+            CAPABILITIES.MAX_PRIMARY_SHARD_SIZE: not serverless and since(7, 13),
+        }
 
     def _is_serverless(self, cluster_info: dict) -> bool:
         """Check if the Elasticsearch instance is serverless."""
@@ -2,37 +2,43 @@
 
 from __future__ import annotations
 
+import asyncio
+import gzip
 import ssl
 from collections import OrderedDict
 from contextlib import contextmanager
 from dataclasses import dataclass
 from types import MappingProxyType
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, cast
 
 import elasticsearch8
 from elastic_transport import ObjectApiResponse
 from elasticsearch8._async.client import AsyncElasticsearch
-from elasticsearch8.helpers import async_streaming_bulk
 from homeassistant.util.ssl import client_context
 
-from custom_components.elasticsearch.const import ES_CHECK_PERMISSIONS_DATASTREAM
-from custom_components.elasticsearch.encoder import Serializer
+from custom_components.elasticsearch.const import CAPABILITIES, ES_CHECK_PERMISSIONS_DATASTREAM
+from custom_components.elasticsearch.encoder import CompressedBody, NdjsonSerializer, Serializer
 from custom_components.elasticsearch.errors import (
     AuthenticationRequired,
     CannotConnect,
+    ClientError,
     InsufficientPrivileges,
     ServerError,
     UntrustedCertificate,
 )
+from custom_components.elasticsearch.es_bulk import BulkOutcome
 from custom_components.elasticsearch.es_gateway import ElasticsearchGateway, GatewaySettings
 
 from .logger import LOGGER as BASE_LOGGER
 from .logger import async_log_enter_exit_debug
 
 if TYPE_CHECKING:  # pragma: no cover
-    from collections.abc import AsyncGenerator
+    from collections.abc import Mapping, Sequence
     from logging import Logger
 
+# Bulk bodies are highly repetitive, so the fastest level already compresses them several times over
+BULK_COMPRESSION_LEVEL: int = 1
+
 
 @dataclass
 class Gateway8Settings(GatewaySettings):
@@ -43,7 +49,10 @@ class Gateway8Settings(GatewaySettings):
 
         settings = {
             "hosts": [self.url],
-            "serializer": Serializer(),
+            "serializers": {
+                Serializer.mimetype: Serializer(),
+                NdjsonSerializer.mimetype: NdjsonSerializer(),
+            },
             "request_timeout": self.request_timeout,
         }
 
@@ -156,18 +165,20 @@ class Elasticsearch8Gateway(ElasticsearchGateway):
 
     @async_log_enter_exit_debug
     async def ping(self) -> bool:
-        """Ping the Elasticsearch cluster. Raises only on Authentication issues."""
+        """Ping the Elasticsearch cluster, refreshing its capabilities. Raises only on Authentication issues."""
         try:
-            await self.info()
+            await self.capabilities(refresh=True)
 
         except AuthenticationRequired:
             self._previous_ping = False
+            self.record_contact(success=False)
 
             self._logger.debug("Authentication error pinging Elasticsearch", exc_info=True)
 
             raise
         except:  # noqa: E722
             self._previous_ping = False
+            self.record_contact(success=False)
 
             self._logger.debug("Error pinging Elasticsearch", exc_info=True)
 
@@ -183,9 +194,9 @@ class Elasticsearch8Gateway(ElasticsearchGateway):
 
         with self._error_converter(msg="Error checking whether platform is serverless"):
             # Check if the cluster is serverless, security is always enabled in serverless
-            info: dict = await self.info()
+            capabilities = await self.capabilities()
 
-        if self._is_serverless(info):
+        if capabilities[CAPABILITIES.SERVERLESS]:
             return True
 
         with self._error_converter(msg="Error checking for security features"):
@@ -243,35 +254,101 @@ class Elasticsearch8Gateway(ElasticsearchGateway):
         return self._convert_response(response)
 
     @async_log_enter_exit_debug
-    async def bulk(self, actions: AsyncGenerator[dict[str, Any], Any]) -> None:
-        """Perform a bulk operation."""
-
-        with self._error_converter("Error performing bulk operation"):
-            count = 0
-            okcount = 0
-            errcount = 0
-            async for ok, result in async_streaming_bulk(
-                client=self.client,
-                actions=actions,
-                max_retries=3,
-                raise_on_error=False,
-                yield_ok=True,
-            ):
-                count += 1
-                action, outcome = result.popitem()
-                if not ok:
-                    errcount += 1
-                    self._logger.error("failed to %s, error information: %s", action, outcome)
-                else:
-                    okcount += 1
-
-            if count > 0:
-                if errcount == 0:
-                    self._logger.info("Successfully published %d documents", okcount)
-                elif errcount > 0:
-                    self._logger.error("Failed to publish %d of %d documents", errcount, count)
+    async def bulk_ndjson(
+        self, body: bytes, max_retries: int = 3, initial_backoff: float = 2, max_backoff: float = 600
+    ) -> BulkOutcome:
+        """Perform a bulk operation using a pre-serialized NDJSON body of create actions.
+
+        Like the streaming bulk helper, requests rejected with a 429 are retried with an exponential
+        backoff. Documents are not retried here: the outcome of each is classified and returned, so the
+        caller can requeue those that failed with a retryable error. Each response, or failure, is
+        recorded to track the health of the connection. Bodies of at least the compression threshold, if
+        set, are sent gzipped.
+        """
+
+        outcome = BulkOutcome()
+
+        if not body:
+            self._log_bulk_summary(count=0, okcount=0, errcount=0)
+            return outcome
+
+        for attempt in range(max_retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(min(max_backoff, initial_backoff * 2 ** (attempt - 1)))
+
+            client, operations = self._compress_bulk_body(body)
+            self.record_bulk_request(size=len(body), size_on_wire=len(operations))
+
+            try:
+                with self._error_converter("Error performing bulk operation"):
+                    try:
+                        # The NDJSON serializer sends a pre-serialized body as it is, which the client's
+                        # annotation for operations does not allow for
+                        response = await client.bulk(
+                            operations=cast("Sequence[Mapping[str, Any]]", operations)
+                        )
+                    except elasticsearch8.ApiError as err:
+                        if err.status_code != 429 or attempt == max_retries:
+                            raise
+                        continue
+            except (AuthenticationRequired, ClientError):
+                # Elasticsearch responded, so the request is at fault rather than the connection
+                raise
+            except Exception:
+                self.record_contact(success=False)
+                raise
+
+            # A bulk response shows the connection is working, so the next check does not need to ping
+            self.record_contact(success=True)
+            break
+
+        items = self._convert_response(response).get("items", [])
+
+        for index, item in enumerate(items):
+            action, result = item.popitem()
+            status = result.get("status", 500)
+
+            if 200 <= status < 300:
+                outcome.succeeded += 1
+            elif BulkOutcome.is_duplicate(action, status):
+                outcome.duplicates += 1
+            elif BulkOutcome.is_retryable(status):
+                outcome.retryable.append((index, result))
+                self._logger.debug("failed to %s, will retry, error information: %s", action, result)
             else:
-                self._logger.debug("Publish skipped, no new events to publish.")
+                outcome.rejected.append((index, result))
+                self._logger.error("failed to %s, error information: %s", action, result)
+
+        if outcome.duplicates:
+            self._logger.debug("Skipped %d documents which were already indexed.", outcome.duplicates)
+
+        okcount = outcome.succeeded + outcome.duplicates
+        self._log_bulk_summary(count=len(items), okcount=okcount, errcount=len(items) - okcount)
+
+        return outcome
+
+    def _compress_bulk_body(self, body: bytes) -> tuple[AsyncElasticsearch, bytes]:
+        """Return the client to send a bulk body with and the body to send, gzipped above the threshold."""
+
+        threshold = self._settings.compression_threshold
+
+        if threshold <= 0 or len(body) < threshold:
+            return self.client, body
+
+        return (
+            self.client.options(headers={"content-encoding": "gzip"}),
+            CompressedBody(gzip.compress(body, compresslevel=BULK_COMPRESSION_LEVEL)),
+        )
+
+    def _log_bulk_summary(self, count: int, okcount: int, errcount: int) -> None:
+        """Log the outcome of a bulk operation."""
+        if count > 0:
+            if errcount == 0:
+                self._logger.info("Successfully published %d documents", okcount)
+            elif errcount > 0:
+                self._logger.error("Failed to publish %d of %d documents", errcount, count)
+        else:
+            self._logger.debug("Publish skipped, no new events to publish.")
 
     async def stop(self) -> None:
         """Stop the gateway."""
@@ -352,6 +429,12 @@ class Elasticsearch8Gateway(ElasticsearchGateway):
             ) from err
 
         except elasticsearch8.ApiError as err:
+            # Requests Elasticsearch refuses to process would fail the same way if sent again
+            if err.status_code is not None and 400 <= err.status_code < 500 and err.status_code != 429:
+                raise ClientError(
+                    append_cause(err, append_msg(f"Request rejected by Elasticsearch: {err.status_code}"))
+                ) from err
+
             if err.status_code is not None:
                 raise ServerError(
                     append_msg(f"Error in request to Elasticsearch: {err.status_code}")
@@ -15,18 +15,42 @@ from homeassistant.const import (
 )
 
 from custom_components.elasticsearch.const import (
+    ADVANCED_OPTION_DEFAULTS,
+    CONF_AGGREGATION_DOMAINS,
+    CONF_AGGREGATION_LABELS,
+    CONF_AGGREGATION_WINDOW,
+    CONF_BULK_COMPRESSION_THRESHOLD,
+    CONF_BULK_MAX_IN_FLIGHT,
     CONF_CHANGE_DETECTION_TYPE,
+    CONF_CHANGED_ATTRIBUTES_ONLY,
+    CONF_DEAD_LETTER_DATASTREAM,
+    CONF_DEADBAND_DEVICE_CLASSES,
+    CONF_DEADBAND_LABELS,
+    CONF_DEADBAND_MAX_SILENCE,
     CONF_DEBUG_ATTRIBUTE_FILTERING,
+    CONF_DOMAIN_RATE_LIMIT,
+    CONF_ENTITY_RATE_LIMIT,
     CONF_EXCLUDE_TARGETS,
+    CONF_FORMAT_IN_EXECUTOR,
+    CONF_IGNORED_ATTRIBUTE_CHANGES,
     CONF_INCLUDE_TARGETS,
     CONF_POLLING_FREQUENCY,
+    CONF_POLLING_MAX_AGE,
+    CONF_POLLING_SHARDS,
+    CONF_PUBLISH_FLUSH_THRESHOLD,
     CONF_PUBLISH_FREQUENCY,
+    CONF_PUBLISH_MAX_FREQUENCY,
+    CONF_QUEUE_MAX_SIZE,
+    CONF_QUEUE_OVERFLOW_POLICY,
+    CONF_SPILL_MAX_SIZE,
+    CONF_SPILL_TO_DISK,
     CONF_SSL_CA_PATH,
     CONF_SSL_VERIFY_HOSTNAME,
     CONF_TAGS,
     CONF_TARGETS_TO_EXCLUDE,
     CONF_TARGETS_TO_INCLUDE,
     ES_CHECK_PERMISSIONS_DATASTREAM,
+    QueueOverflowPolicy,
 )
 from custom_components.elasticsearch.errors import ESIntegrationException
 from custom_components.elasticsearch.es_datastream_manager import DatastreamManager
@@ -70,7 +94,13 @@ class ElasticIntegration:
         self._pipeline_manager = Pipeline.Manager(log=self._logger, **manager_parameters)
 
         # Initialize our Datastream manager
-        self._datastream_manager = DatastreamManager(log=self._logger, gateway=self._gateway)
+        self._datastream_manager = DatastreamManager(
+            log=self._logger,
+            gateway=self._gateway,
+            dead_letter=self._config_entry.options.get(
+                CONF_DEAD_LETTER_DATASTREAM, ADVANCED_OPTION_DEFAULTS[CONF_DEAD_LETTER_DATASTREAM]
+            ),
+        )
 
     @async_log_enter_exit_debug
     async def async_init(self) -> None:
@@ -88,9 +118,16 @@ class ElasticIntegration:
 
             raise
 
+    def diagnostics(self) -> dict[str, Any]:
+        """Return runtime diagnostics for the integration."""
+        return {
+            "gateway": self._gateway.stats(),
+            "pipeline": self._pipeline_manager.diagnostics(),
+        }
+
     async def async_shutdown(self) -> None:
         """Async shutdown procedure."""
-        self._pipeline_manager.stop()
+        await self._pipeline_manager.async_stop()
         await self._gateway.stop()
 
     @classmethod
@@ -110,6 +147,11 @@ class ElasticIntegration:
             ca_certs=config_entry.data.get(CONF_SSL_CA_PATH),
             request_timeout=config_entry.data.get(CONF_TIMEOUT, 30),
             minimum_privileges=minimum_privileges,
+            compression_threshold=int(
+                config_entry.options.get(
+                    CONF_BULK_COMPRESSION_THRESHOLD, ADVANCED_OPTION_DEFAULTS[CONF_BULK_COMPRESSION_THRESHOLD]
+                )
+            ),
         )
 
     @classmethod
@@ -119,6 +161,19 @@ class ElasticIntegration:
         # Options are never none, but mypy doesn't know that
         assert config_entry.options is not None
 
+        # Advanced options are only stored once they are changed in the options flow
+        options = {**ADVANCED_OPTION_DEFAULTS, **config_entry.options}
+
+        try:
+            queue_overflow_policy = QueueOverflowPolicy(options[CONF_QUEUE_OVERFLOW_POLICY])
+        except ValueError:
+            BASE_LOGGER.warning(
+                "Ignoring invalid queue overflow policy [%s], using [%s].",
+                options[CONF_QUEUE_OVERFLOW_POLICY],
+                QueueOverflowPolicy.DROP_OLDEST.value,
+            )
+            queue_overflow_policy = QueueOverflowPolicy.DROP_OLDEST
+
         settings = PipelineSettings(
             polling_frequency=config_entry.options[CONF_POLLING_FREQUENCY],
             publish_frequency=config_entry.options[CONF_PUBLISH_FREQUENCY],
@@ -135,6 +190,27 @@ class ElasticIntegration:
             excluded_devices=config_entry.options[CONF_TARGETS_TO_EXCLUDE].get("device_id", []),
             included_entities=config_entry.options[CONF_TARGETS_TO_INCLUDE].get("entity_id", []),
             excluded_entities=config_entry.options[CONF_TARGETS_TO_EXCLUDE].get("entity_id", []),
+            queue_max_size=int(options[CONF_QUEUE_MAX_SIZE]),
+            queue_overflow_policy=queue_overflow_policy,
+            spill_to_disk=options[CONF_SPILL_TO_DISK],
+            spill_max_size=int(options[CONF_SPILL_MAX_SIZE]),
+            bulk_max_in_flight=int(options[CONF_BULK_MAX_IN_FLIGHT]),
+            publish_flush_threshold=int(options[CONF_PUBLISH_FLUSH_THRESHOLD]),
+            publish_max_frequency=options[CONF_PUBLISH_MAX_FREQUENCY],
+            polling_max_age=options[CONF_POLLING_MAX_AGE],
+            polling_shards=int(options[CONF_POLLING_SHARDS]),
+            aggregation_window=options[CONF_AGGREGATION_WINDOW],
+            aggregation_domains=options[CONF_AGGREGATION_DOMAINS],
+            aggregation_labels=options[CONF_AGGREGATION_LABELS],
+            deadband_device_classes=options[CONF_DEADBAND_DEVICE_CLASSES],
+            deadband_labels=options[CONF_DEADBAND_LABELS],
+            deadband_max_silence=options[CONF_DEADBAND_MAX_SILENCE],
+            ignored_attribute_changes=options[CONF_IGNORED_ATTRIBUTE_CHANGES],
+            changed_attributes_only=options[CONF_CHANGED_ATTRIBUTES_ONLY],
+            entity_rate_limit=options[CONF_ENTITY_RATE_LIMIT],
+            domain_rate_limit=options[CONF_DOMAIN_RATE_LIMIT],
+            format_in_executor=options[CONF_FORMAT_IN_EXECUTOR],
+            dead_letter_datastream=options[CONF_DEAD_LETTER_DATASTREAM],
         )
 
         return {"hass": hass, "gateway": gateway, "settings": settings}
@@ -5,11 +5,16 @@ from __future__ import annotations
 import asyncio
 import re
 import unicodedata
-from collections.abc import AsyncGenerator
-from datetime import UTC, datetime
+import zlib
+from collections import deque
+from collections.abc import AsyncGenerator, Callable, Generator, Mapping
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
 from functools import lru_cache
 from logging import Logger
-from math import isinf, isnan
+from math import isinf
+from pathlib import Path
+from time import monotonic
 from typing import TYPE_CHECKING, Any
 
 from homeassistant.components.sun.const import STATE_ABOVE_HORIZON, STATE_BELOW_HORIZON
@@ -28,7 +33,7 @@ from homeassistant.const import (
 )
 from homeassistant.core import Event, EventStateChangedData, HomeAssistant, State, callback
 from homeassistant.helpers import area_registry, device_registry, entity_registry, label_registry
-from homeassistant.helpers import state as state_helper
+from homeassistant.helpers.storage import STORAGE_DIR
 from homeassistant.util import dt as dt_util
 from homeassistant.util.logging import async_create_catching_coro
 
@@ -38,6 +43,9 @@ from custom_components.elasticsearch.const import (
     DATASTREAM_DATASET_PREFIX,
     DATASTREAM_NAMESPACE,
     DATASTREAM_TYPE,
+    DOMAIN,
+    SPILL_DEFAULT_MAX_SIZE,
+    QueueOverflowPolicy,
     StateChangeType,
 )
 from custom_components.elasticsearch.encoder import convert_set_to_list
@@ -46,15 +54,26 @@ from custom_components.elasticsearch.entity_details import (
 )
 from custom_components.elasticsearch.errors import (
     AuthenticationRequired,
+    ClientError,
     ESIntegrationConnectionException,
 )
+from custom_components.elasticsearch.es_bulk import (
+    BULK_CHUNK_SIZE,
+    BulkBodyBuilder,
+    BulkRetryQueue,
+    BulkSender,
+    DeadLetterSink,
+    iterate_chunks,
+    split_items,
+)
 from custom_components.elasticsearch.logger import LOGGER as BASE_LOGGER
 from custom_components.elasticsearch.logger import (
     async_log_enter_exit_debug,
     log_enter_exit_debug,
     log_enter_exit_info,
 )
-from custom_components.elasticsearch.loop import LoopHandler
+from custom_components.elasticsearch.loop import AdaptiveInterval, LoopHandler
+from custom_components.elasticsearch.spill_queue import SpillQueue
 from custom_components.elasticsearch.system_info import SystemInfo, SystemInfoResult
 
 if TYPE_CHECKING:  # pragma: no cover
@@ -74,9 +93,283 @@ SKIP_ATTRIBUTES = [
     "unit_of_measurement",
 ]
 
+TRUE_STATES = frozenset({"true", STATE_ON, STATE_LOCKED, STATE_ABOVE_HORIZON, STATE_OPEN, STATE_HOME})
+FALSE_STATES = frozenset(
+    {"false", STATE_OFF, STATE_UNLOCKED, STATE_UNKNOWN, STATE_BELOW_HORIZON, STATE_CLOSED, STATE_NOT_HOME}
+)
+
+# The strings float() accepts as finite numbers, so they can be told apart without catching a ValueError
+_DIGITS = r"\d(?:_?\d)*"
+NUMBER_RE = re.compile(rf"\s*[+-]?(?:{_DIGITS}(?:\.(?:{_DIGITS})?)?|\.{_DIGITS})(?:[eE][+-]?{_DIGITS})?\s*")
+
+# Attributes the Formatter reads outside of the attributes of a document, kept when trimming attributes
+DOCUMENT_ATTRIBUTES = frozenset({"friendly_name", "latitude", "longitude"})
+
+# The number of polled states handled before yielding to the event loop
+POLL_CHUNK_SIZE = 250
+
+# Coerced values are cached by state, as the same states are seen over and over
+COERCED_VALUE_CACHE_SIZE = 4096
+
+# An event drained for formatting off the event loop: timestamp, state, reason, aggregated fields, entity details
+BatchItem = tuple[datetime, State, StateChangeType, dict[str, Any] | None, dict[str, Any]]
+
 
 class EventQueue(asyncio.Queue[tuple[datetime, State, StateChangeType]]):
-    """Queue for storing events."""
+    """Queue for storing events.
+
+    A bounded queue never raises QueueFull from put_nowait, instead the overflow policy decides which event
+    is discarded:
+    - DROP_OLDEST: discard the event at the head of the queue to make room for the new event.
+    - DROP_NEWEST: discard the incoming event.
+    - COALESCE: replace the most recent pending event for the same entity with the incoming event, falling
+      back to DROP_OLDEST when the entity has no pending event.
+
+    When the queue grows to the high water mark, on_high_water is called once so the queue can be drained
+    early. It is called again once the queue has dropped below the mark and grown back to it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        overflow_policy: QueueOverflowPolicy = QueueOverflowPolicy.DROP_OLDEST,
+        high_water_mark: int = 0,
+    ) -> None:
+        """Initialize the queue."""
+        super().__init__(maxsize=maxsize)
+
+        self._overflow_policy: QueueOverflowPolicy = overflow_policy
+        self._high_water_mark: int = high_water_mark
+        self._high_water_armed: bool = True
+
+        self.on_high_water: Callable[[], None] | None = None
+
+        # Called with each event discarded from the head of the queue by the overflow policy
+        self.on_drop: Callable[[tuple[datetime, State, StateChangeType]], None] | None = None
+
+        self.dropped: int = 0
+        self.coalesced: int = 0
+
+    @property
+    def overflow_policy(self) -> QueueOverflowPolicy:
+        """Return the overflow policy."""
+        return self._overflow_policy
+
+    def put_nowait(self, item: tuple[datetime, State, StateChangeType]) -> None:
+        """Put an item into the queue, applying the overflow policy if the queue is full."""
+        self.offer(item)
+
+    def offer(self, item: tuple[datetime, State, StateChangeType]) -> bool:
+        """Put an item into the queue like put_nowait, return False if the item itself was discarded."""
+
+        if not self.full():
+            super().put_nowait(item)
+        elif self._overflow_policy == QueueOverflowPolicy.DROP_NEWEST:
+            self.dropped += 1
+            return False
+        elif self._overflow_policy == QueueOverflowPolicy.COALESCE and self._coalesce(item):
+            self.coalesced += 1
+        else:
+            self._drop_oldest()
+            super().put_nowait(item)
+
+        self._check_high_water()
+        return True
+
+    def _check_high_water(self) -> None:
+        """Call on_high_water if the queue is at or above the high water mark, unless it was already called."""
+        if not self._high_water_mark or self.qsize() < self._high_water_mark or not self._high_water_armed:
+            return
+
+        self._high_water_armed = False
+
+        if self.on_high_water is not None:
+            self.on_high_water()
+
+    def _init(self, maxsize: int) -> None:
+        """Initialize the storage, each event is held in a slot so a pending event can be replaced in place."""
+        self._slots: deque[list[tuple[datetime, State, StateChangeType]]] = deque()
+
+        # The slot of the most recent pending event of each entity
+        self._latest: dict[str, list[tuple[datetime, State, StateChangeType]]] = {}
+
+    def _put(self, item: tuple[datetime, State, StateChangeType]) -> None:
+        """Append an event in a new slot."""
+        slot = [item]
+        self._slots.append(slot)
+        self._latest[item[1].entity_id] = slot
+
+    def _get(self) -> tuple[datetime, State, StateChangeType]:
+        """Remove and return the event at the head of the queue."""
+        slot = self._slots.popleft()
+        entity_id = slot[0][1].entity_id
+
+        if self._latest.get(entity_id) is slot:
+            del self._latest[entity_id]
+
+        if len(self._slots) < self._high_water_mark:
+            self._high_water_armed = True
+
+        return slot[0]
+
+    def qsize(self) -> int:
+        """Return the number of events in the queue."""
+        return len(self._slots)
+
+    def empty(self) -> bool:
+        """Return True if the queue is empty."""
+        return not self._slots
+
+    def _coalesce(self, item: tuple[datetime, State, StateChangeType]) -> bool:
+        """Replace the most recent pending event for the same entity, return False if there is none."""
+        slot = self._latest.get(item[1].entity_id)
+
+        if slot is None:
+            return False
+
+        slot[0] = item
+        return True
+
+    def _drop_oldest(self) -> None:
+        """Discard the event at the head of the queue."""
+        item = self.get_nowait()
+        self.task_done()
+        self.dropped += 1
+
+        if self.on_drop is not None:
+            self.on_drop(item)
+
+    def stats(self) -> dict[str, Any]:
+        """Return the queue statistics."""
+        return {
+            "size": self.qsize(),
+            "max_size": self.maxsize,
+            "overflow_policy": self._overflow_policy.value,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class PollBuffer(dict[str, tuple[datetime, State, StateChangeType]]):
+    """Latest-wins buffer of polled states keyed by entity id.
+
+    Polling captures every entity on each tick, so when publishing is slower than polling only the newest
+    polled state of each entity is kept. The buffer is bounded by the number of entities rather than by the
+    number of polls.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the buffer."""
+        super().__init__()
+
+        self.replaced: int = 0
+
+    def put(self, item: tuple[datetime, State, StateChangeType]) -> None:
+        """Store the item, replacing any pending item for the same entity."""
+        entity_id = item[1].entity_id
+
+        if entity_id in self:
+            self.replaced += 1
+
+        self[entity_id] = item
+
+    def drain(self) -> list[tuple[datetime, State, StateChangeType]]:
+        """Remove and return all pending items."""
+        items = list(self.values())
+        self.clear()
+        return items
+
+    def stats(self) -> dict[str, Any]:
+        """Return the buffer statistics."""
+        return {
+            "size": len(self),
+            "replaced": self.replaced,
+        }
+
+
+class RateLimiter:
+    """Token bucket rate limiter with a bucket per key.
+
+    Each bucket holds up to one second worth of events, at least one, and refills at the rate in events
+    per second. A rate of 0 disables rate limiting.
+    """
+
+    # The number of keys with the most limited events reported in the statistics
+    TOP_KEYS: int = 10
+
+    def __init__(self, rate: float) -> None:
+        """Initialize the rate limiter."""
+        self._rate: float = rate
+        self._capacity: float = max(1.0, rate)
+
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+        self.limited: dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Return True if the rate is limited."""
+        return self._rate > 0
+
+    def allow(self, key: str) -> bool:
+        """Take a token from the bucket of the key, return False if it is empty."""
+        now = monotonic()
+        tokens, last = self._buckets.get(key, (self._capacity, now))
+
+        tokens = min(self._capacity, tokens + (now - last) * self._rate)
+
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            self.limited[key] = self.limited.get(key, 0) + 1
+            return False
+
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        """Return the rate limiter statistics."""
+        top = sorted(self.limited.items(), key=lambda item: item[1], reverse=True)[: self.TOP_KEYS]
+
+        return {
+            "rate": self._rate,
+            "limited": sum(self.limited.values()),
+            "top_limited": dict(top),
+        }
+
+
+@dataclass
+class AggregationWindow:
+    """The numeric values of an entity within a window of time, and the last state in the window."""
+
+    start: datetime
+    time: datetime
+    state: State
+    reason: StateChangeType
+    minimum: float
+    maximum: float
+    total: float
+    last: float
+    count: int = 1
+
+    def add(self, time: datetime, state: State, reason: StateChangeType, value: float) -> None:
+        """Add a value to the window."""
+        self.time, self.state, self.reason = time, state, reason
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.total += value
+        self.last = value
+        self.count += 1
+
+    def to_fields(self) -> dict[str, Any]:
+        """Return the aggregated values as document fields."""
+        return {
+            "hass.entity.aggregation.min": self.minimum,
+            "hass.entity.aggregation.max": self.maximum,
+            "hass.entity.aggregation.avg": self.total / self.count,
+            "hass.entity.aggregation.last": self.last,
+            "hass.entity.aggregation.count": self.count,
+            "hass.entity.aggregation.start": self.start.isoformat(),
+        }
 
 
 class PipelineSettings:
@@ -99,6 +392,27 @@ class PipelineSettings:
         tags: list[str],
         polling_frequency: int,
         publish_frequency: int,
+        queue_max_size: int = 0,
+        queue_overflow_policy: QueueOverflowPolicy = QueueOverflowPolicy.DROP_OLDEST,
+        spill_to_disk: bool = False,
+        spill_max_size: int = SPILL_DEFAULT_MAX_SIZE,
+        bulk_max_in_flight: int = 1,
+        publish_flush_threshold: int = 0,
+        publish_max_frequency: int = 0,
+        polling_max_age: int = 0,
+        polling_shards: int = 1,
+        aggregation_window: int = 0,
+        aggregation_domains: list[str] | None = None,
+        aggregation_labels: list[str] | None = None,
+        deadband_device_classes: dict[str, float | str] | None = None,
+        deadband_labels: dict[str, float | str] | None = None,
+        deadband_max_silence: int = 0,
+        ignored_attribute_changes: list[str] | None = None,
+        changed_attributes_only: bool = False,
+        entity_rate_limit: float = 0,
+        domain_rate_limit: float = 0,
+        format_in_executor: bool = False,
+        dead_letter_datastream: bool = False,
     ) -> None:
         """Initialize the settings."""
         self.publish_frequency: int = publish_frequency
@@ -116,6 +430,27 @@ class PipelineSettings:
         self.excluded_devices: list[str] = excluded_devices
         self.included_entities: list[str] = included_entities
         self.excluded_entities: list[str] = excluded_entities
+        self.queue_max_size: int = queue_max_size
+        self.queue_overflow_policy: QueueOverflowPolicy = queue_overflow_policy
+        self.spill_to_disk: bool = spill_to_disk
+        self.spill_max_size: int = spill_max_size
+        self.bulk_max_in_flight: int = bulk_max_in_flight
+        self.publish_flush_threshold: int = publish_flush_threshold
+        self.publish_max_frequency: int = publish_max_frequency
+        self.polling_max_age: int = polling_max_age
+        self.polling_shards: int = polling_shards
+        self.aggregation_window: int = aggregation_window
+        self.aggregation_domains: list[str] = aggregation_domains or []
+        self.aggregation_labels: list[str] = aggregation_labels or []
+        self.deadband_device_classes: dict[str, float | str] = deadband_device_classes or {}
+        self.deadband_labels: dict[str, float | str] = deadband_labels or {}
+        self.deadband_max_silence: int = deadband_max_silence
+        self.ignored_attribute_changes: list[str] = ignored_attribute_changes or []
+        self.changed_attributes_only: bool = changed_attributes_only
+        self.entity_rate_limit: float = entity_rate_limit
+        self.domain_rate_limit: float = domain_rate_limit
+        self.format_in_executor: bool = format_in_executor
+        self.dead_letter_datastream: bool = dead_letter_datastream
 
 
 class Pipeline:
@@ -142,7 +477,22 @@ class Pipeline:
 
             self._static_fields: dict[str, str | float | list[str] | list[float]] = {}
 
-            self._queue: EventQueue = EventQueue()
+            self._queue: EventQueue = EventQueue(
+                maxsize=settings.queue_max_size,
+                overflow_policy=settings.queue_overflow_policy,
+                high_water_mark=settings.publish_flush_threshold,
+            )
+
+            self._poll_buffer: PollBuffer = PollBuffer()
+
+            # When the listener last queued an event of each entity, so the poller can skip those entities
+            self._last_queued: dict[str, datetime] = {}
+
+            self._aggregator: Pipeline.Aggregator = Pipeline.Aggregator(
+                hass=self._hass,
+                settings=settings,
+                log=self._logger,
+            )
 
             self._filterer: Pipeline.Filterer = Pipeline.Filterer(
                 hass=self._hass,
@@ -155,14 +505,17 @@ class Pipeline:
                 log=self._logger,
                 filterer=self._filterer,
                 queue=self._queue,
+                settings=self._settings,
+                last_queued=self._last_queued,
             )
 
             self._poller: Pipeline.Poller = Pipeline.Poller(
                 hass=self._hass,
                 log=self._logger,
                 filterer=self._filterer,
-                queue=self._queue,
+                buffer=self._poll_buffer,
                 settings=self._settings,
+                last_queued=self._last_queued,
             )
 
             self._formatter: Pipeline.Formatter = Pipeline.Formatter(
@@ -177,6 +530,10 @@ class Pipeline:
                 log=self._logger,
             )
 
+            # Publish early when events pile up faster than the publish frequency drains them
+            self._queue.on_high_water = self._publisher.flush_soon
+            self._queue.on_drop = self._forget_dropped
+
         @async_log_enter_exit_debug
         async def async_init(self, config_entry: ConfigEntry) -> None:
             """Initialize the manager."""
@@ -189,6 +546,8 @@ class Pipeline:
 
             await self._populate_static_fields()
 
+            await self._filterer.async_init()
+
             # Initialize listener if change detection type is configured
             if len(self._settings.change_detection_type) != 0:
                 await self._listener.async_init()
@@ -205,31 +564,132 @@ class Pipeline:
             await self._formatter.async_init(self._static_fields)
             await self._publisher.async_init(config_entry=config_entry)
 
+        def _forget_dropped(self, item: tuple[datetime, State, StateChangeType]) -> None:
+            """Forget an event the queue dropped, so it is not mistaken for one that will be published."""
+            timestamp, state, reason = item
+
+            # Unless a later event of the entity is still queued, the poller publishes the entity again
+            if self._last_queued.get(state.entity_id) == timestamp:
+                del self._last_queued[state.entity_id]
+
+            self._filterer.forget_queued(state, reason)
+
         async def sip_queue(self) -> AsyncGenerator[dict[str, Any], Any]:
-            """Sip an event off of the queue."""
+            """Sip events off of the queue and the poll buffer."""
+
+            for timestamp, state, reason, fields in self._drain():
+                document = self._format(timestamp, state, reason, fields)
+
+                if document is not None:
+                    yield document
+
+        def snapshot_batch(self) -> list[BatchItem]:
+            """Drain the queue and the poll buffer into a batch that can be formatted off the event loop.
+
+            The entity details of each state are looked up in the registries here, on the event loop, so
+            format_batch only reads the states and details in the batch, which are not modified afterwards.
+            """
+
+            batch: list[BatchItem] = []
+
+            for timestamp, state, reason, fields in self._drain():
+                try:
+                    details = self._formatter.entity_details(state.entity_id)
+                except Exception:
+                    self._logger.exception(
+                        "Error formatting document for entity [%s]. Skipping document.", state.entity_id
+                    )
+                    continue
+
+                batch.append((timestamp, state, reason, fields, details))
+
+            return batch
+
+        def format_batch(self, batch: list[BatchItem]) -> list[dict[str, Any]]:
+            """Format a batch returned by snapshot_batch, safe to run in an executor."""
+
+            documents: list[dict[str, Any]] = []
+
+            for timestamp, state, reason, fields, details in batch:
+                document = self._format(timestamp, state, reason, fields, details)
+
+                if document is not None:
+                    documents.append(document)
+
+            return documents
+
+        def _drain(
+            self,
+        ) -> Generator[tuple[datetime, State, StateChangeType, dict[str, Any] | None], Any, None]:
+            """Yield the events on the queue, then the poll buffer, then the aggregation windows that ended.
+
+            Aggregation windows are yielded with the aggregated fields to add to their document.
+            """
 
             while not self._queue.empty():
-                timestamp: datetime | None = None
                 state: State | None = None
-                reason: StateChangeType | None = None
 
                 try:
                     timestamp, state, reason = self._queue.get_nowait()
 
-                    yield self._formatter.format(timestamp, state, reason)
+                    if self._aggregator.add(timestamp, state, reason):
+                        continue
                 except asyncio.QueueEmpty:
-                    pass
+                    continue
                 except Exception:
                     self._logger.exception(
                         "Error formatting document for entity [%s]. Skipping document.",
                         state.entity_id if state is not None else "Unknown",
                     )
+                    continue
+
+                yield timestamp, state, reason, None
+
+            for timestamp, state, reason in self._poll_buffer.drain():
+                yield timestamp, state, reason, None
+
+            for window in self._aggregator.flush(datetime.now(tz=UTC)):
+                yield window.time, window.state, window.reason, window.to_fields()
+
+        def _format(
+            self,
+            timestamp: datetime,
+            state: State,
+            reason: StateChangeType,
+            fields: dict[str, Any] | None,
+            details: dict[str, Any] | None = None,
+        ) -> dict[str, Any] | None:
+            """Format an event into a document, logging and returning None if it cannot be formatted."""
+
+            try:
+                if details is None:
+                    document = self._formatter.format(timestamp, state, reason)
+                else:
+                    document = self._formatter.format(timestamp, state, reason, details=details)
+            except Exception:
+                self._logger.exception(
+                    "Error formatting aggregated document for entity [%s]. Skipping document."
+                    if fields is not None
+                    else "Error formatting document for entity [%s]. Skipping document.",
+                    state.entity_id,
+                )
+                return None
+
+            if fields is not None:
+                document.update(fields)
+
+            return document
 
         @property
         def queue(self) -> EventQueue:
             """Return the queue."""
             return self._queue
 
+        @property
+        def poll_buffer(self) -> PollBuffer:
+            """Return the poll buffer."""
+            return self._poll_buffer
+
         async def _populate_static_fields(self) -> None:
             """Populate the static fields for generated documents."""
             system_info: SystemInfo = SystemInfo(hass=self._hass)
@@ -264,11 +724,36 @@ class Pipeline:
             else:
                 self._logger.warning("%s Config entry not found or not loaded.", msg)
 
+        def diagnostics(self) -> dict[str, Any]:
+            """Return diagnostic information about the pipeline."""
+            return {
+                "queue": self._queue.stats(),
+                "poll_buffer": self._poll_buffer.stats(),
+                "listener": self._listener.stats(),
+                "filterer": self._filterer.stats(),
+                "poller": self._poller.stats(),
+                "aggregator": self._aggregator.stats(),
+                "publisher": self._publisher.diagnostics(),
+            }
+
+        @async_log_enter_exit_debug
+        async def async_stop(self) -> None:
+            """Stop the manager, publishing the open aggregation windows and anything else left first."""
+
+            self._listener.stop()
+            self._aggregator.close()
+
+            await self._publisher.async_stop()
+
+            self.stop()
+
         @log_enter_exit_debug
         def stop(self) -> None:
             """Stop the manager."""
 
             self._listener.stop()
+            self._filterer.stop()
+            self._formatter.stop()
 
     class Filterer:
         """Filters state changes for processing."""
@@ -281,27 +766,91 @@ class Pipeline:
         ) -> None:
             """Initialize the filterer."""
             self._logger = log if log else BASE_LOGGER
+            self._hass: HomeAssistant = hass
 
             self._include_targets: bool = settings.include_targets
             self._exclude_targets: bool = settings.exclude_targets
 
             self._debug_attribute_filtering: bool = settings.debug_attribute_filtering
 
-            self._included_areas: list[str] = settings.included_areas
-            self._excluded_areas: list[str] = settings.excluded_areas
-            self._included_devices: list[str] = settings.included_devices
-            self._excluded_devices: list[str] = settings.excluded_devices
-            self._included_labels: list[str] = settings.included_labels
-            self._excluded_labels: list[str] = settings.excluded_labels
-            self._included_entities: list[str] = settings.included_entities
-            self._excluded_entities: list[str] = settings.excluded_entities
-            self._change_detection_type: list[StateChangeType] = settings.change_detection_type
+            self._included_areas: frozenset[str] = frozenset(settings.included_areas)
+            self._excluded_areas: frozenset[str] = frozenset(settings.excluded_areas)
+            self._included_devices: frozenset[str] = frozenset(settings.included_devices)
+            self._excluded_devices: frozenset[str] = frozenset(settings.excluded_devices)
+            self._included_labels: frozenset[str] = frozenset(settings.included_labels)
+            self._excluded_labels: frozenset[str] = frozenset(settings.excluded_labels)
+            self._included_entities: frozenset[str] = frozenset(settings.included_entities)
+            self._excluded_entities: frozenset[str] = frozenset(settings.excluded_entities)
+            self._change_detection_type: frozenset[str] = frozenset(
+                change_type.value if isinstance(change_type, StateChangeType) else change_type
+                for change_type in settings.change_detection_type
+            )
 
             self._entity_registry = entity_registry.async_get(hass)
             self._label_registry = label_registry.async_get(hass)
             self._area_registry = area_registry.async_get(hass)
             self._device_registry = device_registry.async_get(hass)
 
+            # The outcome of the target filters for each entity, until the registries change
+            self._verdicts: dict[str, bool] = {}
+            self._cancel_listeners: list[Callable[[], None]] = []
+
+            # Deadband thresholds by device class and label, as (is_percentage, amount)
+            self._deadband_device_classes: dict[str, tuple[bool, float]] = self._parse_deadbands(
+                settings.deadband_device_classes
+            )
+            self._deadband_labels: dict[str, tuple[bool, float]] = self._parse_deadbands(
+                settings.deadband_labels
+            )
+            self._deadband_max_silence: timedelta = timedelta(seconds=settings.deadband_max_silence)
+
+            # The deadband threshold of each entity, until the registries change, and its last value queued
+            self._deadbands: dict[str, tuple[bool, float] | None] = {}
+            self._last_values: dict[str, tuple[float, datetime]] = {}
+
+            self.deadbanded: int = 0
+
+        async def async_init(self) -> None:
+            """Initialize the filterer."""
+
+            self._cancel_listeners = [
+                self._hass.bus.async_listen(
+                    entity_registry.EVENT_ENTITY_REGISTRY_UPDATED, self._handle_entity_registry_updated
+                ),
+                self._hass.bus.async_listen(
+                    device_registry.EVENT_DEVICE_REGISTRY_UPDATED, self._handle_registry_updated
+                ),
+                self._hass.bus.async_listen(
+                    label_registry.EVENT_LABEL_REGISTRY_UPDATED, self._handle_registry_updated
+                ),
+            ]
+
+        @callback
+        def _handle_entity_registry_updated(
+            self, event: Event[entity_registry.EventEntityRegistryUpdatedData]
+        ) -> None:
+            """Forget the verdict of an entity when its registry entry changes."""
+            self._verdicts.pop(event.data["entity_id"], None)
+            self._deadbands.pop(event.data["entity_id"], None)
+
+            if "old_entity_id" in event.data:
+                self._verdicts.pop(event.data["old_entity_id"], None)
+                self._deadbands.pop(event.data["old_entity_id"], None)
+
+        @callback
+        def _handle_registry_updated(self, event: Event) -> None:
+            """Forget all verdicts when a device or label changes, as it can affect any entity."""
+            self._verdicts.clear()
+            self._deadbands.clear()
+
+        @log_enter_exit_debug
+        def stop(self) -> None:
+            """Stop the filterer."""
+            for cancel_listener in self._cancel_listeners:
+                cancel_listener()
+
+            self._cancel_listeners = []
+
         def _reject(self, base_message, message: str) -> bool:
             """Help handle logging for cases where a filter results in rejection of the entity state update."""
 
@@ -320,13 +869,135 @@ class Pipeline:
 
         def passes_filter(self, state: State, reason: StateChangeType) -> bool:
             """Filter state changes for processing."""
-            base_msg = f"Processing filters for entity [{state.entity_id}]: "
 
             if not self._passes_change_detection_type_filter(reason):
                 return False
 
+            verdict = self._verdicts.get(state.entity_id)
+
+            if verdict is None:
+                verdict = self._verdicts[state.entity_id] = self._passes_target_filters(state.entity_id)
+
+            if (
+                verdict
+                and reason is StateChangeType.STATE
+                and (self._deadband_device_classes or self._deadband_labels)
+            ):
+                return self._passes_deadband_filter(state)
+
+            return verdict
+
+        def _parse_deadbands(self, thresholds: dict[str, float | str]) -> dict[str, tuple[bool, float]]:
+            """Parse deadband thresholds, which are absolute numbers or percentages like "5%"."""
+            deadbands: dict[str, tuple[bool, float]] = {}
+
+            for key, threshold in thresholds.items():
+                is_percentage = isinstance(threshold, str) and threshold.strip().endswith("%")
+
+                try:
+                    amount = float(
+                        threshold.strip().removesuffix("%") if isinstance(threshold, str) else threshold
+                    )
+                except ValueError:
+                    self._logger.warning("Ignoring invalid deadband threshold [%s] for [%s].", threshold, key)
+                    continue
+
+                deadbands[key] = (is_percentage, abs(amount))
+
+            return deadbands
+
+        def _deadband(self, state: State) -> tuple[bool, float] | None:
+            """Return the deadband threshold of an entity, from its labels first and then its device class."""
             entity: RegistryEntry | None = self._entity_registry.async_get(state.entity_id)
 
+            if entity is not None:
+                for label in sorted(entity.labels):
+                    if label in self._deadband_labels:
+                        return self._deadband_labels[label]
+
+                device_class = entity.device_class or entity.original_device_class
+            else:
+                device_class = state.attributes.get("device_class")
+
+            return self._deadband_device_classes.get(device_class) if device_class else None
+
+        def _passes_deadband_filter(self, state: State) -> bool:
+            """Drop numeric changes within the deadband of the last value queued, unless silent for too long."""
+            entity_id = state.entity_id
+
+            if entity_id in self._deadbands:
+                deadband = self._deadbands[entity_id]
+            else:
+                deadband = self._deadbands[entity_id] = self._deadband(state)
+
+            if deadband is None:
+                return True
+
+            value: float | None = Pipeline.Formatter.coerce_value(state.state).get("float")
+
+            if value is None:
+                return True
+
+            last = self._last_values.get(entity_id)
+
+            if last is not None:
+                last_value, last_time = last
+                is_percentage, amount = deadband
+                threshold = abs(last_value) * amount / 100 if is_percentage else amount
+
+                silent_for_too_long = self._deadband_max_silence and (
+                    state.last_changed - last_time >= self._deadband_max_silence
+                )
+
+                if abs(value - last_value) < threshold and not silent_for_too_long:
+                    self.deadbanded += 1
+                    return False
+
+            return True
+
+        def record_queued(self, state: State, reason: StateChangeType) -> None:
+            """Remember the value of a state change which was queued, as the deadband compares against it.
+
+            Changes that pass the filter can still be dropped before they are queued, so the value is only
+            recorded once the change was queued.
+            """
+
+            if reason is not StateChangeType.STATE or self._deadbands.get(state.entity_id) is None:
+                return
+
+            value: float | None = Pipeline.Formatter.coerce_value(state.state).get("float")
+
+            if value is None:
+                # Compare the next numeric value against nothing, so it is passed
+                self._last_values.pop(state.entity_id, None)
+                return
+
+            self._last_values[state.entity_id] = (value, state.last_changed)
+
+        def forget_queued(self, state: State, reason: StateChangeType) -> None:
+            """Forget the value of a queued state change which was dropped from the queue before publishing."""
+
+            if reason is not StateChangeType.STATE:
+                return
+
+            last = self._last_values.get(state.entity_id)
+
+            # Compare the next numeric value against nothing, so it is passed
+            if last is not None and last[1] == state.last_changed:
+                del self._last_values[state.entity_id]
+
+        def stats(self) -> dict[str, Any]:
+            """Return the filterer statistics."""
+            return {
+                "deadbanded": self.deadbanded,
+            }
+
+        def _passes_target_filters(self, entity_id: str) -> bool:
+            """Filter an entity on the registry details targeted by the include and exclude settings."""
+            base_msg = f"Processing filters for entity [{entity_id}]: "
+
+            entity: RegistryEntry | None = self._entity_registry.async_get(entity_id)
+
             if not entity:
                 return self._reject(base_msg, "Entity not found in registry.")
 
@@ -390,15 +1061,15 @@ class Pipeline:
 
         def _passes_change_detection_type_filter(self, reason: StateChangeType) -> bool:
             """Determine if a state change should be published."""
-            base_msg = f"Processing change detection type filter: Change type [{reason.value}]: "
 
             # If polling is enabled, we publish all polled events
-            if reason.value == StateChangeType.NO_CHANGE.value:
+            if reason is StateChangeType.NO_CHANGE:
                 return True
 
             if reason.value in self._change_detection_type:
                 return True
 
+            base_msg = f"Processing change detection type filter: Change type [{reason.value}]: "
             return self._reject(base_msg, "is not in the change detection type list.")
 
     class Listener:
@@ -409,7 +1080,9 @@ class Pipeline:
             hass: HomeAssistant,
             filterer: Pipeline.Filterer,
             queue: EventQueue,
+            settings: PipelineSettings,
             log: Logger = BASE_LOGGER,
+            last_queued: dict[str, datetime] | None = None,
         ) -> None:
             """Initialize the listener."""
             self._logger = log if log else BASE_LOGGER
@@ -418,6 +1091,18 @@ class Pipeline:
             self._queue: EventQueue = queue
             self._cancel_listener = None
 
+            # When an event of each entity was last queued, rather than dropped on the way
+            self._last_queued: dict[str, datetime] = last_queued if last_queued is not None else {}
+
+            # Attribute changes limited to these attributes are not published
+            self._ignored_attributes: frozenset[str] = frozenset(settings.ignored_attribute_changes)
+            self._changed_attributes_only: bool = settings.changed_attributes_only
+
+            self._entity_rate_limiter: RateLimiter = RateLimiter(settings.entity_rate_limit)
+            self._domain_rate_limiter: RateLimiter = RateLimiter(settings.domain_rate_limit)
+
+            self.suppressed: int = 0
+
         @async_log_enter_exit_debug
         async def async_init(self) -> None:
             """Initialize the listener."""
@@ -443,8 +1128,74 @@ class Pipeline:
             )
 
             # Ensure we only queue states that pass the filter
-            if self._filterer.passes_filter(new_state, reason):
-                self._queue.put_nowait((event.time_fired, new_state, reason))
+            if not self._filterer.passes_filter(new_state, reason):
+                return
+
+            if reason is StateChangeType.ATTRIBUTE and (
+                self._ignored_attributes or self._changed_attributes_only
+            ):
+                changed = self.changed_attributes(old_state, new_state) - self._ignored_attributes
+
+                if not changed:
+                    self.suppressed += 1
+                    return
+
+                if self._changed_attributes_only:
+                    new_state = self._trim_attributes(new_state, changed)
+
+            if not self._passes_rate_limits(new_state):
+                return
+
+            if self._queue.offer((event.time_fired, new_state, reason)):
+                self._last_queued[new_state.entity_id] = event.time_fired
+                self._filterer.record_queued(new_state, reason)
+
+        def _passes_rate_limits(self, state: State) -> bool:
+            """Limit the rate of events of each entity, and then of each domain."""
+
+            if self._entity_rate_limiter.enabled and not self._entity_rate_limiter.allow(state.entity_id):
+                return False
+
+            return not self._domain_rate_limiter.enabled or self._domain_rate_limiter.allow(state.domain)
+
+        @staticmethod
+        def changed_attributes(old_state: State | None, new_state: State) -> set[str]:
+            """Return the names of the attributes which were added, changed, or removed."""
+            old: Mapping[str, Any] = old_state.attributes if old_state is not None else {}
+            new: Mapping[str, Any] = new_state.attributes
+
+            changed = {key for key, value in new.items() if key not in old or old[key] != value}
+            changed.update(key for key in old if key not in new)
+
+            return changed
+
+        @staticmethod
+        def _trim_attributes(state: State, changed: set[str]) -> State:
+            """Return a copy of the state with only the changed attributes."""
+            attributes = {
+                key: value
+                for key, value in state.attributes.items()
+                if key in changed or key in DOCUMENT_ATTRIBUTES
+            }
+
+            return State(
+                state.entity_id,
+                state.state,
+                attributes,
+                last_changed=state.last_changed,
+                last_reported=state.last_reported,
+                last_updated=state.last_updated,
+                context=state.context,
+                validate_entity_id=False,
+            )
+
+        def stats(self) -> dict[str, Any]:
+            """Return the listener statistics."""
+            return {
+                "suppressed": self.suppressed,
+                "entity_rate_limit": self._entity_rate_limiter.stats(),
+                "domain_rate_limit": self._domain_rate_limiter.stats(),
+            }
 
         @log_enter_exit_debug
         def stop(self) -> None:
@@ -454,30 +1205,43 @@ class Pipeline:
                 self._cancel_listener = None
 
     class Poller:
-        """Polls for state changes and queues them for processing."""
+        """Polls for state changes and buffers them for processing."""
 
         def __init__(
             self,
             hass: HomeAssistant,
             filterer: Pipeline.Filterer,
-            queue: EventQueue,
+            buffer: PollBuffer,
             settings: PipelineSettings,
             log: Logger = BASE_LOGGER,
+            last_queued: dict[str, datetime] | None = None,
         ) -> None:
             """Initialize the poller."""
             self._logger = log if log else BASE_LOGGER
             self._hass: HomeAssistant = hass
-            self._queue: EventQueue = queue
+            self._buffer: PollBuffer = buffer
             self._filterer: Pipeline.Filterer = filterer
             self._settings: PipelineSettings = settings
 
+            # With a max age, only entities without a document for that many seconds are polled
+            self._max_age: timedelta = timedelta(seconds=settings.polling_max_age)
+            self._last_polled: dict[str, datetime] = {}
+            self._last_queued: dict[str, datetime] = last_queued if last_queued is not None else {}
+
+            # Each run polls one shard of the entities, so every entity is polled once per polling frequency
+            self._shards: int = max(1, settings.polling_shards)
+            self._shard: int = 0
+            self._partitions: list[list[str]] = []
+
+            self.skipped: int = 0
+
         @async_log_enter_exit_debug
         async def async_init(self, config_entry: ConfigEntry) -> None:
             """Initialize the poller."""
             state_poll_loop = LoopHandler(
                 name="es_state_poll_loop",
                 func=self.poll,
-                frequency=self._settings.polling_frequency,
+                frequency=self._settings.polling_frequency / self._shards,
                 log=self._logger,
             )
 
@@ -490,15 +1254,182 @@ class Pipeline:
             await state_poll_loop.wait_for_first_run()
 
         async def poll(self) -> None:
-            """Poll for state changes and queue them for send."""
+            """Poll for state changes and buffer them for send."""
 
             now: datetime = datetime.now(tz=UTC)
             reason = StateChangeType.NO_CHANGE
 
-            for state in self._hass.states.async_all():
-                # Ensure we only queue states that pass the filter
-                if self._filterer.passes_filter(state, reason):
-                    self._queue.put_nowait((now, state, reason))
+            shard = self._shard
+            self._shard = (shard + 1) % self._shards
+
+            for index, state in enumerate(self._states(shard)):
+                # Let other tasks run between chunks of a large number of entities
+                if index and index % POLL_CHUNK_SIZE == 0:
+                    await asyncio.sleep(0)
+
+                # Ensure we only buffer states that pass the filter
+                if not self._filterer.passes_filter(state, reason):
+                    continue
+
+                if self._max_age and not self._is_stale(state, now):
+                    self.skipped += 1
+                    continue
+
+                self._buffer.put((now, state, reason))
+                self._last_polled[state.entity_id] = now
+
+        def _states(self, shard: int) -> list[State]:
+            """Return the current states of the entities in a shard.
+
+            The entities are partitioned into shards once per polling frequency, at the start of the first
+            shard, so an entity added during the interval is polled from the next interval on.
+            """
+
+            if self._shards == 1:
+                return self._hass.states.async_all()
+
+            if shard == 0 or not self._partitions:
+                self._partitions = [[] for _ in range(self._shards)]
+
+                for state in self._hass.states.async_all():
+                    self._partitions[self.shard(state.entity_id, self._shards)].append(state.entity_id)
+
+            states = (self._hass.states.get(entity_id) for entity_id in self._partitions[shard])
+
+            # Skip entities removed since the entities were partitioned
+            return [state for state in states if state is not None]
+
+        def _is_stale(self, state: State, now: datetime) -> bool:
+            """Determine if the last document of the entity is at least max age old, and a heartbeat is due."""
+
+            times = [
+                last
+                for last in (self._last_polled.get(state.entity_id), self._last_queued.get(state.entity_id))
+                if last
+            ]
+
+            return not times or now - max(times) >= self._max_age
+
+        @staticmethod
+        def shard(entity_id: str, shards: int) -> int:
+            """Return the shard of an entity, which is stable across runs and restarts."""
+            return zlib.crc32(entity_id.encode()) % shards
+
+        def stats(self) -> dict[str, Any]:
+            """Return the poller statistics."""
+            return {
+                "max_age": self._max_age.total_seconds(),
+                "shards": self._shards,
+                "skipped": self.skipped,
+            }
+
+    class Aggregator:
+        """Rolls the numeric values of chatty entities into one document per entity and window of time.
+
+        Applies to the entities of the configured domains or labels. Windows are aligned to the window
+        length, and a window is published once it has ended, with the min, max, avg, last, and count of
+        its values alongside the last state in the window. Non-numeric states and attribute changes are
+        published as usual.
+        """
+
+        def __init__(
+            self, hass: HomeAssistant, settings: PipelineSettings, log: Logger = BASE_LOGGER
+        ) -> None:
+            """Initialize the aggregator."""
+            self._logger = log if log else BASE_LOGGER
+
+            self._window: timedelta = timedelta(seconds=settings.aggregation_window)
+            self._domains: frozenset[str] = frozenset(settings.aggregation_domains)
+            self._labels: frozenset[str] = frozenset(settings.aggregation_labels)
+            self._enabled: bool = bool(self._window) and bool(self._domains or self._labels)
+
+            self._entity_registry = entity_registry.async_get(hass)
+
+            self._windows: dict[str, AggregationWindow] = {}
+            self._closed: list[AggregationWindow] = []
+
+            self.aggregated: int = 0
+
+            if self._window and not self._enabled:
+                self._logger.warning("No aggregation domains or labels set. Disabling aggregation.")
+
+        def aggregates(self, state: State) -> bool:
+            """Determine if the values of the entity are aggregated."""
+
+            if state.domain in self._domains:
+                return True
+
+            if not self._labels:
+                return False
+
+            entity: RegistryEntry | None = self._entity_registry.async_get(state.entity_id)
+
+            return entity is not None and not self._labels.isdisjoint(entity.labels)
+
+        def add(self, time: datetime, state: State, reason: StateChangeType) -> bool:
+            """Add the value of a state to the window of its entity, return False if it is not aggregated."""
+
+            if not self._enabled or reason is not StateChangeType.STATE or not self.aggregates(state):
+                return False
+
+            value: float | None = Pipeline.Formatter.coerce_value(state.state).get("float")
+
+            if value is None:
+                return False
+
+            start = self._window_start(time)
+            window = self._windows.get(state.entity_id)
+
+            if window is not None and window.start == start:
+                window.add(time, state, reason, value)
+            else:
+                if window is not None:
+                    self._closed.append(window)
+
+                self._windows[state.entity_id] = AggregationWindow(
+                    start=start,
+                    time=time,
+                    state=state,
+                    reason=reason,
+                    minimum=value,
+                    maximum=value,
+                    total=value,
+                    last=value,
+                )
+
+            self.aggregated += 1
+
+            return True
+
+        def _window_start(self, time: datetime) -> datetime:
+            """Return the start of the window the time falls in."""
+            timestamp = time.timestamp()
+
+            return datetime.fromtimestamp(timestamp - timestamp % self._window.total_seconds(), tz=UTC)
+
+        def flush(self, now: datetime) -> list[AggregationWindow]:
+            """Remove and return the windows which have ended."""
+
+            closed, self._closed = self._closed, []
+
+            for entity_id, window in list(self._windows.items()):
+                if window.start + self._window <= now:
+                    closed.append(self._windows.pop(entity_id))
+
+            return closed
+
+        def close(self) -> None:
+            """Close the open windows, so the next flush returns them whether they have ended or not."""
+            self._closed.extend(self._windows.values())
+            self._windows.clear()
+
+        def stats(self) -> dict[str, Any]:
+            """Return the aggregator statistics."""
+            return {
+                "window": self._window.total_seconds(),
+                "open": len(self._windows),
+                "aggregated": self.aggregated,
+            }
 
     class Formatter:
         """Formats state changes into documents."""
@@ -509,39 +1440,71 @@ class Pipeline:
             """Initialize the formatter."""
             self._logger = log if log else BASE_LOGGER
             self._static_fields: dict[str, Any] = {}
+            self._flat_static_fields: dict[str, Any] = {}
 
             self._debug_attribute_filtering: bool = settings.debug_attribute_filtering
 
+            # The converted attributes of each entity, with the attributes object they were converted from
+            self._attributes: dict[str, tuple[Mapping[str, Any], dict[str, Any]]] = {}
+
             self._extended_entity_details = ExtendedEntityDetails(hass, self._logger)
 
         @async_log_enter_exit_debug
         async def async_init(self, static_fields: dict[str, Any]) -> None:
             """Initialize the formatter."""
             self._static_fields = static_fields
+            self._flat_static_fields = utils.flatten_into({}, static_fields)
 
-        def format(self, time: datetime, state: State, reason: StateChangeType) -> dict[str, Any]:
-            """Format the state change into a document."""
+            await self._extended_entity_details.async_init()
 
-            document = {
+        def stop(self) -> None:
+            """Stop the formatter."""
+            self._extended_entity_details.stop()
+            self._attributes.clear()
+
+        def format(
+            self,
+            time: datetime,
+            state: State,
+            reason: StateChangeType,
+            details: dict[str, Any] | None = None,
+        ) -> dict[str, Any]:
+            """Format the state change into a document.
+
+            The entity details are looked up in the registries unless given, which is only safe on the event
+            loop. Given the details from entity_details, formatting can run in an executor.
+            """
+
+            # Build the flattened document in place, in the key order of the nested document it replaces
+            document: dict[str, Any] = {
                 "@timestamp": time.isoformat(),
                 "event.action": reason.to_publish_reason(),
                 "event.kind": "event",
                 "event.type": "info" if reason == StateChangeType.NO_CHANGE else "change",
-                "hass.entity": {**self._state_to_extended_details(state)},
-                "hass.entity.attributes": self._state_to_attributes(state),
-                "hass.entity.value": state.state,
-                "hass.entity.valueas": self._state_to_coerced_value(state),
-                "hass.entity.object.id": state.object_id,
-                **Pipeline.Formatter.domain_to_datastream(state.domain),
-                **self._static_fields,
             }
 
-            return utils.prepare_dict(document)
+            utils.flatten_into(document, self._state_to_extended_details(state, details), "hass.entity")
+            utils.flatten_into(document, self._state_to_attributes(state), "hass.entity.attributes")
+            document["hass.entity.value"] = state.state
+            utils.flatten_into(document, self._state_to_coerced_value(state), "hass.entity.valueas")
+            document["hass.entity.object.id"] = state.object_id
+            document.update(Pipeline.Formatter.domain_to_datastream(state.domain))
+            document.update(self._flat_static_fields)
+
+            return document
+
+        def entity_details(self, entity_id: str) -> dict[str, Any]:
+            """Return the registry details of an entity, which are shared between documents and must not be modified."""
+            return self._extended_entity_details.async_get_dict(entity_id)
 
-        def _state_to_extended_details(self, state: State) -> dict:
+        def _state_to_extended_details(self, state: State, details: dict[str, Any] | None = None) -> dict:
             """Gather entity details from the state object and return a mapped dictionary ready to be put in an elasticsearch document."""
 
-            document = self._extended_entity_details.async_get(state.entity_id).to_dict()
+            if details is None:
+                details = self.entity_details(state.entity_id)
+
+            # Copy the cached details, which are shared between documents
+            document = {**details}
 
             # The logic for friendly name is in the state for some reason
             document["friendly_name"] = state.name
@@ -552,7 +1515,25 @@ class Pipeline:
             return document
 
         def _state_to_attributes(self, state: State) -> dict:
-            """Convert the attributes of a State object into a dictionary compatible with Elasticsearch mappings."""
+            """Convert the attributes of a State object into a dictionary compatible with Elasticsearch mappings.
+
+            Home Assistant keeps the same attributes object when only the state of an entity changes, so the
+            converted attributes are reused until the attributes object changes. The result is shared between
+            documents and must not be modified.
+            """
+
+            cached = self._attributes.get(state.entity_id)
+
+            if cached is not None and cached[0] is state.attributes:
+                return cached[1]
+
+            attributes = self._convert_attributes(state)
+            self._attributes[state.entity_id] = (state.attributes, attributes)
+
+            return attributes
+
+        def _convert_attributes(self, state: State) -> dict:
+            """Filter, normalize, and convert the attributes of a State object."""
 
             attributes = {}
 
@@ -576,18 +1557,28 @@ class Pipeline:
 
         def _state_to_coerced_value(self, state: State) -> dict:
             """Coerce the state value into a dictionary of possible types."""
-            value: str = state.state
+            return self.coerce_value(state.state)
+
+        @classmethod
+        @lru_cache(maxsize=COERCED_VALUE_CACHE_SIZE)
+        def coerce_value(cls, value: str) -> dict:
+            """Coerce a state value into a dictionary of possible types.
+
+            The result is cached and shared between documents, so it must not be modified.
+            """
 
-            success, result = self.try_state_as_boolean(state)
-            if success and result is not None:
-                return {"boolean": result}
+            if value in TRUE_STATES:
+                return {"boolean": True}
 
-            success, result = self.try_state_as_number(state)
-            if success and result is not None:
-                return {"float": result}
+            if value in FALSE_STATES:
+                return {"boolean": False}
 
-            success, result = self.try_state_as_datetime(state)
-            if success and result is not None:
+            number = cls.value_as_number(value)
+            if number is not None:
+                return {"float": number}
+
+            result = cls.value_as_datetime(value)
+            if result is not None:
                 return {
                     "datetime": result.isoformat(),
                     "date": result.date().isoformat(),
@@ -606,6 +1597,7 @@ class Pipeline:
             return re.sub(r"[^a-z0-9_]", "", domain.lower())[0:128]
 
         @staticmethod
+        @lru_cache(maxsize=128)
         def domain_to_datastream(domain: str) -> dict:
             """Convert the state into a datastream."""
             return {
@@ -657,75 +1649,29 @@ class Pipeline:
             return replaced_string.lower()
 
         # Methods for value coercion
-        @classmethod
-        def try_state_as_number(cls, state: State) -> tuple[bool, float | None]:
-            """Try to coerce our state to a number and return true if we can, false if we can't."""
-            try:
-                return True, cls.state_as_number(state)
-            except ValueError:
-                return False, None
-
-        @classmethod
-        def state_as_number(cls, state: State) -> float:
-            """Try to coerce our state to a number."""
-
-            number = state_helper.state_as_number(state)
-
-            if isinf(number) or isnan(number):
-                msg = "Could not coerce state to a number."
-                raise ValueError(msg)
+        @staticmethod
+        def value_as_number(value: str) -> float | None:
+            """Return the state value as a finite number, or None if it is not one."""
+            if NUMBER_RE.fullmatch(value) is None:
+                return None
 
-            return number
+            number = float(value)
 
-        @classmethod
-        def try_state_as_boolean(cls, state: State) -> tuple[bool, bool | None]:
-            """Try to coerce our state to a boolean and return true if we can, false if we can't."""
-            try:
-                return True, cls.state_as_boolean(state)
-            except ValueError:
-                return False, None
+            # Numbers too large for a float overflow to infinity
+            return None if isinf(number) else number
 
-        @classmethod
-        def state_as_boolean(cls, state: State) -> bool:
-            """Try to coerce our state to a boolean."""
-            # copied from helper state_as_number function
-            if state.state in (
-                "true",
-                STATE_ON,
-                STATE_LOCKED,
-                STATE_ABOVE_HORIZON,
-                STATE_OPEN,
-                STATE_HOME,
-            ):
-                return True
-            if state.state in (
-                "false",
-                STATE_OFF,
-                STATE_UNLOCKED,
-                STATE_UNKNOWN,
-                STATE_BELOW_HORIZON,
-                STATE_CLOSED,
-                STATE_NOT_HOME,
-            ):
-                return False
-
-            msg = "Could not coerce state to a boolean."
-            raise ValueError(msg)
+        @staticmethod
+        def value_as_datetime(value: str) -> datetime | None:
+            """Return the state value as a datetime, or None if it is not one."""
 
-        @classmethod
-        def try_state_as_datetime(cls, state: State) -> tuple[bool, datetime | None]:
-            """Try to coerce our state to a datetime and return True if we can, false if we can't."""
+            # Every format accepted by parse_datetime starts with a four digit year
+            if len(value) <= 4 or not value[:4].isdecimal():
+                return None
 
             try:
-                return True, cls.state_as_datetime(state)
+                return dt_util.parse_datetime(value, raise_on_error=True)
             except ValueError:
-                return False, None
-
-        @classmethod
-        def state_as_datetime(cls, state: State) -> datetime:
-            """Try to coerce our state to a datetime."""
-
-            return dt_util.parse_datetime(state.state, raise_on_error=True)
+                return None
 
     class Publisher:
         """Publishes documents to Elasticsearch."""
@@ -745,10 +1691,34 @@ class Pipeline:
             self._settings = settings
             self._hass = hass
             self._queue: EventQueue = manager.queue
+            self._bulk_builder: BulkBodyBuilder = BulkBodyBuilder()
+            self._retry_queue: BulkRetryQueue = BulkRetryQueue()
+            self._dead_letters: DeadLetterSink = DeadLetterSink(
+                log=self._logger, datastream=settings.dead_letter_datastream
+            )
+            self._spill_queue: SpillQueue | None = None
+            self._loop: LoopHandler | None = None
+
+            # A publish which is running when the publisher stops finishes before the final publish starts
+            self._publishing: asyncio.Lock = asyncio.Lock()
+
+            self._interval: AdaptiveInterval = AdaptiveInterval(
+                frequency=settings.publish_frequency,
+                max_frequency=settings.publish_max_frequency,
+            )
 
         @async_log_enter_exit_debug
         async def async_init(self, config_entry: ConfigEntry) -> None:
             """Initialize the publisher."""
+            if self._settings.spill_to_disk:
+                self._spill_queue = SpillQueue(
+                    hass=self._hass,
+                    path=Path(self._hass.config.path(STORAGE_DIR, f"{DOMAIN}_spill", config_entry.entry_id)),
+                    max_size=self._settings.spill_max_size,
+                    log=self._logger,
+                )
+                await self._spill_queue.async_init()
+
             filter_format_publish = LoopHandler(
                 name="es_filter_format_publish_loop",
                 func=self.publish,
@@ -756,6 +1726,8 @@ class Pipeline:
                 log=self._logger,
             )
 
+            self._loop = filter_format_publish
+
             config_entry.async_create_background_task(
                 self._hass,
                 async_create_catching_coro(filter_format_publish.start()),
@@ -764,43 +1736,206 @@ class Pipeline:
 
             await filter_format_publish.wait_for_first_run()
 
-        @staticmethod
-        @lru_cache(maxsize=128)
-        def _format_datastream_name(
-            datastream_type: str,
-            datastream_dataset: str,
-            datastream_namespace: str,
-        ) -> str:
-            """Format the datastream name."""
-            return f"{datastream_type}-{datastream_dataset}-{datastream_namespace}"
-
-        async def _add_action_and_meta_data(
-            self,
-            iterable: AsyncGenerator[dict[str, Any], Any],
-        ) -> AsyncGenerator[dict[str, Any], Any]:
-            """Prepare the document for insertion into Elasticsearch."""
-            async for document in iterable:
-                yield {
-                    "_op_type": "create",
-                    "_index": self._format_datastream_name(
-                        datastream_type=document["data_stream.type"],
-                        datastream_dataset=document["data_stream.dataset"],
-                        datastream_namespace=document["data_stream.namespace"],
-                    ),
-                    "_source": document,
-                }
+        async def _spill(self, lines: list[bytes] | None = None) -> None:
+            """Write the given bulk lines to the spill queue, or everything in the queue if none are given."""
+            assert self._spill_queue is not None
+
+            if lines is None and self._settings.format_in_executor:
+                lines = [line for _, chunk in await self._build_chunks_in_executor(lanes=1) for line in chunk]
+            elif lines is None:
+                lines = [
+                    line
+                    async for chunk in self._bulk_builder.chunks(self._manager.sip_queue())
+                    for line in chunk
+                ]
+
+            if not lines:
+                return
+
+            try:
+                await self._spill_queue.append(lines)
+            except OSError:
+                msg = "Error writing documents to the spill queue. Discarding %d documents."
+
+                self._logger.error(msg, len(lines) // 2)
+                self._logger.debug(msg, len(lines) // 2, exc_info=True)
+                return
+
+            self._logger.debug("Spilled %d documents to disk.", len(lines) // 2)
+
+        async def async_stop(self) -> None:
+            """Stop the publishing loop, then publish the documents which are left, if publishing started."""
+            if self._loop is None:
+                return
+
+            self._loop.stop()
+
+            await self.publish()
+
+        def flush_soon(self) -> None:
+            """Publish as soon as possible, unless publishing is backing off after a failure."""
+            if self._loop is None or self._interval.backing_off:
+                return
+
+            self._logger.debug("Queue reached the flush threshold, publishing early.")
+            self._loop.run_soon()
+
+        def _reschedule(self, frequency: int) -> None:
+            """Change the publish frequency if it differs from the current one."""
+            if self._loop is not None and self._loop.frequency != frequency:
+                self._loop.reschedule(frequency)
+
+        async def _bulk(self, body: bytes, attempts: list[int] | None = None) -> None:
+            """Send a bulk request body to Elasticsearch, handling the documents it rejects.
+
+            Documents rejected with a retryable error are requeued until they run out of attempts, the others
+            go to the dead letter sink, as do all documents of a request Elasticsearch rejects as a whole.
+            attempts holds the number of times each document was sent before, which is none for new
+            documents.
+            """
+            try:
+                outcome = await self._gateway.bulk_ndjson(body=body)
+            except ClientError as err:
+                # Sending the request again would fail the same way, so it is not spilled or retried
+                items = split_items(body)
+                error = {"error": {"type": "request_rejected", "reason": str(err)}}
+
+                for _, source in items:
+                    self._dead_letters.add(source, error)
+
+                self._logger.error(
+                    "Elasticsearch rejected a bulk request of %d documents: %s", len(items), err
+                )
+                return
+
+            if not outcome.retryable and not outcome.rejected:
+                return
+
+            items = split_items(body)
+            requeued = 0
+
+            for index, error in outcome.retryable:
+                action, source = items[index]
+
+                if self._retry_queue.add(action, source, attempts=(attempts[index] if attempts else 0) + 1):
+                    requeued += 1
+                else:
+                    self._dead_letters.add(source, error)
+
+            for index, error in outcome.rejected:
+                self._dead_letters.add(items[index][1], error)
+
+            if requeued:
+                self._logger.warning("Requeued %d documents rejected with a retryable error.", requeued)
+
+        async def _retry(self) -> bool:
+            """Send the documents which are due to be retried, returning True if there were any."""
+            # Documents requeued while retrying are not due again until after their backoff
+            due = self._retry_queue.pop_due(limit=len(self._retry_queue))
+
+            for start in range(0, len(due), BULK_CHUNK_SIZE):
+                chunk = due[start : start + BULK_CHUNK_SIZE]
+
+                try:
+                    await self._bulk(
+                        b"".join(action + source for _, action, source in chunk),
+                        attempts=[attempts for attempts, _, _ in chunk],
+                    )
+                except Exception:
+                    self._retry_queue.restore(due[start:])
+                    raise
+
+            return bool(due)
+
+        async def _publish_dead_letters(self) -> None:
+            """Publish the documents rejected by Elasticsearch to the dead letter datastream."""
+            documents = self._dead_letters.pop_documents()
+
+            if not documents:
+                return
+
+            body = b"".join(action + source for action, source in map(self._bulk_builder.to_lines, documents))
+
+            try:
+                outcome = await self._gateway.bulk_ndjson(body=body)
+            except ClientError as err:
+                self._logger.warning(
+                    "Discarding %d documents rejected by the dead letter datastream: %s", len(documents), err
+                )
+                return
+            except Exception:
+                self._dead_letters.restore(documents)
+                raise
+
+            # Dead letters are not dead-lettered again, but those rejected with a retryable error are kept
+            self._dead_letters.restore([documents[index] for index, _ in outcome.retryable])
+
+            if outcome.rejected:
+                self._logger.warning(
+                    "Discarding %d documents rejected by the dead letter datastream.", len(outcome.rejected)
+                )
+
+        async def _build_chunks_in_executor(self, lanes: int) -> list[tuple[int, list[bytes]]]:
+            """Drain the queue on the event loop, then format and serialize the batch in an executor."""
+            batch = self._manager.snapshot_batch()
+
+            if not batch:
+                return []
+
+            return await self._hass.async_add_executor_job(self._build_chunks, batch, lanes)
+
+        def _build_chunks(self, batch: list[BatchItem], lanes: int) -> list[tuple[int, list[bytes]]]:
+            """Format and serialize a batch into bulk chunks, off the event loop."""
+            return self._bulk_builder.build_lane_chunks(self._manager.format_batch(batch), lanes=lanes)
 
         async def publish(self) -> None:
+            """Publish the documents to Elasticsearch, one publish at a time."""
+            async with self._publishing:
+                await self._publish()
+
+        async def _publish(self) -> None:
             """Publish the document to Elasticsearch."""
 
+            # Documents of an entity share a lane, so they are published in order
+            sender = BulkSender(send=self._bulk, max_in_flight=self._settings.bulk_max_in_flight)
+
             try:
                 if not await self._gateway.check_connection():
+                    if self._spill_queue is not None:
+                        await self._spill()
+
                     self._logger.debug("Skipping publishing as connection is not available.")
+                    self._reschedule(self._interval.failure())
                     return
 
-                actions = self._add_action_and_meta_data(iterable=self._manager.sip_queue())
+                # Documents spilled to disk or waiting to be retried are sent before new documents
+                resent = False
 
-                await self._gateway.bulk(actions=actions)
+                if self._spill_queue is not None and not self._spill_queue.empty():
+                    await self._spill_queue.replay(self._bulk)
+                    resent = True
+
+                if await self._retry():
+                    resent = True
+
+                if self._settings.format_in_executor:
+                    chunks = iterate_chunks(
+                        iter(await self._build_chunks_in_executor(lanes=sender.max_in_flight))
+                    )
+                else:
+                    chunks = self._bulk_builder.lane_chunks(
+                        self._manager.sip_queue(), lanes=sender.max_in_flight
+                    )
+
+                sent = await sender.send(chunks)
+
+                await self._publish_dead_letters()
+
+                if sent > 0 or resent:
+                    self._reschedule(self._interval.success())
+                else:
+                    self._logger.debug("Publish skipped, no new events to publish.")
+                    self._reschedule(self._interval.idle())
 
             except AuthenticationRequired:
                 msg = "Authentication issue in publishing loop."
@@ -815,8 +1950,31 @@ class Pipeline:
                 self._logger.error(msg)
                 self._logger.debug(msg, exc_info=True)
 
+                self._reschedule(self._interval.failure())
+
+                # The sender drains the whole batch into unsent, events queued since wait for the next publish
+                if self._spill_queue is not None:
+                    await self._spill(sender.unsent)
+                elif sender.unsent:
+                    self._logger.warning(
+                        "Discarding %d documents that were not published.", len(sender.unsent) // 2
+                    )
+
             except Exception:  # noqa: BLE001
                 msg = "Unknown error while publishing documents."
 
                 self._logger.error(msg)
                 self._logger.debug(msg, exc_info=True)
+
+        def diagnostics(self) -> dict[str, Any]:
+            """Return diagnostic information about the publisher."""
+            diagnostics: dict[str, Any] = {
+                "interval": self._interval.stats(),
+                "retry_queue": self._retry_queue.stats(),
+                "dead_letters": self._dead_letters.stats(),
+            }
+
+            if self._spill_queue is not None:
+                diagnostics["spill_queue"] = self._spill_queue.stats()
+
+            return diagnostics
@@ -10,41 +10,72 @@ from .logger import LOGGER as BASE_LOGGER
 
 
 class LoopHandler:
-    """Handle a loop for a given function."""
+    """Handle a loop for a given function.
 
-    def __init__(self, func: typing.Callable, name: str, frequency: int, log: Logger = BASE_LOGGER) -> None:
+    Runs are scheduled at a fixed rate: each run is due one period after the previous one was due, so the
+    time taken by a run does not delay the next. Between runs the loop sleeps on a timer set with
+    loop.call_at for the exact time of the next run, and wakes up early when the loop is rescheduled or
+    stopped. Frequencies may be fractions of a second.
+    """
+
+    def __init__(self, func: typing.Callable, name: str, frequency: float, log: Logger = BASE_LOGGER) -> None:
         """Initialize the loop handler."""
         self._func: typing.Callable = func
 
         self._name = name
 
-        self._frequency: int = frequency
+        self._frequency: float = frequency
         self._running: bool = False
         self._should_stop: bool = False
+        self._run_soon: bool = False
         self._run_count: int = 0
 
         self._log: Logger = log
         self._next_run_time: float = time.monotonic()
+        self._last_run_time: float = self._next_run_time
+
+        # Set to interrupt the sleep until the next run
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._first_run: asyncio.Event = asyncio.Event()
+
+    @property
+    def frequency(self) -> float:
+        """Return the number of seconds between runs."""
+        return self._frequency
 
     def get_run_count(self) -> int:
         """Return the number of times the loop has run."""
         return self._run_count
 
+    def run_soon(self) -> None:
+        """Run the loop as soon as possible, or right after the current run if one is in progress."""
+        self._run_soon = True
+        self._next_run_time = time.monotonic()
+        self._wakeup.set()
+        self._log.debug("Next run of loop: %s requested as soon as possible", self._name)
+
+    def reschedule(self, frequency: float) -> None:
+        """Change the number of seconds between runs, starting with the next run.
+
+        A run requested with run_soon is still run as soon as possible.
+        """
+        self._frequency = frequency
+        if not self._run_soon:
+            self._next_run_time = self._last_run_time + frequency
+        self._wakeup.set()
+        self._log.debug("Loop: %s rescheduled to run every %ss", self._name, frequency)
+
     async def wait_for_first_run(self) -> None:
-        """Wait for the first run of the loop."""
-        while self._run_count == 0:
-            await asyncio.sleep(0.1)
+        """Wait for the first run of the loop to complete, or for the loop to stop."""
+        await self._first_run.wait()
 
     def _time_to_run(self) -> bool:
         """Determine if now is a good time to poll for state changes."""
         return self._next_run_time <= time.monotonic()
 
-    def _time_until_next_run(self) -> int:
-        """Return the time until the next run."""
-
-        # If the next run time is in the past, return 0
-        # Otherwise, return the time until the next run, round up to the nearest second
-        return max(0, int(self._next_run_time - time.monotonic()))
+    def _time_until_next_run(self) -> float:
+        """Return the number of seconds until the next run, or 0 if it is due."""
+        return max(0.0, self._next_run_time - time.monotonic())
 
     async def _wait_for_next_run(self) -> None:
         """Wait for the next poll time."""
@@ -56,12 +87,21 @@ class LoopHandler:
             continue
 
     def _schedule_next_run(self) -> None:
-        self._next_run_time = time.monotonic() + self._frequency
+        now = time.monotonic()
+        self._run_soon = False
+
+        # Skip the runs missed while the previous run overran, keeping to the original schedule
+        due = self._next_run_time
+        if self._frequency > 0 and now - due >= self._frequency:
+            due += (now - due) // self._frequency * self._frequency
+
+        self._last_run_time = due
+        self._next_run_time = due + self._frequency
         self._log.debug(
             "Next run of loop: %s scheduled for roughly %s (UTC) -- %ss from now",
             self._name,
-            datetime.now(tz=UTC) + timedelta(0, self._frequency),
-            self._frequency,
+            datetime.now(tz=UTC) + timedelta(seconds=self._next_run_time - now),
+            round(self._next_run_time - now, 3),
         )
 
     def _should_keep_running(self) -> bool:
@@ -72,21 +112,37 @@ class LoopHandler:
         """Determine if the runner should stop."""
         return self._should_stop
 
-    async def _spin(self, duration: int = 1) -> None:
-        """Spin the event loop."""
-        await asyncio.sleep(duration)
+    async def _spin(self) -> None:
+        """Sleep until the next run is due, or until woken up by run_soon, reschedule, or stop."""
+        loop = asyncio.get_running_loop()
+
+        self._wakeup.clear()
+        timer = loop.call_at(loop.time() + self._time_until_next_run(), self._wakeup.set)
+
+        try:
+            await self._wakeup.wait()
+        finally:
+            timer.cancel()
 
     def stop(self) -> None:
         """Stop the loop."""
         self._should_stop = True
         self._running = False
+        self._wakeup.set()
+        self._first_run.set()
 
     async def start(self) -> None:
         """Start the loop."""
         self._running = True
 
         while self._should_keep_running():
-            await self._wait_for_next_run()
+            try:
+                await self._wait_for_next_run()
+            except RuntimeError:
+                if self._should_stop_running():
+                    return
+                raise
+
             self._schedule_next_run()
 
             self._run_count += 1
@@ -97,3 +153,53 @@ class LoopHandler:
                 self._log.error("Unexpected error in loop handler: %s", self._name)
                 self.stop()
                 raise
+            finally:
+                self._first_run.set()
+
+
+class AdaptiveInterval:
+    """Adapt the interval between runs of a loop to the outcome of each run.
+
+    A run that did work resets the interval to the base frequency. Consecutive failures back off
+    exponentially, and idle runs stretch the interval, both up to the maximum frequency.
+    """
+
+    def __init__(self, frequency: int, max_frequency: int = 0) -> None:
+        """Initialize the interval."""
+        self._frequency: int = frequency
+        self._max_frequency: int = max(frequency, max_frequency)
+
+        self.current: int = frequency
+        self.failures: int = 0
+
+    @property
+    def backing_off(self) -> bool:
+        """Return True if the last run failed."""
+        return self.failures > 0
+
+    def success(self) -> int:
+        """Record a run that did work and return the next interval."""
+        self.failures = 0
+        self.current = self._frequency
+        return self.current
+
+    def idle(self) -> int:
+        """Record a run that had nothing to do and return the next interval."""
+        self.failures = 0
+        self.current = min(self._max_frequency, self.current * 2)
+        return self.current
+
+    def failure(self) -> int:
+        """Record a failed run and return the next interval."""
+        self.failures += 1
+        self.current = min(self._max_frequency, self._frequency * 2**self.failures)
+        return self.current
+
+    def stats(self) -> dict[str, int]:
+        """Return the interval statistics."""
+        return {
+            "frequency": self._frequency,
+            "max_frequency": self._max_frequency,
+            "current": self.current,
+            "failures": self.failures,
+        }
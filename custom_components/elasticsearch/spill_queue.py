@@ -0,0 +1,341 @@
+"""Disk-backed spill queue for documents that could not be published."""
+
+from __future__ import annotations
+
+import gzip
+import os
+import zlib
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from logging import Logger
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .logger import LOGGER as BASE_LOGGER
+
+if TYPE_CHECKING:  # pragma: no cover
+    from homeassistant.core import HomeAssistant
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".ndjson"
+COMPACTED_SUFFIX = ".ndjson.gz"
+PARTIAL_SUFFIX = ".partial"
+
+# Each segment is replayed as a single bulk request, so this also bounds the size of replay requests
+DEFAULT_SEGMENT_SIZE: int = 5 * 1024 * 1024
+
+
+@dataclass
+class Segment:
+    """A segment file of the spill queue, size is the number of bytes it takes on disk."""
+
+    path: Path
+    size: int
+    documents: int
+
+    # Closed segments take no more documents, and are compacted once
+    closed: bool = False
+    compacted: bool = False
+
+
+class SpillQueue:
+    """Write-ahead log of pre-serialized NDJSON bulk lines.
+
+    Documents are appended to segment files as action/document line pairs, with a single fsync per segment
+    written by an appended batch, and a new segment is started before one grows past the segment size.
+    Closed segments are compacted with gzip, so a long outage takes a fraction of the space on disk.
+    Segments are replayed oldest first and deleted once Elasticsearch has accepted them, so replay is
+    at-least-once. When the total size exceeds the cap, the oldest segments are discarded.
+
+    Only file I/O runs in the executor, the segments are tracked on the event loop. The segment being
+    replayed takes no more documents and is not compacted, so documents can be spilled during a replay.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        path: Path,
+        max_size: int,
+        segment_size: int = DEFAULT_SEGMENT_SIZE,
+        log: Logger = BASE_LOGGER,
+    ) -> None:
+        """Initialize the spill queue."""
+        self._hass: HomeAssistant = hass
+        self._path: Path = path
+        self._max_size: int = max_size
+        self._segment_size: int = min(segment_size, max(1, max_size // 4))
+        self._logger: Logger = log if log else BASE_LOGGER
+
+        self._segments: deque[Segment] = deque()
+        self._next_sequence: int = 0
+        self._replaying: Segment | None = None
+
+        self.dropped: int = 0
+        self.replayed: int = 0
+
+    async def async_init(self) -> None:
+        """Load existing segments from disk, repairing any torn write at the tail."""
+        segments, self._next_sequence = await self._hass.async_add_executor_job(self._load)
+        self._segments.extend(segments)
+
+        if self._segments:
+            self._logger.info(
+                "Found %d spilled documents in %d segments pending replay.",
+                self.documents,
+                len(self._segments),
+            )
+
+        await self._compact()
+
+    @property
+    def documents(self) -> int:
+        """Return the number of documents pending replay."""
+        return sum(segment.documents for segment in self._segments)
+
+    @property
+    def size(self) -> int:
+        """Return the number of bytes pending replay."""
+        return sum(segment.size for segment in self._segments)
+
+    def empty(self) -> bool:
+        """Return True if there is nothing to replay."""
+        return not self._segments
+
+    async def append(self, lines: list[bytes]) -> None:
+        """Append action/document line pairs to the spill queue."""
+        if not lines:
+            return
+
+        for segment, data, documents in self._plan(lines):
+            await self._hass.async_add_executor_job(self._write, segment.path, data)
+
+            segment.size += len(data)
+            segment.documents += documents
+
+            # New segments are only tracked once they hold documents
+            if not self._segments or self._segments[-1] is not segment:
+                self._segments.append(segment)
+
+        await self._compact()
+        await self._enforce_max_size()
+
+    async def replay(self, send: Callable[[bytes], Awaitable[Any]]) -> None:
+        """Send each segment, oldest first, deleting it once sent. Stops at the first failure."""
+        while self._segments:
+            segment = self._segments[0]
+
+            # Documents spilled from now on go to a new segment, not to the one being sent
+            segment.closed = True
+            self._replaying = segment
+
+            try:
+                body: bytes = await self._hass.async_add_executor_job(self._read, segment.path)
+
+                await send(body)
+            finally:
+                self._replaying = None
+
+            if self._segments and self._segments[0] is segment:
+                self._segments.popleft()
+            await self._hass.async_add_executor_job(self._unlink, segment.path)
+
+            self.replayed += segment.documents
+            self._logger.info("Replayed %d spilled documents.", segment.documents)
+
+    def stats(self) -> dict[str, Any]:
+        """Return the spill queue statistics."""
+        return {
+            "segments": len(self._segments),
+            "compacted": sum(1 for segment in self._segments if self._is_compacted(segment.path)),
+            "size": self.size,
+            "max_size": self._max_size,
+            "documents": self.documents,
+            "dropped": self.dropped,
+            "replayed": self.replayed,
+        }
+
+    def _plan(self, lines: list[bytes]) -> list[tuple[Segment, bytes, int]]:
+        """Split the lines into the data to write to each segment, starting new segments as they fill up."""
+        segment = self._segments[-1] if self._segments and not self._segments[-1].closed else None
+        size = segment.size if segment is not None else 0
+        pairs: list[bytes] = []
+        writes: list[tuple[Segment, bytes, int]] = []
+
+        for index in range(0, len(lines) - 1, 2):
+            pair = lines[index] + lines[index + 1]
+
+            # A segment always takes its first document, even one larger than the segment size
+            if segment is None or (size and size + len(pair) > self._segment_size):
+                if segment is not None:
+                    segment.closed = True
+
+                    if pairs:
+                        writes.append((segment, b"".join(pairs), len(pairs)))
+
+                segment = Segment(
+                    path=self._path / f"{SEGMENT_PREFIX}{self._next_sequence:012d}{SEGMENT_SUFFIX}",
+                    size=0,
+                    documents=0,
+                )
+                self._next_sequence += 1
+                size, pairs = 0, []
+
+            pairs.append(pair)
+            size += len(pair)
+
+        if segment is not None and pairs:
+            writes.append((segment, b"".join(pairs), len(pairs)))
+
+        return writes
+
+    async def _compact(self) -> None:
+        """Gzip the closed segments, keeping those that do not get any smaller as they are."""
+        for segment in [
+            segment
+            for segment in self._segments
+            if segment.closed and not segment.compacted and segment is not self._replaying
+        ]:
+            try:
+                compacted: tuple[Path, int] | None = await self._hass.async_add_executor_job(
+                    self._compress, segment.path, segment.size
+                )
+            except OSError:
+                msg = "Error compacting spill segment [%s], it is kept as it is."
+
+                self._logger.warning(msg, segment.path.name)
+                self._logger.debug(msg, segment.path.name, exc_info=True)
+                continue
+
+            segment.compacted = True
+
+            if compacted is not None:
+                segment.path, segment.size = compacted
+
+    async def _enforce_max_size(self) -> None:
+        """Discard the oldest segments until the spill queue fits within the size cap."""
+        while self._segments and self.size > self._max_size:
+            segment = self._segments.popleft()
+            await self._hass.async_add_executor_job(self._unlink, segment.path)
+
+            self.dropped += segment.documents
+            self._logger.warning(
+                "Spill queue exceeds %d bytes. Discarded %d of the oldest spilled documents.",
+                self._max_size,
+                segment.documents,
+            )
+
+    # Blocking helpers, these must run in the executor
+
+    def _load(self) -> tuple[list[Segment], int]:
+        """Load the segments on disk, returning them with the sequence number of the next segment."""
+        self._path.mkdir(parents=True, exist_ok=True)
+
+        found: dict[int, list[Path]] = {}
+
+        for path in self._path.glob(f"{SEGMENT_PREFIX}*"):
+            number = path.name[len(SEGMENT_PREFIX) :].split(".", 1)[0]
+
+            # An interrupted compaction, the segment it was compacting is still on disk
+            if path.name.endswith(PARTIAL_SUFFIX):
+                self._unlink(path)
+            elif number.isdigit() and path.name.endswith((SEGMENT_SUFFIX, COMPACTED_SUFFIX)):
+                found.setdefault(int(number), []).append(path)
+
+        last = max(found, default=-1)
+        segments: list[Segment] = []
+
+        for sequence in sorted(found):
+            # A segment whose compacted copy was written before it could be deleted is superseded by it
+            *superseded, path = sorted(found[sequence])
+            for stale in superseded:
+                self._unlink(stale)
+
+            try:
+                data = self._read(path)
+            except (OSError, EOFError, zlib.error):
+                self._logger.warning("Discarding unreadable spill segment [%s].", path.name)
+                self._unlink(path)
+                continue
+
+            # Only the most recent segment can end with a torn write
+            if sequence == last and not self._is_compacted(path):
+                data = self._repair(path, data)
+
+            if not data:
+                self._unlink(path)
+                continue
+
+            segments.append(
+                Segment(
+                    path=path,
+                    size=path.stat().st_size,
+                    documents=data.count(b"\n") // 2,
+                    closed=sequence != last,
+                    compacted=self._is_compacted(path),
+                )
+            )
+
+        return segments, last + 1
+
+    @staticmethod
+    def _is_compacted(path: Path) -> bool:
+        """Return True if the segment file is gzipped."""
+        return path.name.endswith(COMPACTED_SUFFIX)
+
+    def _repair(self, path: Path, data: bytes) -> bytes:
+        """Truncate a segment to its last complete action/document line pair."""
+        end = data.rfind(b"\n") + 1
+
+        if data[:end].count(b"\n") % 2 != 0:
+            end = data.rfind(b"\n", 0, end - 1) + 1
+
+        if end != len(data):
+            self._logger.warning("Discarding incomplete write at the end of spill segment [%s].", path.name)
+            with path.open("r+b") as file:
+                file.truncate(end)
+
+        return data[:end]
+
+    def _write(self, path: Path, data: bytes) -> None:
+        """Append data to a segment file and fsync once."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with path.open("ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _read(self, path: Path) -> bytes:
+        """Read the action/document line pairs of a segment file."""
+        data = path.read_bytes()
+
+        return gzip.decompress(data) if self._is_compacted(path) else data
+
+    def _compress(self, path: Path, size: int) -> tuple[Path, int] | None:
+        """Replace a segment file with a gzipped copy, returning its path and size if it is any smaller.
+
+        The copy is written under a temporary name and renamed once complete, so an interrupted compaction
+        leaves the original segment in place.
+        """
+        data = gzip.compress(path.read_bytes(), compresslevel=6)
+
+        if len(data) >= size:
+            return None
+
+        compacted = path.with_name(path.name.removesuffix(SEGMENT_SUFFIX) + COMPACTED_SUFFIX)
+        partial = compacted.with_name(compacted.name + PARTIAL_SUFFIX)
+
+        with partial.open("wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        partial.replace(compacted)
+        path.unlink()
+
+        return compacted, len(data)
+
+    def _unlink(self, path: Path) -> None:
+        """Delete a segment file."""
+        path.unlink(missing_ok=True)
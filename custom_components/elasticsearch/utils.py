@@ -62,3 +62,24 @@ def flatten_dict(d: dict, parent_key: str = "", sep: str = ".") -> dict:
             flattened_dict[new_key] = v
 
     return flattened_dict
+
+
+def flatten_into(target: dict, d: dict, parent_key: str = "", sep: str = ".") -> dict:
+    """Flatten an n-level nested dictionary into target, skipping empty values.
+
+    Produces the same keys and values as prepare_dict with the default SKIP_VALUES, without building
+    intermediate dictionaries. Empty values are None and empty lists; empty dicts have no leaves.
+    """
+
+    for k, v in d.items():
+        new_key = f"{parent_key}{sep}{k}" if parent_key != "" else k
+
+        if isinstance(v, dict):
+            flatten_into(target, v, parent_key=new_key, sep=sep)
+        elif v is None or (isinstance(v, list) and not v):
+            # A later empty value removes an earlier value for the same key, as in prepare_dict
+            target.pop(new_key, None)
+        else:
+            target[new_key] = v
+
+    return target
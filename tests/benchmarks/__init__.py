@@ -0,0 +1 @@
+"""Benchmarks for the Elasticsearch custom component."""
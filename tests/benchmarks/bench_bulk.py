@@ -0,0 +1,133 @@
+"""Benchmark the client-side cost of building Elasticsearch bulk requests.
+
+Compares the serialization and chunking done when the publisher handed action dicts to the
+elasticsearch helpers' streaming bulk, which serialized them with the json module, with the
+pre-serialized NDJSON bodies built by BulkBodyBuilder. No requests are sent.
+
+Run with: scripts/benchmark bench_bulk [documents] [rounds]
+"""
+
+import asyncio
+import sys
+import time
+from collections.abc import AsyncGenerator, Callable, Coroutine
+from typing import Any
+
+from custom_components.elasticsearch.encoder import Serializer
+from custom_components.elasticsearch.es_bulk import BULK_CHUNK_SIZE, BulkBodyBuilder
+
+DOMAINS = ["sensor", "binary_sensor", "light", "switch", "climate"]
+
+
+def make_documents(count: int) -> list[dict[str, Any]]:
+    """Return documents shaped like the ones produced by the formatter."""
+    return [
+        {
+            "@timestamp": "2023-04-12T12:00:00+00:00",
+            "event.action": "State change",
+            "event.kind": "event",
+            "event.type": "change",
+            "hass.entity.id": f"{DOMAINS[i % len(DOMAINS)]}.entity_{i}",
+            "hass.entity.name": f"Entity {i}",
+            "hass.entity.domain": DOMAINS[i % len(DOMAINS)],
+            "hass.entity.area.id": "living_room",
+            "hass.entity.area.name": "Living Room",
+            "hass.entity.device.id": f"device_{i // 4}",
+            "hass.entity.device.name": f"Device {i // 4}",
+            "hass.entity.labels": ["label 1", "label 2"],
+            "hass.entity.platform": "mqtt",
+            "hass.entity.unit_of_measurement": "W",
+            "hass.entity.friendly_name": f"Entity {i}",
+            "hass.entity.attributes.state_class": "measurement",
+            "hass.entity.attributes.last_reset": None,
+            "hass.entity.value": str(i * 1.5),
+            "hass.entity.valueas.float": i * 1.5,
+            "hass.entity.object.id": f"entity_{i}",
+            "data_stream.type": "metrics",
+            "data_stream.dataset": f"homeassistant.{DOMAINS[i % len(DOMAINS)]}",
+            "data_stream.namespace": "default",
+            "agent.version": "2024.6.0",
+            "host.architecture": "aarch64",
+            "host.os.name": "Linux",
+            "host.hostname": "homeassistant",
+            "host.location": [-99.0, 99.0],
+        }
+        for i in range(count)
+    ]
+
+
+async def iterate(documents: list[dict[str, Any]]) -> AsyncGenerator[dict[str, Any], Any]:
+    """Yield the documents like Manager.sip_queue does."""
+    for document in documents:
+        yield document
+
+
+async def streaming_bulk_bodies(documents: list[dict[str, Any]]) -> int:
+    """Build request bodies the way async_streaming_bulk did, serializing each line with the json module."""
+    serializer = Serializer(use_orjson=False)
+    size = 0
+    lines: list[bytes] = []
+
+    def send(lines: list[bytes]) -> int:
+        # The client joins the serialized lines of each chunk into the request body
+        return len(b"\n".join(lines) + b"\n") if lines else 0
+
+    async for document in iterate(documents):
+        index = f"{document['data_stream.type']}-{document['data_stream.dataset']}-{document['data_stream.namespace']}"
+
+        lines.append(serializer.dumps({"create": {"_index": index}}))
+        lines.append(serializer.dumps(document))
+
+        if len(lines) == 2 * BULK_CHUNK_SIZE:
+            size += send(lines)
+            lines = []
+
+    return size + send(lines)
+
+
+async def ndjson_bulk_bodies(documents: list[dict[str, Any]]) -> int:
+    """Build request bodies with BulkBodyBuilder."""
+    size = 0
+
+    async for lines in BulkBodyBuilder().chunks(iterate(documents)):
+        size += len(b"".join(lines))
+
+    return size
+
+
+def measure(
+    name: str,
+    func: Callable[[list[dict[str, Any]]], Coroutine[Any, Any, int]],
+    documents: list[dict[str, Any]],
+    rounds: int,
+) -> float:
+    """Return the best throughput of the given body builder in documents per second."""
+    best = float("inf")
+    size = 0
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        size = asyncio.run(func(documents))
+        best = min(best, time.perf_counter() - start)
+
+    rate = len(documents) / best
+    print(f"{name:<28} {rate:>12,.0f} docs/sec  ({size:,} bytes)")  # noqa: T201
+
+    return rate
+
+
+def main() -> None:
+    """Run the benchmark."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    documents = make_documents(count)
+
+    before = measure("async_streaming_bulk", streaming_bulk_bodies, documents, rounds)
+    after = measure("BulkBodyBuilder", ndjson_bulk_bodies, documents, rounds)
+
+    print(f"{'speedup':<28} {after / before:>12.2f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark serializing documents with each JSON backend of the Serializer.
+
+Run with: scripts/benchmark bench_serializer [documents] [rounds]
+"""
+
+import sys
+import time
+
+from custom_components.elasticsearch.encoder import Serializer
+
+from tests.benchmarks.bench_bulk import make_documents
+
+
+def measure(serializer: Serializer, documents: list[dict], rounds: int) -> float:
+    """Return the best throughput of the serializer in documents per second."""
+    best = float("inf")
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for document in documents:
+            serializer.dumps(document)
+        best = min(best, time.perf_counter() - start)
+
+    rate = len(documents) / best
+    print(f"{serializer.backend:<28} {rate:>12,.0f} docs/sec")  # noqa: T201
+
+    return rate
+
+
+def main() -> None:
+    """Run the benchmark."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    documents = make_documents(count)
+
+    before = measure(Serializer(use_orjson=False), documents, rounds)
+    after = measure(Serializer(), documents, rounds)
+
+    print(f"{'speedup':<28} {after / before:>12.2f}x")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,7 @@ from custom_components.elasticsearch.errors import (
 )
 from homeassistant.data_entry_flow import (
     FlowResultType,
+    InvalidData,
 )
 from pytest_homeassistant_custom_component.common import (
     MockConfigEntry,  # noqa: F401
@@ -441,3 +442,93 @@ class Test_Options_Flow:
 
         # The options should be updated, but they are stored under data
         assert "data" in result and result["data"] == {**testconst.CONFIG_ENTRY_DEFAULT_OPTIONS}
+
+    async def test_options_flow_advanced(
+        self,
+        hass: HomeAssistant,
+    ):
+        """Test the advanced options are offered in advanced mode and validate deadband thresholds."""
+
+        config_entry = MockConfigEntry(
+            domain=compconst.DOMAIN,
+            unique_id="config_entry_id",
+            data={
+                **testconst.CONFIG_ENTRY_DEFAULT_DATA,
+            },
+            options=testconst.CONFIG_ENTRY_BASE_OPTIONS,
+            title="config_entry_title",
+        )
+
+        await add_config_entry_to_hass(hass, config_entry)
+
+        result = await hass.config_entries.options.async_init(
+            config_entry.entry_id, context={"show_advanced_options": True}
+        )
+
+        result = await hass.config_entries.options.async_configure(
+            result["flow_id"], user_input={**testconst.CONFIG_ENTRY_DEFAULT_OPTIONS}
+        )
+
+        # We should get a second form to fill out the advanced options
+        assert "type" in result and result["type"] is FlowResultType.FORM
+        assert "step_id" in result and result["step_id"] == "advanced"
+
+        advanced_options = {
+            compconst.CONF_QUEUE_MAX_SIZE: 10000,
+            compconst.CONF_QUEUE_OVERFLOW_POLICY: compconst.QueueOverflowPolicy.COALESCE.value,
+            compconst.CONF_DEADBAND_DEVICE_CLASSES: {"temperature": 0.5, "power": "5%"},
+        }
+
+        result = await hass.config_entries.options.async_configure(
+            result["flow_id"],
+            user_input={**advanced_options, compconst.CONF_DEADBAND_LABELS: {"noisy": "a lot"}},
+        )
+
+        assert "type" in result and result["type"] is FlowResultType.FORM
+        assert "errors" in result and result["errors"] == {compconst.CONF_DEADBAND_LABELS: "invalid_deadband"}
+
+        result = await hass.config_entries.options.async_configure(
+            result["flow_id"], user_input=advanced_options
+        )
+
+        assert "type" in result and result["type"] is FlowResultType.CREATE_ENTRY
+        assert "data" in result and result["data"] == {
+            **compconst.ADVANCED_OPTION_DEFAULTS,
+            **testconst.CONFIG_ENTRY_DEFAULT_OPTIONS,
+            **advanced_options,
+        }
+
+    @pytest.mark.parametrize(
+        ("user_input", "error"),
+        [
+            ({compconst.CONF_QUEUE_OVERFLOW_POLICY: "bogus"}, compconst.CONF_QUEUE_OVERFLOW_POLICY),
+            ({compconst.CONF_POLLING_SHARDS: 0}, compconst.CONF_POLLING_SHARDS),
+        ],
+        ids=["unknown overflow policy", "out of range"],
+    )
+    async def test_options_flow_advanced_invalid(self, hass: HomeAssistant, user_input: dict, error: str):
+        """Test the advanced options reject values outside of their selectors."""
+
+        config_entry = MockConfigEntry(
+            domain=compconst.DOMAIN,
+            unique_id="config_entry_id",
+            data={
+                **testconst.CONFIG_ENTRY_DEFAULT_DATA,
+            },
+            options=testconst.CONFIG_ENTRY_BASE_OPTIONS,
+            title="config_entry_title",
+        )
+
+        await add_config_entry_to_hass(hass, config_entry)
+
+        result = await hass.config_entries.options.async_init(
+            config_entry.entry_id, context={"show_advanced_options": True}
+        )
+        result = await hass.config_entries.options.async_configure(
+            result["flow_id"], user_input={**testconst.CONFIG_ENTRY_DEFAULT_OPTIONS}
+        )
+
+        with pytest.raises(InvalidData) as err:
+            await hass.config_entries.options.async_configure(result["flow_id"], user_input=user_input)
+
+        assert error in err.value.schema_errors
@@ -1,7 +1,10 @@
 """Tests for the Elasticsearch integration diagnostics."""
 
+from unittest.mock import MagicMock
+
 import pytest
 from custom_components.elasticsearch.diagnostics import async_get_config_entry_diagnostics
+from custom_components.elasticsearch.es_integration import ElasticIntegration
 from homeassistant.const import (
     CONF_API_KEY,
     CONF_PASSWORD,
@@ -36,3 +39,18 @@ async def test_async_get_config_entry_diagnostics(hass, config_entry, data, opti
     result = await async_get_config_entry_diagnostics(hass, config_entry)
 
     assert result == snapshot
+
+
+@pytest.mark.parametrize("data", [{CONF_URL: "https://example.com"}])
+@pytest.mark.parametrize("options", [{}])
+async def test_async_get_config_entry_diagnostics_with_runtime_data(hass, config_entry, data, options):
+    """Test that runtime diagnostics are included when the integration is loaded."""
+
+    integration = MagicMock(spec=ElasticIntegration)
+    integration.diagnostics.return_value = {"pipeline": {"queue": {"dropped": 1}}}
+    config_entry.runtime_data = integration
+
+    result = await async_get_config_entry_diagnostics(hass, config_entry)
+
+    assert result["pipeline"] == {"queue": {"dropped": 1}}
+    assert result["data"] == {CONF_URL: "https://example.com"}
@@ -59,7 +59,7 @@ class Test_Normal_Configuration:
         assert await integration_setup() is True
         assert config_entry.state is ConfigEntryState.LOADED
 
-        assert es_mock_builder.mocker.call_count == 9
+        assert es_mock_builder.mocker.call_count == 6
         assert es_mock_builder.get_calls() == snapshot
 
         # Queue an entity state change and check that it is published with item level reporting
@@ -69,7 +69,7 @@ class Test_Normal_Configuration:
         config_entry.runtime_data._gateway._logger.info = MagicMock()
         await config_entry.runtime_data._pipeline_manager._publisher.publish()
 
-        assert es_mock_builder.mocker.call_count == 11
+        assert es_mock_builder.mocker.call_count == 7
         config_entry.runtime_data._gateway._logger.error.assert_not_called()
 
         assert snapshot == {
@@ -89,7 +89,7 @@ class Test_Normal_Configuration:
     ):
         """Test the full integration setup and execution with an error during the check connection step of publishing."""
         es_mock_builder.as_elasticsearch_8_17(
-            fail_after=5
+            fail_after=2
         ).with_correct_permissions().without_index_template().respond_to_bulk(status=200)
 
         # Queue an entity state change
@@ -99,13 +99,16 @@ class Test_Normal_Configuration:
         assert await integration_setup() is True
         assert config_entry.state is ConfigEntryState.LOADED
 
-        assert es_mock_builder.mocker.call_count == 9
+        assert es_mock_builder.mocker.call_count == 6
+
+        # Without a recent successful response, the connection is checked with a ping
+        config_entry.runtime_data._gateway._last_contact = None
 
         await config_entry.runtime_data._pipeline_manager._publisher.publish()
 
         # We check the connection while publishing and if the ping fails we do not
-        # perform the bulk request, so this stays at 10
-        assert es_mock_builder.mocker.call_count == 10
+        # perform the bulk request, so this stays at 7
+        assert es_mock_builder.mocker.call_count == 7
 
         assert es_mock_builder.get_calls() == snapshot
 
@@ -133,7 +136,7 @@ class Test_Normal_Configuration:
         assert await integration_setup() is True
         assert config_entry.state is ConfigEntryState.LOADED
 
-        assert es_mock_builder.mocker.call_count == 9
+        assert es_mock_builder.mocker.call_count == 6
         assert es_mock_builder.get_calls() == snapshot
 
     async def test_setup_to_bulk_item_level_error(
@@ -319,7 +322,7 @@ class Test_Publish_Disabled:
         assert await integration_setup() is True
         assert config_entry.state is ConfigEntryState.LOADED
 
-        assert es_mock_builder.mocker.call_count == 7
+        assert es_mock_builder.mocker.call_count == 5
 
 
 class Test_Legacy_To_Current:
@@ -371,7 +374,7 @@ class Test_Legacy_To_Current:
         assert await integration_setup() is True
         assert config_entry.state is ConfigEntryState.LOADED
 
-        assert es_mock_builder.mocker.call_count == 9
+        assert es_mock_builder.mocker.call_count == 6
 
         assert snapshot == {
             "data": config_entry.data,
@@ -0,0 +1,131 @@
+"""Tests for the encoder module."""
+
+from datetime import UTC, date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from custom_components.elasticsearch import encoder
+from custom_components.elasticsearch.encoder import (
+    CompressedBody,
+    NdjsonSerializer,
+    Serializer,
+    has_exponent_float,
+)
+from elastic_transport import SerializationError
+
+DOCUMENTS = {
+    "entity document": {
+        "@timestamp": "2023-04-12T12:00:00+00:00",
+        "event.action": "State change",
+        "hass.entity.id": "sensor.power",
+        "hass.entity.labels": ["label 1", "label 2"],
+        "hass.entity.attributes.options": ["a", "b"],
+        "hass.entity.attributes.last_reset": None,
+        "hass.entity.attributes.enabled": True,
+        "hass.entity.value": "1.5",
+        "hass.entity.valueas.float": 1.5,
+        "hass.entity.valueas.integer": 2,
+        "host.location": [-99.0, 99.0],
+    },
+    "special characters": {
+        "quotes and escapes": 'a "quoted" \\ string/',
+        "control characters": "\x00\x1f\b\f\n\r\t\x7f",
+        "unicode": "café ☃ \U0001f600 \u2028",
+    },
+    "native types": {
+        "datetime": datetime(2023, 4, 12, 12, 0, 0, 123456, tzinfo=UTC),
+        "date": date(2023, 4, 12),
+        "uuid": UUID("2d0a55e4-3b1c-4d6c-9a6e-0e2e59f1c1c6"),
+        "decimal": Decimal("1.25"),
+        "set": {"c", "a", "b"},
+        "tuple": (1, 2),
+    },
+    "numbers": {
+        "large float": 1e16,
+        "small float": 1e-05,
+        "negative zero": -0.0,
+        "nan": float("nan"),
+        "infinity": float("inf"),
+        "large integer": 2**70,
+        "float in set": {1e-05, 2.0},
+        "decimal exponent": Decimal("1e-5"),
+    },
+    "non-string keys": {1: "integer", 2.5: "float", None: "none"},
+}
+
+BACKENDS = [
+    pytest.param(True, id="orjson"),
+    pytest.param(False, id="json"),
+]
+
+
+class Test_Serializer:
+    """Test the Serializer class."""
+
+    @pytest.mark.parametrize("use_orjson", BACKENDS)
+    @pytest.mark.parametrize("document", DOCUMENTS.values(), ids=DOCUMENTS.keys())
+    async def test_dumps(self, use_orjson: bool, document: dict, snapshot):
+        """Test that each backend serializes documents to the same bytes."""
+        assert Serializer(use_orjson=use_orjson).dumps(document) == snapshot
+
+    @pytest.mark.parametrize("document", DOCUMENTS.values(), ids=DOCUMENTS.keys())
+    async def test_backends_identical(self, document: dict):
+        """Test that the orjson backend produces exactly the output of the json module."""
+        assert Serializer(use_orjson=True).dumps(document) == Serializer(use_orjson=False).dumps(document)
+
+    @pytest.mark.parametrize("use_orjson", BACKENDS)
+    async def test_dumps_unserializable(self, use_orjson: bool):
+        """Test that unserializable values raise a SerializationError with either backend."""
+        with pytest.raises(SerializationError):
+            Serializer(use_orjson=use_orjson).dumps({"value": object()})
+
+    async def test_backend(self):
+        """Test that orjson is used when it is installed."""
+        assert Serializer().backend == "orjson"
+        assert Serializer(use_orjson=False).backend == "json"
+
+    async def test_backend_without_orjson(self, monkeypatch: pytest.MonkeyPatch):
+        """Test that the json module is used when orjson is not installed."""
+        monkeypatch.setattr(encoder, "_HAS_ORJSON", False)
+
+        serializer = Serializer()
+
+        assert serializer.backend == "json"
+        assert serializer.dumps(DOCUMENTS["entity document"]) == Serializer(use_orjson=False).dumps(
+            DOCUMENTS["entity document"]
+        )
+
+
+class Test_NdjsonSerializer:
+    """Test the NdjsonSerializer class."""
+
+    async def test_dumps(self):
+        """Test that uncompressed bodies are serialized with a trailing newline."""
+        assert NdjsonSerializer().dumps(b'{"a":1}') == b'{"a":1}\n'
+
+    async def test_dumps_compressed(self):
+        """Test that compressed bodies are sent as they are."""
+        body = CompressedBody(b"\x1f\x8b\x08")
+
+        assert NdjsonSerializer().dumps(body) == b"\x1f\x8b\x08"
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    [
+        (1.5, False),
+        (0.0, False),
+        (1e15, False),
+        (1e-4, False),
+        (1e16, True),
+        (-1e-05, True),
+        (float("nan"), True),
+        ({"a": [1, {"b": (2, 1e20)}]}, True),
+        ({"a": {1e-05}}, True),
+        ({"a": "1e-05"}, False),
+    ],
+)
+def test_has_exponent_float(data, expected: bool):
+    """Test detecting floats which the json module writes in exponent notation."""
+    assert has_exponent_float(data) is expected
@@ -12,6 +12,13 @@ from custom_components.elasticsearch.entity_details import (
     ExtendedRegistryEntry,
 )
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers import (
+    area_registry,
+    device_registry,
+    entity_registry,
+    floor_registry,
+    label_registry,
+)
 
 from tests import const as testconst
 
@@ -92,6 +99,81 @@ class Test_ExtendedEntityDetails:
         ):
             details.async_get(entity_id)
 
+    async def test_get_dict(self, entity, entity_id, device, details):
+        """Test retrieving extended details as a dict, which is cached once initialized."""
+        expected = details.async_get(entity_id).to_dict()
+
+        assert details.async_get_dict(entity_id) == expected
+        assert details._documents == {}
+
+        await details.async_init()
+
+        with patch.object(details, "async_get", wraps=details.async_get) as async_get:
+            assert details.async_get_dict(entity_id) == expected
+            assert details.async_get_dict(entity_id) is details.async_get_dict(entity_id)
+
+            async_get.assert_called_once_with(entity_id)
+
+        assert details._documents == {entity_id: expected}
+
+    async def test_get_dict_reflects_registry_updates(
+        self, hass: HomeAssistant, entity_registry: entity_registry.EntityRegistry, entity, entity_id, details
+    ):
+        """Test that the cached dict is refreshed when the entity registry changes."""
+        await details.async_init()
+
+        details.async_get_dict(entity_id)
+
+        entity_registry.async_update_entity(entity_id, name="Renamed")
+        await hass.async_block_till_done()
+
+        assert details.async_get_dict(entity_id)["name"] == "Renamed"
+
+    @pytest.mark.parametrize(
+        "event_type",
+        [
+            device_registry.EVENT_DEVICE_REGISTRY_UPDATED,
+            area_registry.EVENT_AREA_REGISTRY_UPDATED,
+            floor_registry.EVENT_FLOOR_REGISTRY_UPDATED,
+            label_registry.EVENT_LABEL_REGISTRY_UPDATED,
+        ],
+    )
+    async def test_cache_invalidation(self, hass: HomeAssistant, details, event_type):
+        """Test that device, area, floor, and label registry updates invalidate all cached dicts."""
+        await details.async_init()
+
+        details._documents = {"light.light_1": {}, "light.light_2": {}}
+
+        hass.bus.async_fire(event_type, {"action": "update"})
+        await hass.async_block_till_done()
+
+        assert details._documents == {}
+
+    async def test_cache_invalidation_entity(self, hass: HomeAssistant, details):
+        """Test that entity registry updates invalidate the cached dicts of the old and new entity ids."""
+        await details.async_init()
+
+        details._documents = {"light.old": {}, "light.new": {}, "light.other": {}}
+
+        hass.bus.async_fire(
+            entity_registry.EVENT_ENTITY_REGISTRY_UPDATED,
+            {"action": "update", "entity_id": "light.new", "old_entity_id": "light.old", "changes": {}},
+        )
+        await hass.async_block_till_done()
+
+        assert details._documents == {"light.other": {}}
+
+    async def test_stop(self, hass: HomeAssistant, details):
+        """Test that stopping clears the cache and stops listening for registry updates."""
+        await details.async_init()
+
+        details._documents = {"light.light_1": {}}
+
+        details.stop()
+
+        assert details._documents == {}
+        assert details._cancel_listeners == []
+
 
 class Test_ExtendedRegistryEntry:
     """Test the ExtendedRegistryEntry class."""
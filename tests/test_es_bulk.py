@@ -0,0 +1,402 @@
+"""Tests for the es_bulk module."""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from custom_components.elasticsearch.encoder import Serializer
+from custom_components.elasticsearch.errors import CannotConnect
+from custom_components.elasticsearch.es_bulk import (
+    BulkBodyBuilder,
+    BulkOutcome,
+    BulkRetryQueue,
+    BulkSender,
+    DeadLetterSink,
+    iterate_chunks,
+    split_items,
+)
+
+
+def document(value: str, dataset: str = "homeassistant.light", entity_id: str = "light.living_room") -> dict:
+    """Return a mock entity document."""
+    return {
+        "@timestamp": "2023-04-12T12:00:00+00:00",
+        "hass.entity.id": entity_id,
+        "hass.entity.value": value,
+        "hass.entity.attributes.options": ["a", "b"],
+        "data_stream.type": "metrics",
+        "data_stream.dataset": dataset,
+        "data_stream.namespace": "default",
+    }
+
+
+async def agen(items):
+    """Turn a list into an async generator."""
+    for item in items:
+        yield item
+
+
+class Test_BulkBodyBuilder:
+    """Test the BulkBodyBuilder class."""
+
+    async def test_action_line(self):
+        """Test formatting and caching the create action of a datastream."""
+        BulkBodyBuilder.action_line.cache_clear()
+
+        line = BulkBodyBuilder.action_line("metrics", "homeassistant.light", "default")
+        assert line == b'{"create":{"_index":"metrics-homeassistant.light-default"}}\n'
+        assert BulkBodyBuilder.action_line.cache_info().misses == 1
+
+        assert BulkBodyBuilder.action_line("metrics", "homeassistant.light", "default") is line
+        assert BulkBodyBuilder.action_line.cache_info().hits == 1
+
+    async def test_to_lines(self):
+        """Test that a document is serialized once into its action and document lines."""
+        action, source = BulkBodyBuilder().to_lines(document("on"))
+
+        assert action == b'{"create":{"_index":"metrics-homeassistant.light-default"}}\n'
+        assert source == Serializer().dumps(document("on")) + b"\n"
+        assert json.loads(source) == document("on")
+
+    async def test_chunks(self):
+        """Test that documents are grouped into chunks, preserving their order."""
+        builder = BulkBodyBuilder(chunk_size=2)
+        documents = [document(str(i), dataset=f"homeassistant.domain_{i}") for i in range(5)]
+
+        chunks = [chunk async for chunk in builder.chunks(agen(documents))]
+
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+        assert b"".join(b"".join(chunk) for chunk in chunks) == b"".join(
+            b"".join(builder.to_lines(doc)) for doc in documents
+        )
+
+    async def test_chunks_empty(self):
+        """Test that no chunks are produced without documents."""
+        assert [chunk async for chunk in BulkBodyBuilder().chunks(agen([]))] == []
+
+    async def test_chunks_max_bytes(self):
+        """Test that chunks are split before exceeding the maximum size in bytes."""
+        documents = [document(str(i)) for i in range(5)]
+        size = len(b"".join(BulkBodyBuilder().to_lines(documents[0])))
+
+        builder = BulkBodyBuilder(max_chunk_bytes=size * 2)
+        chunks = [chunk async for chunk in builder.chunks(agen(documents))]
+
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+    async def test_chunks_oversized_document(self):
+        """Test that a document larger than the maximum size is sent in a chunk of its own."""
+        builder = BulkBodyBuilder(max_chunk_bytes=1)
+        chunks = [chunk async for chunk in builder.chunks(agen([document("1"), document("2")]))]
+
+        assert [len(chunk) for chunk in chunks] == [2, 2]
+
+    async def test_lane_chunks(self):
+        """Test that all documents of an entity are in the same lane, in order."""
+        builder = BulkBodyBuilder(chunk_size=2)
+        documents = [document(str(i), entity_id=f"sensor.entity_{i % 5}") for i in range(20)]
+
+        chunks = [chunk async for chunk in builder.lane_chunks(agen(documents), lanes=3)]
+
+        for entity in range(5):
+            entity_id = f"sensor.entity_{entity}"
+            entity_documents = [doc for doc in documents if doc["hass.entity.id"] == entity_id]
+            lane = BulkBodyBuilder.lane(entity_documents[0], lanes=3)
+
+            published = [
+                json.loads(line)
+                for chunk_lane, chunk in chunks
+                for line in chunk[1::2]
+                if json.loads(line)["hass.entity.id"] == entity_id
+            ]
+
+            assert published == entity_documents
+            assert all(
+                chunk_lane == lane
+                for chunk_lane, chunk in chunks
+                for line in chunk[1::2]
+                if json.loads(line)["hass.entity.id"] == entity_id
+            )
+
+        assert all(len(chunk) <= 4 for _, chunk in chunks)
+        assert sum(len(chunk) for _, chunk in chunks) == 40
+
+    async def test_build_lane_chunks(self):
+        """Test that building the chunks without the event loop matches the chunks yielded by lane_chunks."""
+        builder = BulkBodyBuilder(chunk_size=2)
+        documents = [document(str(i), entity_id=f"sensor.entity_{i % 5}") for i in range(20)]
+
+        chunks = [chunk async for chunk in builder.lane_chunks(agen(documents), lanes=3)]
+
+        assert builder.build_lane_chunks(documents, lanes=3) == chunks
+        assert builder.build_lane_chunks([], lanes=3) == []
+
+    async def test_iterate_chunks(self):
+        """Test that chunks which were not consumed are left in the iterator."""
+        prepared = iter([(0, [b"1"]), (0, [b"2"]), (0, [b"3"])])
+
+        async for chunk in iterate_chunks(prepared):
+            assert chunk == (0, [b"1"])
+            break
+
+        assert list(prepared) == [(0, [b"2"]), (0, [b"3"])]
+
+    async def test_lane_single(self):
+        """Test that every document is in the first lane when there is a single lane."""
+        assert BulkBodyBuilder.lane(document("1", entity_id="sensor.a"), lanes=1) == 0
+        assert BulkBodyBuilder.lane(document("1", entity_id="sensor.b"), lanes=1) == 0
+
+
+async def lane_agen(chunks: list[tuple[int, list[bytes]]]):
+    """Turn a list of lane chunks into an async generator."""
+    for chunk in chunks:
+        yield chunk
+
+
+class Test_BulkSender:
+    """Test the BulkSender class."""
+
+    async def test_send(self):
+        """Test that every chunk is sent as a single request body."""
+        send = AsyncMock()
+        sender = BulkSender(send=send)
+
+        sent = await sender.send(lane_agen([(0, [b"a\n", b"b\n"]), (0, [b"c\n", b"d\n"])]))
+
+        assert sent == 2
+        assert [call.args[0] for call in send.await_args_list] == [b"a\nb\n", b"c\nd\n"]
+
+    async def test_send_nothing(self):
+        """Test that nothing is sent without chunks."""
+        send = AsyncMock()
+
+        assert await BulkSender(send=send, max_in_flight=4).send(lane_agen([])) == 0
+        send.assert_not_awaited()
+
+    async def test_max_in_flight(self):
+        """Test that chunks of different lanes are sent concurrently, up to the limit."""
+        in_flight = 0
+        peak = 0
+
+        async def send(body: bytes) -> None:
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        sender = BulkSender(send=send, max_in_flight=3)
+
+        sent = await sender.send(lane_agen([(i % 6, [b"%d\n" % i]) for i in range(12)]))
+
+        assert sent == 12
+        assert peak == 3
+
+    async def test_lane_order(self):
+        """Test that chunks of the same lane are sent in order, one at a time."""
+        bodies: list[bytes] = []
+
+        async def send(body: bytes) -> None:
+            # Later chunks finish first unless the lane is sent sequentially
+            await asyncio.sleep(0.01 * (5 - int(body)))
+            bodies.append(body)
+
+        sender = BulkSender(send=send, max_in_flight=4)
+
+        await sender.send(lane_agen([(0, [b"%d" % i]) for i in range(5)]))
+
+        assert bodies == [b"0", b"1", b"2", b"3", b"4"]
+
+    async def test_error_single_lane(self):
+        """Test that sending stops at the first failure, draining the remaining chunks into unsent."""
+        send = AsyncMock(side_effect=[None, CannotConnect(), None])
+        sender = BulkSender(send=send)
+        chunks = lane_agen([(0, [b"a\n"]), (0, [b"b\n"]), (0, [b"c\n"])])
+
+        with pytest.raises(CannotConnect):
+            await sender.send(chunks)
+
+        assert send.await_count == 2
+        assert sender.unsent == [b"b\n", b"c\n"]
+        assert [chunk async for chunk in chunks] == []
+
+    async def test_error_multiple_lanes(self):
+        """Test that chunks after a failure are not sent and are returned in order."""
+
+        async def send(body: bytes) -> None:
+            if body == b"b\n":
+                raise CannotConnect
+
+        sender = BulkSender(send=send, max_in_flight=2)
+        chunks = lane_agen([(0, [b"a\n"]), (1, [b"b\n"]), (1, [b"c\n"]), (0, [b"d\n"]), (1, [b"e\n"])])
+
+        with pytest.raises(CannotConnect):
+            await sender.send(chunks)
+
+        assert sender.unsent == [b"b\n", b"c\n", b"d\n", b"e\n"]
+
+
+@pytest.mark.parametrize(
+    ("status", "expected"),
+    [(400, False), (404, False), (409, False), (429, True), (500, True), (503, True)],
+)
+def test_is_retryable(status: int, expected: bool):
+    """Test which statuses of rejected documents are worth retrying."""
+    assert BulkOutcome.is_retryable(status) is expected
+
+
+@pytest.mark.parametrize(
+    ("action", "status", "expected"),
+    [("create", 409, True), ("index", 409, False), ("create", 400, False), ("create", 201, False)],
+)
+def test_is_duplicate(action: str, status: int, expected: bool):
+    """Test that only a version conflict on create means the document was already indexed."""
+    assert BulkOutcome.is_duplicate(action, status) is expected
+
+
+def test_split_items():
+    """Test that a bulk body is split into the action and document lines of each item."""
+    builder = BulkBodyBuilder()
+    documents = [document("1"), document("2")]
+    items = [builder.to_lines(doc) for doc in documents]
+
+    assert split_items(b"".join(action + source for action, source in items)) == items
+    assert split_items(b"") == []
+
+
+class Test_BulkRetryQueue:
+    """Test the BulkRetryQueue class."""
+
+    @staticmethod
+    def _at(seconds: float):
+        return patch("custom_components.elasticsearch.es_bulk.monotonic", return_value=seconds)
+
+    async def test_backoff(self):
+        """Test that documents are due after an exponential backoff on their attempts."""
+        queue = BulkRetryQueue(backoff=2, max_backoff=5)
+
+        with self._at(100):
+            assert queue.add(b"a\n", b"1\n", attempts=1) is True
+            assert queue.add(b"a\n", b"2\n", attempts=2) is True
+            assert queue.add(b"a\n", b"3\n", attempts=3) is True
+
+        with self._at(101.9):
+            assert queue.pop_due() == []
+
+        with self._at(102):
+            assert queue.pop_due() == [(1, b"a\n", b"1\n")]
+
+        with self._at(104):
+            assert queue.pop_due() == [(2, b"a\n", b"2\n")]
+
+        # The backoff is capped
+        with self._at(105):
+            assert queue.pop_due() == [(3, b"a\n", b"3\n")]
+
+        assert len(queue) == 0
+
+    async def test_pop_due_keeps_order(self):
+        """Test that documents which are not due keep their place in the queue."""
+        queue = BulkRetryQueue(backoff=1)
+
+        with self._at(0):
+            queue.add(b"a\n", b"1\n", attempts=2)
+            queue.add(b"a\n", b"2\n", attempts=1)
+            queue.add(b"a\n", b"3\n", attempts=2)
+            queue.add(b"a\n", b"4\n", attempts=1)
+
+        with self._at(1):
+            assert queue.pop_due(limit=1) == [(1, b"a\n", b"2\n")]
+            assert queue.pop_due() == [(1, b"a\n", b"4\n")]
+
+        with self._at(2):
+            assert queue.pop_due() == [(2, b"a\n", b"1\n"), (2, b"a\n", b"3\n")]
+
+    async def test_exhausted(self):
+        """Test that documents are not requeued once they have used all of their attempts."""
+        queue = BulkRetryQueue(max_attempts=2)
+
+        assert queue.add(b"a\n", b"1\n", attempts=1) is True
+        assert queue.add(b"a\n", b"1\n", attempts=2) is False
+
+        assert queue.stats() == {"pending": 1, "requeued": 1, "exhausted": 1, "dropped": 0}
+
+    async def test_max_size(self):
+        """Test that the oldest documents are dropped when the queue is full."""
+        queue = BulkRetryQueue(backoff=0, max_size=2)
+
+        for value in (b"1\n", b"2\n", b"3\n"):
+            queue.add(b"a\n", value, attempts=1)
+
+        assert queue.pop_due() == [(1, b"a\n", b"2\n"), (1, b"a\n", b"3\n")]
+        assert queue.stats()["dropped"] == 1
+
+    async def test_restore(self):
+        """Test that documents which could not be sent are due again, ahead of the others."""
+        queue = BulkRetryQueue(backoff=0)
+
+        queue.add(b"a\n", b"1\n", attempts=1)
+        queue.add(b"a\n", b"2\n", attempts=1)
+
+        due = queue.pop_due(limit=1)
+        queue.restore(due)
+
+        assert queue.pop_due() == [(1, b"a\n", b"1\n"), (1, b"a\n", b"2\n")]
+
+
+class Test_DeadLetterSink:
+    """Test the DeadLetterSink class."""
+
+    async def test_add(self):
+        """Test that rejected documents are counted by the type of error and by entity."""
+        sink = DeadLetterSink(log=MagicMock())
+
+        sink.add(
+            b'{"hass.entity.id":"light.a"}\n',
+            {"status": 400, "error": {"type": "document_parsing_exception"}},
+        )
+        sink.add(
+            b'{"hass.entity.id":"light.b"}\n',
+            {"status": 400, "error": {"type": "document_parsing_exception"}},
+        )
+        sink.add(b'{"hass.entity.id":"light.b"}\n', {"status": 429})
+
+        assert sink.stats() == {
+            "documents": 3,
+            "errors": {"document_parsing_exception": 2, "429": 1},
+            "entities": {"light.b": 2, "light.a": 1},
+        }
+        assert sink.pop_documents() == []
+
+    @pytest.mark.parametrize("source", [b"not json\n", b"[1]\n", b"{}\n"])
+    async def test_entity_id_unknown(self, source):
+        """Test that documents without a readable entity id are counted as unknown."""
+        assert DeadLetterSink.entity_id(source) == "unknown"
+
+    async def test_datastream(self):
+        """Test that rejected documents are kept as strings with their error for the dead letter datastream."""
+        sink = DeadLetterSink(log=MagicMock(), datastream=True, max_pending=2)
+        source = Serializer().dumps(document("on")) + b"\n"
+        error = {"status": 400, "error": {"type": "mapper_parsing_exception", "reason": "failed to parse"}}
+
+        sink.add(source, error)
+        sink.add(source, error)
+
+        documents = sink.pop_documents()
+
+        assert len(documents) == 2
+        assert documents[1]["hass.entity.id"] == "light.living_room"
+        assert documents[1]["hass.entity.rejections"] == 2
+        assert documents[1]["error.type"] == "mapper_parsing_exception"
+        assert documents[1]["error.message"] == "failed to parse"
+        assert documents[1]["event.original"] == source.decode().rstrip("\n")
+        assert documents[1]["data_stream.dataset"] == "homeassistant.dead_letter"
+        assert sink.pop_documents() == []
+
+        sink.add(source, error)
+        sink.restore(documents)
+
+        assert [item["hass.entity.rejections"] for item in sink.pop_documents()] == [1, 2]
+        assert sink.stats()["dropped"] == 1
+        assert sink.stats()["pending"] == 0
@@ -4,7 +4,7 @@
 from unittest.mock import AsyncMock
 
 import pytest
-from custom_components.elasticsearch.datastreams import index_template
+from custom_components.elasticsearch.datastreams import dead_letter_template, index_template
 from custom_components.elasticsearch.es_datastream_manager import DatastreamManager
 from custom_components.elasticsearch.es_gateway import ElasticsearchGateway
 
@@ -97,3 +97,43 @@ class Test_Initialization:
         assert datastream_manager._gateway.get_index_template.call_count == 2
         datastream_manager._gateway.put_index_template.assert_called_once()
         assert datastream_manager._gateway.rollover_datastream.call_count == 2
+
+    async def test_async_init_dead_letter(self, mock_gateway):
+        """Test initialization of the DatastreamManager with the dead letter datastream enabled."""
+        datastream_manager = DatastreamManager(mock_gateway, dead_letter=True)
+
+        mock_gateway.get_index_template = AsyncMock(return_value={"index_templates": []})
+
+        await datastream_manager.async_init()
+
+        assert mock_gateway.put_index_template.call_count == 2
+        mock_gateway.put_index_template.assert_called_with(
+            name="metrics-homeassistant.dead_letter",
+            body=dead_letter_template.dead_letter_index_template_definition,
+        )
+
+    async def test_async_init_dead_letter_current(self, mock_gateway):
+        """Test initialization of the DatastreamManager when the dead letter index template is current."""
+        datastream_manager = DatastreamManager(mock_gateway, dead_letter=True)
+
+        mock_gateway.get_index_template = AsyncMock(
+            side_effect=lambda name, ignore: {
+                "index_templates": [
+                    {
+                        "name": name,
+                        "index_template": {
+                            "version": (
+                                dead_letter_template.dead_letter_index_template_definition["version"]
+                                if name == "metrics-homeassistant.dead_letter"
+                                else index_template.index_template_definition["version"]
+                            )
+                        },
+                    }
+                ]
+            },
+        )
+
+        await datastream_manager.async_init()
+
+        assert mock_gateway.get_index_template.call_count == 3
+        mock_gateway.put_index_template.assert_not_called()
@@ -1,6 +1,7 @@
 """Tests for the Elasticsearch Gateway."""
 # noqa: F401 # pylint: disable=redefined-outer-name
 
+import gzip
 import os
 import ssl
 from typing import Any
@@ -11,16 +12,25 @@ import elasticsearch8
 import elasticsearch8.helpers
 import pytest
 from aiohttp import client_exceptions
-from custom_components.elasticsearch.const import ES_CHECK_PERMISSIONS_DATASTREAM
+from custom_components.elasticsearch.const import (
+    CAPABILITIES,
+    CAPABILITIES_CACHE_TTL,
+    ES_CHECK_PERMISSIONS_DATASTREAM,
+    PASSIVE_HEALTH_TTL,
+    RECONNECT_BACKOFF_MIN,
+)
 from custom_components.elasticsearch.datastreams.index_template import index_template_definition
+from custom_components.elasticsearch.encoder import CompressedBody, NdjsonSerializer, Serializer
 from custom_components.elasticsearch.errors import (
     AuthenticationRequired,
     CannotConnect,
+    ClientError,
     InsufficientPrivileges,
     ServerError,
     UnsupportedVersion,
     UntrustedCertificate,
 )
+from custom_components.elasticsearch.es_bulk import BulkOutcome
 from custom_components.elasticsearch.es_gateway import (
     ElasticsearchGateway,
 )
@@ -185,6 +195,20 @@ class Test_Initialization:
 
         assert gateway._client._headers["Authorization"].startswith("Basic")
 
+    async def test_init_serializers(self) -> None:
+        """Test that bulk bodies are serialized with a serializer that sends compressed bodies as they are."""
+        gateway = Elasticsearch8Gateway(
+            gateway_settings=Gateway8Settings(url=testconst.CONFIG_ENTRY_DATA_URL)
+        )
+        serializers = gateway._client.transport.serializers
+
+        assert isinstance(serializers.get_serializer("application/json"), Serializer)
+        assert isinstance(serializers.get_serializer("application/x-ndjson"), NdjsonSerializer)
+        assert isinstance(
+            serializers.get_serializer("application/vnd.elasticsearch+x-ndjson; compatible-with=8"),
+            NdjsonSerializer,
+        )
+
     async def test_init_api_key_auth(self) -> None:
         """Test initializing a gateway with API Key authentication."""
 
@@ -331,6 +355,67 @@ class Test_Public_Functions:
         gateway_mock_stateful._client.info = mock_es_exception(elasticsearch8.ConnectionTimeout)
         assert await gateway_mock_stateful.ping() is False
 
+    async def test_capabilities_stateful(self, gateway_mock_stateful) -> None:
+        """Test that the capabilities of a stateful cluster are probed once and cached."""
+
+        capabilities = await gateway_mock_stateful.capabilities()
+
+        assert capabilities == {
+            CAPABILITIES.MAJOR: 8,
+            CAPABILITIES.MINOR: 14,
+            CAPABILITIES.BUILD_FLAVOR: "default",
+            CAPABILITIES.SERVERLESS: False,
+            CAPABILITIES.OSS: False,
+            CAPABILITIES.SUPPORTED: True,
+            CAPABILITIES.TIMESERIES_DATASTREAM: True,
+            CAPABILITIES.IGNORE_MISSING_COMPONENT_TEMPLATES: True,
+            CAPABILITIES.DATASTREAM_LIFECYCLE_MANAGEMENT: True,
+            CAPABILITIES.MAX_PRIMARY_SHARD_SIZE: True,
+        }
+
+        assert await gateway_mock_stateful.capabilities() is capabilities
+        gateway_mock_stateful._client.info.assert_called_once()
+
+    async def test_capabilities_serverless(self, gateway_mock_serverless) -> None:
+        """Test the capabilities of a serverless cluster."""
+
+        capabilities = await gateway_mock_serverless.capabilities()
+
+        assert capabilities[CAPABILITIES.SERVERLESS] is True
+        assert capabilities[CAPABILITIES.SUPPORTED] is True
+        assert capabilities[CAPABILITIES.DATASTREAM_LIFECYCLE_MANAGEMENT] is True
+        assert capabilities[CAPABILITIES.MAX_PRIMARY_SHARD_SIZE] is False
+
+    async def test_capabilities_expire(self, gateway_mock_stateful) -> None:
+        """Test that the capabilities are probed again once the cache has expired, or on request."""
+
+        with patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=1000):
+            await gateway_mock_stateful.capabilities()
+
+        with patch(
+            "custom_components.elasticsearch.es_gateway.monotonic",
+            return_value=1000 + CAPABILITIES_CACHE_TTL - 1,
+        ):
+            await gateway_mock_stateful.capabilities()
+            assert gateway_mock_stateful._client.info.call_count == 1
+
+            await gateway_mock_stateful.capabilities(refresh=True)
+            assert gateway_mock_stateful._client.info.call_count == 2
+
+        with patch(
+            "custom_components.elasticsearch.es_gateway.monotonic",
+            return_value=1000 + CAPABILITIES_CACHE_TTL * 2,
+        ):
+            await gateway_mock_stateful.capabilities()
+            assert gateway_mock_stateful._client.info.call_count == 3
+
+    async def test_async_init_probes_once(self, gateway_mock_stateful) -> None:
+        """Test that initialization retrieves the cluster info a single time."""
+
+        await gateway_mock_stateful.async_init()
+
+        gateway_mock_stateful._client.info.assert_called_once()
+
     async def test_has_security_stateful_success(self, gateway_mock_stateful):
         """Test the has_security method."""
 
@@ -437,56 +522,198 @@ class Test_Public_Functions:
             name="datastream_metrics", **index_template_definition
         )
 
-    async def test_bulk(self, gateway_mock_stateful):
-        """Test the bulk method."""
+    async def test_bulk_ndjson(self, gateway_mock_stateful):
+        """Test the bulk_ndjson method."""
+
+        body = b'{"create":{"_index":"metrics-homeassistant.counter-default"}}\n{"hass.entity.value":"1"}\n'
+
+        gateway_mock_stateful._client.bulk = mock_es_response(
+            {
+                "errors": True,
+                "items": [
+                    {"create": {"_index": "metrics-homeassistant.counter-default", "status": 201}},
+                    {
+                        "create": {
+                            "_index": "metrics-homeassistant.counter-default",
+                            "status": 400,
+                            "error": {"type": "document_parsing_exception", "reason": "failed to parse"},
+                        }
+                    },
+                ],
+            }
+        )
 
-        async def yield_doc():
-            yield AsyncMock()
-            yield AsyncMock()
-            yield AsyncMock()
+        await gateway_mock_stateful.bulk_ndjson(body=body)
 
-        async def yield_response():
-            yield (
-                True,  # OK
-                {
-                    "action": "create",
-                    "outcome": {
-                        "_index": ".ds-metrics-homeassistant.counter-default-2025.01.12-000001",
-                        "_id": "oEmJWJQB7GOvwEliMbKW",
-                        "_version": 1,
-                        "result": "created",
-                        "_shards": {"total": 2, "successful": 1, "failed": 0},
-                        "_seq_no": 0,
-                        "_primary_term": 1,
-                        "status": 201,
-                    },
-                },
-            )
+        gateway_mock_stateful._client.bulk.assert_called_once_with(operations=body)
+        gateway_mock_stateful._logger.error.assert_called_with("Failed to publish %d of %d documents", 1, 2)
 
-        with patch(
-            "custom_components.elasticsearch.es_gateway_8.async_streaming_bulk"
-        ) as mock_streaming_bulk:
-            mock_streaming_bulk.side_effect = [yield_response()]
+    async def test_bulk_ndjson_classify_outcomes(self, gateway_mock_stateful):
+        """Test that the outcome of each document is classified instead of retrying documents inline."""
 
-            await gateway_mock_stateful.bulk(actions=yield_doc())
+        line = b'{"create":{"_index":"metrics-homeassistant.counter-default"}}\n{"hass.entity.value":"1"}\n'
 
-            assert mock_streaming_bulk.call_count == 1
-            gateway_mock_stateful._logger.info.assert_called_once_with(
-                "Successfully published %d documents", 1
-            )
+        gateway_mock_stateful._client.bulk = mock_es_response(
+            {
+                "errors": True,
+                "items": [
+                    {"create": {"status": 201}},
+                    {"create": {"status": 429}},
+                    {"create": {"status": 503}},
+                    {"create": {"status": 400, "error": {"type": "document_parsing_exception"}}},
+                    {"create": {"status": 409, "error": {"type": "version_conflict_engine_exception"}}},
+                ],
+            }
+        )
 
-    async def test_bulk_nothing_to_do(self, gateway_mock_stateful):
-        """Test the bulk method."""
+        with patch("custom_components.elasticsearch.es_gateway_8.asyncio.sleep") as mock_sleep:
+            outcome = await gateway_mock_stateful.bulk_ndjson(body=line * 5)
 
-        with patch(
-            "custom_components.elasticsearch.es_gateway_8.async_streaming_bulk"
-        ) as mock_streaming_bulk:
-            await gateway_mock_stateful.bulk(actions=[])
+            mock_sleep.assert_not_called()
 
-            assert mock_streaming_bulk.call_count == 1
-            gateway_mock_stateful._logger.debug.assert_called_once_with(
-                "Publish skipped, no new events to publish."
-            )
+        gateway_mock_stateful._client.bulk.assert_called_once_with(operations=line * 5)
+
+        assert outcome == BulkOutcome(
+            succeeded=1,
+            duplicates=1,
+            retryable=[(1, {"status": 429}), (2, {"status": 503})],
+            rejected=[(3, {"status": 400, "error": {"type": "document_parsing_exception"}})],
+        )
+        gateway_mock_stateful._logger.error.assert_called_with("Failed to publish %d of %d documents", 3, 5)
+
+    async def test_bulk_ndjson_duplicates(self, gateway_mock_stateful):
+        """Test that documents which were already indexed are not reported as failures."""
+
+        line = b'{"create":{"_index":"metrics-homeassistant.counter-default"}}\n{"hass.entity.value":"1"}\n'
+
+        gateway_mock_stateful._client.bulk = mock_es_response(
+            {
+                "errors": True,
+                "items": [
+                    {"create": {"status": 201}},
+                    {"create": {"status": 409, "error": {"type": "version_conflict_engine_exception"}}},
+                ],
+            }
+        )
+
+        outcome = await gateway_mock_stateful.bulk_ndjson(body=line * 2)
+
+        assert outcome == BulkOutcome(succeeded=1, duplicates=1)
+        gateway_mock_stateful._logger.error.assert_not_called()
+        gateway_mock_stateful._logger.info.assert_called_with("Successfully published %d documents", 2)
+
+    async def test_bulk_ndjson_retry_rejected_request(self, gateway_mock_stateful):
+        """Test that a request rejected with a 429 is retried with a backoff."""
+
+        line = b'{"create":{"_index":"metrics-homeassistant.counter-default"}}\n{"hass.entity.value":"1"}\n'
+
+        gateway_mock_stateful._client.bulk = AsyncMock(
+            side_effect=[
+                elasticsearch8.ApiError(message="rejected", meta=MagicMock(status=429), body={}),
+                ObjectApiResponse(meta={}, body={"errors": False, "items": [{"create": {"status": 201}}]}),
+            ]
+        )
+
+        with patch("custom_components.elasticsearch.es_gateway_8.asyncio.sleep") as mock_sleep:
+            outcome = await gateway_mock_stateful.bulk_ndjson(body=line)
+
+            mock_sleep.assert_awaited_once_with(2)
+
+        assert gateway_mock_stateful._client.bulk.call_count == 2
+        assert outcome == BulkOutcome(succeeded=1)
+        gateway_mock_stateful._logger.info.assert_called_once_with("Successfully published %d documents", 1)
+
+    async def test_bulk_ndjson_compressed(self, gateway_mock_stateful):
+        """Test that bodies of at least the compression threshold are sent gzipped."""
+
+        small = b'{"create":{"_index":"metrics-homeassistant.counter-default"}}\n{"hass.entity.value":"1"}\n'
+        large = small * 10
+
+        gateway_mock_stateful._settings.compression_threshold = len(large)
+        gateway_mock_stateful._client.bulk = mock_es_response({"errors": False, "items": []})
+
+        compressed_client = MagicMock()
+        compressed_client.bulk = mock_es_response({"errors": False, "items": []})
+        gateway_mock_stateful._client.options = MagicMock(return_value=compressed_client)
+
+        await gateway_mock_stateful.bulk_ndjson(body=small)
+
+        gateway_mock_stateful._client.bulk.assert_called_once_with(operations=small)
+        gateway_mock_stateful._client.options.assert_not_called()
+
+        await gateway_mock_stateful.bulk_ndjson(body=large)
+
+        gateway_mock_stateful._client.options.assert_called_once_with(headers={"content-encoding": "gzip"})
+        operations = compressed_client.bulk.call_args.kwargs["operations"]
+
+        assert isinstance(operations, CompressedBody)
+        assert gzip.decompress(operations) == large
+
+        assert gateway_mock_stateful.stats() == {
+            "bulk_requests": 2,
+            "bulk_compressed_requests": 1,
+            "bulk_bytes": len(small) + len(large),
+            "bulk_bytes_on_wire": len(small) + len(operations),
+        }
+
+    async def test_bulk_ndjson_records_contact(self, gateway_mock_stateful):
+        """Test that bulk responses and failures are recorded to track the health of the connection."""
+
+        body = b'{"create":{"_index":"metrics-homeassistant.counter-default"}}\n{"hass.entity.value":"1"}\n'
+
+        gateway_mock_stateful._client.bulk = mock_es_response({"errors": False, "items": []})
+        await gateway_mock_stateful.bulk_ndjson(body=body)
+
+        assert gateway_mock_stateful._last_contact is not None
+
+        gateway_mock_stateful._client.bulk = mock_es_exception(elasticsearch8.ConnectionError)
+        with pytest.raises(CannotConnect):
+            await gateway_mock_stateful.bulk_ndjson(body=body)
+
+        assert gateway_mock_stateful._last_contact is None
+        assert gateway_mock_stateful.circuit_open() is True
+
+    @pytest.mark.parametrize(
+        ("exception", "status", "expected_exception"),
+        [
+            (elasticsearch8.ApiError, 400, ClientError),
+            (elasticsearch8.AuthenticationException, 401, AuthenticationRequired),
+            (elasticsearch8.AuthorizationException, 403, InsufficientPrivileges),
+            (elasticsearch8.ApiError, 413, ClientError),
+        ],
+        ids=["400", "401", "403", "413"],
+    )
+    async def test_bulk_ndjson_rejected_request_keeps_circuit_closed(
+        self, gateway_mock_stateful, exception, status, expected_exception
+    ):
+        """Test that a request Elasticsearch rejects is not recorded as a failure of the connection."""
+
+        body = b'{"create":{"_index":"metrics-homeassistant.counter-default"}}\n{"hass.entity.value":"1"}\n'
+
+        gateway_mock_stateful._previous_ping = True
+        gateway_mock_stateful.record_contact(success=True)
+
+        gateway_mock_stateful._client.bulk = AsyncMock(
+            side_effect=exception(message="rejected", meta=MagicMock(status=status), body={})
+        )
+
+        with pytest.raises(expected_exception):
+            await gateway_mock_stateful.bulk_ndjson(body=body)
+
+        assert gateway_mock_stateful.circuit_open() is False
+        assert gateway_mock_stateful._previous_ping is True
+
+    async def test_bulk_ndjson_nothing_to_do(self, gateway_mock_stateful):
+        """Test the bulk_ndjson method with an empty body."""
+
+        gateway_mock_stateful._client.bulk = mock_es_response({})
+
+        await gateway_mock_stateful.bulk_ndjson(body=b"")
+
+        gateway_mock_stateful._client.bulk.assert_not_called()
+        gateway_mock_stateful._logger.debug.assert_called_once_with(
+            "Publish skipped, no new events to publish."
+        )
 
     class Test_Check_Connection:
         """Tests for the check_connection method."""
@@ -533,6 +760,95 @@ class Test_Public_Functions:
             assert result is True
             gateway._logger.debug.assert_called_once_with("Connection to Elasticsearch is still available.")
 
+        async def test_check_connection_passive(self, gateway) -> None:
+            """Test that a recent successful response stands in for a ping."""
+            gateway._previous_ping = True
+            gateway.ping = AsyncMock(return_value=True)
+
+            with patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=1000):
+                gateway.record_contact(success=True)
+
+            with patch(
+                "custom_components.elasticsearch.es_gateway.monotonic",
+                return_value=1000 + PASSIVE_HEALTH_TTL - 1,
+            ):
+                assert await gateway.check_connection() is True
+                gateway.ping.assert_not_called()
+
+            with patch(
+                "custom_components.elasticsearch.es_gateway.monotonic",
+                return_value=1000 + PASSIVE_HEALTH_TTL,
+            ):
+                assert await gateway.check_connection() is True
+                gateway.ping.assert_awaited_once()
+
+        async def test_check_connection_circuit_open(self, gateway) -> None:
+            """Test that the connection is reported down without a ping until the next reconnection attempt."""
+            gateway._previous_ping = True
+            gateway.ping = AsyncMock(return_value=False)
+
+            with (
+                patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=1000),
+                patch("custom_components.elasticsearch.es_gateway.random.uniform", return_value=5) as uniform,
+            ):
+                gateway.record_contact(success=True)
+                gateway.record_contact(success=False)
+
+                uniform.assert_called_once_with(RECONNECT_BACKOFF_MIN / 2, RECONNECT_BACKOFF_MIN)
+
+            with patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=1004):
+                assert gateway.circuit_open() is True
+                assert await gateway.check_connection() is False
+                gateway.ping.assert_not_called()
+
+            with patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=1005):
+                assert gateway.circuit_open() is False
+                assert await gateway.check_connection() is False
+                gateway.ping.assert_awaited_once()
+
+            gateway._logger.error.assert_called_once_with("Connection to Elasticsearch has been lost.")
+
+        async def test_reconnect_backoff(self, gateway) -> None:
+            """Test that reconnection attempts back off exponentially up to the maximum, and reset on success."""
+
+            with patch(
+                "custom_components.elasticsearch.es_gateway.random.uniform", side_effect=lambda _, high: high
+            ):
+                backoffs = []
+                for _ in range(10):
+                    with patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=0):
+                        gateway.record_contact(success=False)
+                    backoffs.append(gateway._next_reconnect)
+
+                assert backoffs == [5, 10, 20, 40, 80, 160, 300, 300, 300, 300]
+
+                gateway.record_contact(success=True)
+                assert gateway.circuit_open() is False
+
+                with patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=0):
+                    gateway.record_contact(success=False)
+                assert gateway._next_reconnect == RECONNECT_BACKOFF_MIN
+
+        async def test_check_connection_lost_by_bulk(self, gateway) -> None:
+            """Test that a failed request reports the connection lost, and the next successful check regained."""
+            gateway._previous_ping = True
+            gateway.ping = AsyncMock(return_value=True)
+
+            with patch("custom_components.elasticsearch.es_gateway.monotonic", return_value=1000):
+                gateway.record_contact(success=False)
+
+            gateway._logger.error.assert_called_once_with("Connection to Elasticsearch has been lost.")
+
+            with patch(
+                "custom_components.elasticsearch.es_gateway.monotonic",
+                return_value=1000 + RECONNECT_BACKOFF_MIN,
+            ):
+                assert await gateway.check_connection() is True
+
+            gateway._logger.info.assert_called_once_with(
+                "Connection to Elasticsearch has been reestablished."
+            )
+
         async def test_check_connection_lost(self, gateway) -> None:
             """Test check_connection method when connection is lost."""
             gateway._previous_ping = True
@@ -616,8 +932,22 @@ class Test_Exception_Conversion:
                 elasticsearch8.ApiError(
                     message="Test Case", meta=mock_api_response_meta(status_code=400), body=None
                 ),
+                ClientError,
+                "Request rejected by Elasticsearch: 400",
+            ),
+            (
+                elasticsearch8.ApiError(
+                    message="Test Case", meta=mock_api_response_meta(status_code=429), body=None
+                ),
+                ServerError,
+                "Error in request to Elasticsearch: 429",
+            ),
+            (
+                elasticsearch8.ApiError(
+                    message="Test Case", meta=mock_api_response_meta(status_code=500), body=None
+                ),
                 ServerError,
-                "Error in request to Elasticsearch",
+                "Error in request to Elasticsearch: 500",
             ),
             (Exception(), Exception, ""),
         ],
@@ -629,7 +959,9 @@ class Test_Exception_Conversion:
             "SSLError to UntrustedCertificate",
             "ConnectionError to CannotConnect",
             "ApiError to CannotConnect",
-            "ApiError(404) to ServerError",
+            "ApiError(400) to ClientError",
+            "ApiError(429) to ServerError",
+            "ApiError(500) to ServerError",
             "Exception to Exception",
         ],
     )
@@ -1,23 +1,45 @@
 """Tests for the es_publish_pipeline module."""
 
-from datetime import UTC, datetime
-from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio
+import contextlib
+import json
+from datetime import UTC, datetime, timedelta
+from math import isfinite
+from unittest.mock import AsyncMock, MagicMock, call, patch
 
 import pytest
 from custom_components.elasticsearch import utils
-from custom_components.elasticsearch.errors import AuthenticationRequired, CannotConnect
+from custom_components.elasticsearch.const import QueueOverflowPolicy
+from custom_components.elasticsearch.encoder import Serializer
+from custom_components.elasticsearch.errors import AuthenticationRequired, CannotConnect, ClientError
+from custom_components.elasticsearch.es_bulk import (
+    BulkBodyBuilder,
+    BulkOutcome,
+    BulkRetryQueue,
+    DeadLetterSink,
+    split_items,
+)
 from custom_components.elasticsearch.es_gateway import ElasticsearchGateway
 from custom_components.elasticsearch.es_publish_pipeline import (
+    FALSE_STATES,
+    TRUE_STATES,
     EventQueue,
     Pipeline,
     PipelineSettings,
+    PollBuffer,
+    RateLimiter,
     StateChangeType,
 )
+from custom_components.elasticsearch.loop import AdaptiveInterval, LoopHandler
+from custom_components.elasticsearch.spill_queue import SpillQueue
 from elastic_transport import ApiResponseMeta
 from freezegun.api import FrozenDateTimeFactory
 from homeassistant.config_entries import ConfigEntryState
 from homeassistant.core import Event, HomeAssistant, State
+from homeassistant.helpers import device_registry, entity_registry, label_registry
+from homeassistant.helpers import state as state_helper
 from homeassistant.helpers.entity_registry import RegistryEntry
+from homeassistant.util import dt as dt_util
 from syrupy.assertion import SnapshotAssertion
 
 import tests.const as testconst
@@ -52,6 +74,12 @@ def mock_api_response_meta(status_code=200):
     )
 
 
+async def agen(items):
+    """Turn a list into an async generator."""
+    for item in items:
+        yield item
+
+
 @pytest.fixture(name="mock_queue")
 def mock_queue_fixture():
     """Return a mock queue instance."""
@@ -64,10 +92,19 @@ def queue_fixture():
     return EventQueue()
 
 
+@pytest.fixture(name="poll_buffer")
+def poll_buffer_fixture():
+    """Return a poll buffer instance."""
+    return PollBuffer()
+
+
 @pytest.fixture(name="mock_gateway")
 def mock_gateway_fixture():
     """Return a mock ElasticsearchGateway instance."""
-    return MagicMock(spec=ElasticsearchGateway)
+    gateway = MagicMock(spec=ElasticsearchGateway)
+    gateway.bulk_ndjson.return_value = BulkOutcome()
+
+    return gateway
 
 
 @pytest.fixture(name="mock_listener")
@@ -77,9 +114,11 @@ def mock_listener_fixture():
 
 
 @pytest.fixture(name="listener")
-def listener_fixture(hass, mock_queue, mock_filterer, mock_logger) -> Pipeline.Listener:
+def listener_fixture(hass, mock_queue, mock_filterer, pipeline_settings, mock_logger) -> Pipeline.Listener:
     """Return a Listener instance."""
-    return Pipeline.Listener(hass=hass, filterer=mock_filterer, queue=mock_queue, log=mock_logger)
+    return Pipeline.Listener(
+        hass=hass, filterer=mock_filterer, queue=mock_queue, settings=pipeline_settings, log=mock_logger
+    )
 
 
 @pytest.fixture(name="mock_poller")
@@ -90,11 +129,11 @@ def mock_poller_fixture():
 
 @pytest.fixture(name="poller")
 async def poller_fixture(
-    hass: HomeAssistant, pipeline_settings: PipelineSettings, mock_filterer, mock_queue, mock_logger
+    hass: HomeAssistant, pipeline_settings: PipelineSettings, mock_filterer, poll_buffer, mock_logger
 ):
     """Return a Pipeline.Poller instance."""
     return Pipeline.Poller(
-        hass=hass, settings=pipeline_settings, filterer=mock_filterer, queue=mock_queue, log=mock_logger
+        hass=hass, settings=pipeline_settings, filterer=mock_filterer, buffer=poll_buffer, log=mock_logger
     )
 
 
@@ -179,6 +218,266 @@ def mock_manager_fixture():
     return MagicMock(spec=Pipeline.Manager)
 
 
+class Test_EventQueue:
+    """Test the EventQueue class."""
+
+    @staticmethod
+    def _event(entity_id: str, value: str) -> tuple[datetime, State, StateChangeType]:
+        return (testconst.MOCK_NOON_APRIL_12TH_2023, State(entity_id, value), StateChangeType.STATE)
+
+    @staticmethod
+    def _drain(queue: EventQueue) -> list[tuple[str, str]]:
+        drained = []
+        while not queue.empty():
+            _, state, _ = queue.get_nowait()
+            drained.append((state.entity_id, state.state))
+        return drained
+
+    async def test_unbounded(self):
+        """Test that an unbounded queue never drops events."""
+        queue = EventQueue()
+
+        for i in range(100):
+            queue.put_nowait(self._event("light.light_1", str(i)))
+
+        assert queue.qsize() == 100
+        assert queue.dropped == 0
+        assert queue.coalesced == 0
+
+    async def test_drop_oldest(self):
+        """Test that the oldest event is discarded when the queue is full."""
+        queue = EventQueue(maxsize=2, overflow_policy=QueueOverflowPolicy.DROP_OLDEST)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.put_nowait(self._event("light.light_2", "2"))
+        queue.put_nowait(self._event("light.light_3", "3"))
+
+        assert queue.dropped == 1
+        assert self._drain(queue) == [("light.light_2", "2"), ("light.light_3", "3")]
+
+    async def test_on_drop(self):
+        """Test that the drop callback is called with each event the overflow policy discards."""
+        queue = EventQueue(maxsize=1, overflow_policy=QueueOverflowPolicy.DROP_OLDEST)
+        queue.on_drop = MagicMock()
+
+        dropped = self._event("light.light_1", "1")
+        queue.put_nowait(dropped)
+        queue.put_nowait(self._event("light.light_2", "2"))
+
+        queue.on_drop.assert_called_once_with(dropped)
+
+    async def test_drop_newest(self):
+        """Test that the incoming event is discarded when the queue is full."""
+        queue = EventQueue(maxsize=2, overflow_policy=QueueOverflowPolicy.DROP_NEWEST)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.put_nowait(self._event("light.light_2", "2"))
+        queue.put_nowait(self._event("light.light_3", "3"))
+
+        assert queue.dropped == 1
+        assert self._drain(queue) == [("light.light_1", "1"), ("light.light_2", "2")]
+
+    async def test_coalesce(self):
+        """Test that a pending event for the same entity is replaced when the queue is full."""
+        queue = EventQueue(maxsize=2, overflow_policy=QueueOverflowPolicy.COALESCE)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.put_nowait(self._event("light.light_2", "2"))
+        queue.put_nowait(self._event("light.light_1", "3"))
+
+        assert queue.coalesced == 1
+        assert queue.dropped == 0
+        assert self._drain(queue) == [("light.light_1", "3"), ("light.light_2", "2")]
+
+    async def test_coalesce_most_recent(self):
+        """Test that only the most recent pending event for the entity is replaced."""
+        queue = EventQueue(maxsize=3, overflow_policy=QueueOverflowPolicy.COALESCE)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.put_nowait(self._event("light.light_2", "2"))
+        queue.put_nowait(self._event("light.light_1", "3"))
+        queue.put_nowait(self._event("light.light_1", "4"))
+
+        assert queue.coalesced == 1
+        assert self._drain(queue) == [("light.light_1", "1"), ("light.light_2", "2"), ("light.light_1", "4")]
+
+    async def test_coalesce_after_get(self):
+        """Test that an event which was taken off the queue is not replaced."""
+        queue = EventQueue(maxsize=1, overflow_policy=QueueOverflowPolicy.COALESCE)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.get_nowait()
+        queue.put_nowait(self._event("light.light_2", "2"))
+        queue.put_nowait(self._event("light.light_1", "3"))
+
+        assert queue.coalesced == 0
+        assert queue.dropped == 1
+        assert self._drain(queue) == [("light.light_1", "3")]
+
+    async def test_coalesce_falls_back_to_drop_oldest(self):
+        """Test that coalescing drops the oldest event when the entity has no pending event."""
+        queue = EventQueue(maxsize=2, overflow_policy=QueueOverflowPolicy.COALESCE)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.put_nowait(self._event("light.light_2", "2"))
+        queue.put_nowait(self._event("light.light_3", "3"))
+
+        assert queue.coalesced == 0
+        assert queue.dropped == 1
+        assert self._drain(queue) == [("light.light_2", "2"), ("light.light_3", "3")]
+
+    @pytest.mark.parametrize(
+        ("overflow_policy", "expected"),
+        [
+            (QueueOverflowPolicy.DROP_OLDEST, True),
+            (QueueOverflowPolicy.DROP_NEWEST, False),
+            (QueueOverflowPolicy.COALESCE, True),
+        ],
+    )
+    async def test_offer(self, overflow_policy: QueueOverflowPolicy, expected: bool):
+        """Test that offer tells whether the incoming event was queued."""
+        queue = EventQueue(maxsize=1, overflow_policy=overflow_policy)
+
+        assert queue.offer(self._event("light.light_1", "1")) is True
+        assert queue.offer(self._event("light.light_1", "2")) is expected
+
+    async def test_high_water_mark(self):
+        """Test that the high water callback fires once when the queue grows to the mark."""
+        queue = EventQueue(high_water_mark=2)
+        queue.on_high_water = MagicMock()
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.on_high_water.assert_not_called()
+
+        queue.put_nowait(self._event("light.light_2", "2"))
+        queue.put_nowait(self._event("light.light_3", "3"))
+        queue.on_high_water.assert_called_once()
+
+    async def test_high_water_mark_rearms(self):
+        """Test that the high water callback fires again once the queue drops below the mark and refills."""
+        queue = EventQueue(high_water_mark=2)
+        queue.on_high_water = MagicMock()
+
+        for i in range(3):
+            queue.put_nowait(self._event(f"light.light_{i}", "1"))
+
+        # Still at the mark after draining one event, the callback is not repeated
+        queue.get_nowait()
+        queue.put_nowait(self._event("light.light_3", "1"))
+        assert queue.on_high_water.call_count == 1
+
+        while not queue.empty():
+            queue.get_nowait()
+
+        queue.put_nowait(self._event("light.light_1", "2"))
+        queue.put_nowait(self._event("light.light_2", "2"))
+        assert queue.on_high_water.call_count == 2
+
+    async def test_high_water_mark_when_full(self):
+        """Test that the high water callback fires when a full queue at the mark drops an event."""
+        queue = EventQueue(maxsize=2, high_water_mark=2)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.put_nowait(self._event("light.light_2", "1"))
+
+        queue.on_high_water = MagicMock()
+        queue.put_nowait(self._event("light.light_3", "1"))
+
+        queue.on_high_water.assert_called_once()
+
+    async def test_stats(self):
+        """Test the queue statistics."""
+        queue = EventQueue(maxsize=1, overflow_policy=QueueOverflowPolicy.DROP_NEWEST)
+
+        queue.put_nowait(self._event("light.light_1", "1"))
+        queue.put_nowait(self._event("light.light_1", "2"))
+
+        assert queue.stats() == {
+            "size": 1,
+            "max_size": 1,
+            "overflow_policy": "drop_newest",
+            "dropped": 1,
+            "coalesced": 0,
+        }
+
+
+class Test_PollBuffer:
+    """Test the PollBuffer class."""
+
+    async def test_latest_wins(self, poll_buffer):
+        """Test that only the newest polled state of an entity is kept."""
+        first = (testconst.MOCK_NOON_APRIL_12TH_2023, State("light.light_1", "on"), StateChangeType.NO_CHANGE)
+        other = (testconst.MOCK_NOON_APRIL_12TH_2023, State("light.light_2", "on"), StateChangeType.NO_CHANGE)
+        second = (
+            testconst.MOCK_NOON_APRIL_12TH_2023,
+            State("light.light_1", "off"),
+            StateChangeType.NO_CHANGE,
+        )
+
+        poll_buffer.put(first)
+        poll_buffer.put(other)
+        poll_buffer.put(second)
+
+        assert poll_buffer.stats() == {"size": 2, "replaced": 1}
+        assert poll_buffer.drain() == [second, other]
+        assert len(poll_buffer) == 0
+
+
+class Test_RateLimiter:
+    """Test the RateLimiter class."""
+
+    @pytest.fixture(name="clock")
+    def clock_fixture(self):
+        """Patch the monotonic clock of the rate limiter."""
+        with patch(
+            "custom_components.elasticsearch.es_publish_pipeline.monotonic", return_value=100.0
+        ) as clock:
+            yield clock
+
+    async def test_disabled(self):
+        """Test that a rate of 0 disables rate limiting."""
+        assert RateLimiter(0).enabled is False
+        assert RateLimiter(0.5).enabled is True
+
+    async def test_allow(self, clock):
+        """Test that each key has a bucket of one second worth of events which refills at the rate."""
+        limiter = RateLimiter(2)
+
+        assert [limiter.allow("sensor.a") for _ in range(3)] == [True, True, False]
+        assert limiter.allow("sensor.b") is True
+
+        clock.return_value = 100.5
+        assert [limiter.allow("sensor.a") for _ in range(2)] == [True, False]
+
+        clock.return_value = 110.0
+        assert [limiter.allow("sensor.a") for _ in range(3)] == [True, True, False]
+
+        assert limiter.stats() == {"rate": 2, "limited": 3, "top_limited": {"sensor.a": 3}}
+
+    async def test_slow_rate(self, clock):
+        """Test that a rate below one event per second still allows single events."""
+        limiter = RateLimiter(0.1)
+
+        assert [limiter.allow("sensor.a") for _ in range(2)] == [True, False]
+
+        clock.return_value = 110.0
+        assert limiter.allow("sensor.a") is True
+
+    async def test_top_limited(self, clock):
+        """Test that the keys with the most limited events are reported."""
+        limiter = RateLimiter(1)
+
+        for index in range(12):
+            for _ in range(index + 2):
+                limiter.allow(f"sensor.{index}")
+
+        top_limited = limiter.stats()["top_limited"]
+
+        assert len(top_limited) == RateLimiter.TOP_KEYS
+        assert next(iter(top_limited.items())) == ("sensor.11", 12)
+        assert "sensor.0" not in top_limited
+
+
 class Test_Filterer:
     """Test the Pipeline.Filterer class."""
 
@@ -377,6 +676,231 @@ class Test_Filterer:
 
         assert filterer.passes_filter(State(entity_id, "on"), StateChangeType.STATE) == should_pass
 
+    async def test_compiled_settings(self, filterer):
+        """Test that the filter settings are compiled into sets of values."""
+        assert filterer._change_detection_type == frozenset({StateChangeType.STATE.value})
+        assert isinstance(filterer._excluded_entities, frozenset)
+        assert isinstance(filterer._included_labels, frozenset)
+
+    async def test_verdict_cache(self, filterer, entity_id):
+        """Test that the target filters run once per entity until the registries change."""
+        filterer._passes_target_filters = MagicMock(return_value=True)
+
+        assert filterer.passes_filter(State(entity_id, "on"), StateChangeType.STATE) is True
+        assert filterer.passes_filter(State(entity_id, "off"), StateChangeType.STATE) is True
+        assert filterer.passes_filter(State(entity_id, "off"), StateChangeType.NO_CHANGE) is True
+
+        filterer._passes_target_filters.assert_called_once_with(entity_id)
+
+    async def test_verdict_cache_skips_change_detection_type(self, filterer, entity_id):
+        """Test that the change detection type is checked before the cached verdict."""
+        filterer._verdicts[entity_id] = True
+
+        assert filterer.passes_filter(State(entity_id, "on"), StateChangeType.ATTRIBUTE) is False
+
+    @pytest.fixture(name="deadband_filterer")
+    def deadband_filterer_fixture(
+        self, hass: HomeAssistant, pipeline_settings: PipelineSettings, mock_logger
+    ):
+        """Return a Pipeline.Filterer with deadbands for temperature and power sensors."""
+        pipeline_settings.deadband_device_classes = {"temperature": 0.5, "power": "10%", "humidity": "x"}
+        pipeline_settings.deadband_max_silence = 300
+
+        filterer = Pipeline.Filterer(hass=hass, settings=pipeline_settings, log=mock_logger)
+        filterer._verdicts = {"sensor.temperature": True, "sensor.power": True, "sensor.other": True}
+
+        return filterer
+
+    async def test_deadband_parsing(self, deadband_filterer):
+        """Test that thresholds are absolute numbers or percentages, and invalid thresholds are ignored."""
+        assert deadband_filterer._deadband_device_classes == {
+            "temperature": (False, 0.5),
+            "power": (True, 10),
+        }
+
+        deadband_filterer._logger.warning.assert_called_once_with(
+            "Ignoring invalid deadband threshold [%s] for [%s].", "x", "humidity"
+        )
+
+    @pytest.mark.parametrize(
+        ("entity_id", "device_class", "values", "expected"),
+        [
+            (
+                "sensor.temperature",
+                "temperature",
+                ["21.5", "21.7", "22.0", "21.6"],
+                [True, False, True, False],
+            ),
+            ("sensor.power", "power", ["100", "109", "111", "0", "0.5"], [True, False, True, True, True]),
+            ("sensor.temperature", "temperature", ["21.5", "unavailable", "21.6"], [True, True, True]),
+            ("sensor.other", "other", ["1", "1.01"], [True, True]),
+        ],
+        ids=["absolute", "percentage", "non-numeric", "no deadband"],
+    )
+    async def test_deadband(self, deadband_filterer, entity_id, device_class, values, expected):
+        """Test that numeric changes within the deadband of the last value queued are dropped."""
+        passed = []
+
+        for value in values:
+            state = State(entity_id, value, {"device_class": device_class})
+            passed.append(deadband_filterer.passes_filter(state, StateChangeType.STATE))
+
+            if passed[-1]:
+                deadband_filterer.record_queued(state, StateChangeType.STATE)
+
+        assert passed == expected
+        assert deadband_filterer.stats() == {"deadbanded": expected.count(False)}
+
+    async def test_deadband_max_silence(self, deadband_filterer):
+        """Test that a change within the deadband passes once the entity has been silent for too long."""
+        start = datetime(2023, 4, 12, 12, 0, tzinfo=UTC)
+
+        def passes(value: str, seconds: int) -> bool:
+            state = State(
+                "sensor.temperature",
+                value,
+                {"device_class": "temperature"},
+                last_changed=start + timedelta(seconds=seconds),
+            )
+            passed = deadband_filterer.passes_filter(state, StateChangeType.STATE)
+
+            if passed:
+                deadband_filterer.record_queued(state, StateChangeType.STATE)
+
+            return passed
+
+        assert passes("21.5", 0) is True
+        assert passes("21.6", 299) is False
+        assert passes("21.6", 300) is True
+        assert passes("21.7", 301) is False
+
+    async def test_deadband_compares_queued_values(self, deadband_filterer):
+        """Test that a change which passed but was never queued does not move the deadband."""
+
+        def state(value: str) -> State:
+            return State("sensor.temperature", value, {"device_class": "temperature"})
+
+        assert deadband_filterer.passes_filter(state("21.0"), StateChangeType.STATE) is True
+        deadband_filterer.record_queued(state("21.0"), StateChangeType.STATE)
+
+        # Passes the filter, but is dropped before it is queued
+        assert deadband_filterer.passes_filter(state("21.6"), StateChangeType.STATE) is True
+
+        # Within the deadband of 21.6, but not of the last value queued
+        assert deadband_filterer.passes_filter(state("21.9"), StateChangeType.STATE) is True
+
+    async def test_deadband_forgets_dropped_values(
+        self, deadband_filterer, freeze_time: FrozenDateTimeFactory
+    ):
+        """Test that a queued change which is dropped from the queue no longer moves the deadband."""
+
+        def state(value: str) -> State:
+            return State("sensor.temperature", value, {"device_class": "temperature"})
+
+        first = state("21.0")
+        assert deadband_filterer.passes_filter(first, StateChangeType.STATE) is True
+        deadband_filterer.record_queued(first, StateChangeType.STATE)
+
+        freeze_time.tick(1)
+        second = state("22.0")
+        assert deadband_filterer.passes_filter(second, StateChangeType.STATE) is True
+        deadband_filterer.record_queued(second, StateChangeType.STATE)
+
+        # Only the change the deadband compares against is forgotten
+        deadband_filterer.forget_queued(first, StateChangeType.STATE)
+        assert deadband_filterer.passes_filter(state("22.1"), StateChangeType.STATE) is False
+
+        deadband_filterer.forget_queued(second, StateChangeType.STATE)
+        assert deadband_filterer.passes_filter(state("22.1"), StateChangeType.STATE) is True
+
+    async def test_deadband_only_state_changes(self, deadband_filterer):
+        """Test that attribute changes and polled states are not deadbanded."""
+        deadband_filterer._change_detection_type = frozenset({"state", "attribute"})
+        deadband_filterer._last_values["sensor.temperature"] = (21.5, datetime.now(tz=UTC))
+
+        state = State("sensor.temperature", "21.6", {"device_class": "temperature"})
+
+        assert deadband_filterer.passes_filter(state, StateChangeType.ATTRIBUTE) is True
+        assert deadband_filterer.passes_filter(state, StateChangeType.NO_CHANGE) is True
+        assert deadband_filterer.passes_filter(state, StateChangeType.STATE) is False
+
+    async def test_deadband_labels(
+        self, hass: HomeAssistant, pipeline_settings: PipelineSettings, entity_registry
+    ):
+        """Test that label thresholds take precedence over device class thresholds."""
+        pipeline_settings.deadband_device_classes = {"temperature": 0.5}
+        pipeline_settings.deadband_labels = {"noisy": 2}
+
+        filterer = Pipeline.Filterer(hass=hass, settings=pipeline_settings)
+
+        entity_registry.async_get_or_create(
+            "sensor", "test", "temperature", original_device_class="temperature"
+        )
+        entity_registry.async_update_entity("sensor.test_temperature", labels={"noisy"})
+        entity_registry.async_get_or_create("sensor", "test", "outside", original_device_class="temperature")
+
+        assert filterer._deadband(State("sensor.test_temperature", "1")) == (False, 2)
+        assert filterer._deadband(State("sensor.test_outside", "1")) == (False, 0.5)
+        assert filterer._deadband(State("sensor.unknown", "1")) is None
+
+    async def test_verdict_cache_invalidation(self, hass: HomeAssistant, filterer):
+        """Test that registry updates invalidate the cached verdicts."""
+        await filterer.async_init()
+
+        filterer._verdicts = {"light.light_1": True, "light.light_2": False}
+
+        hass.bus.async_fire(
+            entity_registry.EVENT_ENTITY_REGISTRY_UPDATED,
+            {"action": "update", "entity_id": "light.light_1", "changes": {}},
+        )
+        await hass.async_block_till_done()
+
+        assert filterer._verdicts == {"light.light_2": False}
+
+        hass.bus.async_fire(
+            device_registry.EVENT_DEVICE_REGISTRY_UPDATED, {"action": "update", "device_id": "device"}
+        )
+        await hass.async_block_till_done()
+
+        assert filterer._verdicts == {}
+
+        filterer._verdicts = {"light.light_1": True}
+
+        hass.bus.async_fire(
+            label_registry.EVENT_LABEL_REGISTRY_UPDATED, {"action": "remove", "label_id": "label"}
+        )
+        await hass.async_block_till_done()
+
+        assert filterer._verdicts == {}
+
+    async def test_verdict_cache_renamed_entity(self, hass: HomeAssistant, filterer):
+        """Test that renaming an entity invalidates the verdicts of the old and new entity ids."""
+        await filterer.async_init()
+
+        filterer._verdicts = {"light.old": True, "light.new": False}
+
+        hass.bus.async_fire(
+            entity_registry.EVENT_ENTITY_REGISTRY_UPDATED,
+            {"action": "update", "entity_id": "light.new", "old_entity_id": "light.old", "changes": {}},
+        )
+        await hass.async_block_till_done()
+
+        assert filterer._verdicts == {}
+
+    async def test_stop(self, hass: HomeAssistant, filterer):
+        """Test that stopping the filterer stops listening for registry updates."""
+        await filterer.async_init()
+        filterer.stop()
+
+        filterer._verdicts = {"light.light_1": True}
+
+        hass.bus.async_fire(
+            device_registry.EVENT_DEVICE_REGISTRY_UPDATED, {"action": "update", "device_id": "device"}
+        )
+        await hass.async_block_till_done()
+
+        assert filterer._verdicts == {"light.light_1": True}
+
     async def test_change_detection_type_filter(self, filterer):
         """Test that a state changes are properly filtered according to the change detection type setting."""
         # Polling changes always pass the change detection filter
@@ -418,6 +942,26 @@ class Test_Manager:
         assert manager._settings == pipeline_settings
         assert manager._static_fields == {}
 
+        assert manager._queue.on_high_water == manager._publisher.flush_soon
+        assert manager._queue.on_drop == manager._forget_dropped
+
+    async def test_forget_dropped(self, manager):
+        """Test that an event dropped from the queue is no longer counted as queued for its entity."""
+        timestamp = datetime.now(tz=UTC)
+        state = State("light.light_1", "on")
+
+        manager._last_queued["light.light_1"] = timestamp + timedelta(seconds=1)
+        manager._forget_dropped((timestamp, state, StateChangeType.STATE))
+
+        # A later event of the entity is still queued
+        assert "light.light_1" in manager._last_queued
+
+        manager._last_queued["light.light_1"] = timestamp
+        manager._forget_dropped((timestamp, state, StateChangeType.STATE))
+
+        assert "light.light_1" not in manager._last_queued
+        manager._filterer.forget_queued.assert_called_with(state, StateChangeType.STATE)
+
     async def test_async_init(self, manager, config_entry, mock_loop_handler):
         """Test initialization of the manager and pipeline components."""
         manager._settings.tags = ["tag1", "tag2"]
@@ -433,6 +977,7 @@ class Test_Manager:
             "host.location": [testconst.MOCK_LOCATION_SERVER_LON, testconst.MOCK_LOCATION_SERVER_LAT],
         }
 
+        manager._filterer.async_init.assert_awaited_once()
         manager._listener.async_init.assert_awaited_once()
         manager._poller.async_init.assert_awaited_once_with(config_entry=config_entry)
         manager._publisher.async_init.assert_awaited_once_with(config_entry=config_entry)
@@ -505,6 +1050,55 @@ class Test_Manager:
         # Assert that the formatter was called
         manager._formatter.format.assert_called_once_with(event.time_fired, new_state, reason)
 
+    async def test_sip_queue_with_poll_buffer(self, manager):
+        """Test that sip_queue drains the event queue before the poll buffer."""
+
+        timestamp = testconst.MOCK_NOON_APRIL_12TH_2023
+        changed_state = State("light.light_1", "on")
+        polled_state = State("light.light_2", "off")
+
+        manager._queue.put_nowait((timestamp, changed_state, StateChangeType.STATE))
+        manager._poll_buffer.put((timestamp, polled_state, StateChangeType.NO_CHANGE))
+
+        [doc async for doc in manager.sip_queue()]
+
+        assert manager._formatter.format.call_args_list == [
+            call(timestamp, changed_state, StateChangeType.STATE),
+            call(timestamp, polled_state, StateChangeType.NO_CHANGE),
+        ]
+        assert len(manager._poll_buffer) == 0
+
+    async def test_sip_queue_with_aggregation(self, manager, freeze_time: FrozenDateTimeFactory):
+        """Test that sip_queue holds back aggregated values until their window has ended."""
+        manager._settings.aggregation_window = 60
+        manager._settings.aggregation_domains = ["sensor"]
+        manager._aggregator = Pipeline.Aggregator(hass=manager._hass, settings=manager._settings)
+        manager._formatter.format = MagicMock(side_effect=lambda *_: {})
+
+        timestamp = datetime.now(tz=UTC)
+        power = [State("sensor.power", str(value)) for value in (10, 30, 20)]
+        unavailable = State("sensor.power", "unavailable")
+        light = State("light.light_1", "on")
+
+        for state in [*power, unavailable, light]:
+            manager._queue.put_nowait((timestamp, state, StateChangeType.STATE))
+
+        assert [doc async for doc in manager.sip_queue()] == [{}, {}]
+        assert manager._formatter.format.call_args_list == [
+            call(timestamp, unavailable, StateChangeType.STATE),
+            call(timestamp, light, StateChangeType.STATE),
+        ]
+
+        manager._formatter.format.reset_mock()
+        freeze_time.tick(60)
+
+        documents = [doc async for doc in manager.sip_queue()]
+
+        manager._formatter.format.assert_called_once_with(timestamp, power[-1], StateChangeType.STATE)
+        assert len(documents) == 1
+        assert documents[0]["hass.entity.aggregation.count"] == 3
+        assert documents[0]["hass.entity.aggregation.avg"] == 20
+
     async def test_sip_queue_and_format(self, manager, formatter):
         """Test the sip_queue method of the Pipeline.Manager class."""
 
@@ -577,6 +1171,55 @@ class Test_Manager:
             "Error formatting document for entity [%s]. Skipping document.", "light.light_1"
         )
 
+    async def test_snapshot_and_format_batch(self, manager, freeze_time: FrozenDateTimeFactory):
+        """Test that a batch is drained with its entity details, then formatted with them."""
+        manager._settings.aggregation_window = 60
+        manager._settings.aggregation_domains = ["sensor"]
+        manager._aggregator = Pipeline.Aggregator(hass=manager._hass, settings=manager._settings)
+        manager._formatter.entity_details = MagicMock(side_effect=lambda entity_id: {"id": entity_id})
+        manager._formatter.format = MagicMock(side_effect=lambda *_, **__: {})
+
+        timestamp = datetime.now(tz=UTC)
+        power = State("sensor.power", "10")
+        light = State("light.light_1", "on")
+        polled = State("light.light_2", "off")
+
+        manager._queue.put_nowait((timestamp, power, StateChangeType.STATE))
+        manager._queue.put_nowait((timestamp, light, StateChangeType.STATE))
+        manager._poll_buffer.put((timestamp, polled, StateChangeType.NO_CHANGE))
+
+        assert manager.snapshot_batch() == [
+            (timestamp, light, StateChangeType.STATE, None, {"id": "light.light_1"}),
+            (timestamp, polled, StateChangeType.NO_CHANGE, None, {"id": "light.light_2"}),
+        ]
+        assert manager._queue.empty()
+        assert len(manager._poll_buffer) == 0
+
+        freeze_time.tick(60)
+
+        batch = manager.snapshot_batch()
+        manager._formatter.format.assert_not_called()
+
+        documents = manager.format_batch(batch)
+
+        manager._formatter.format.assert_called_once_with(
+            timestamp, power, StateChangeType.STATE, details={"id": "sensor.power"}
+        )
+        assert len(documents) == 1
+        assert documents[0]["hass.entity.aggregation.count"] == 1
+
+    async def test_snapshot_batch_error(self, manager):
+        """Test that events whose entity details cannot be looked up are skipped."""
+        manager._formatter.entity_details = MagicMock(side_effect=ValueError)
+        manager._queue.put_nowait(
+            (testconst.MOCK_NOON_APRIL_12TH_2023, State("light.light_1", "on"), StateChangeType.STATE)
+        )
+
+        assert manager.snapshot_batch() == []
+        manager._logger.exception.assert_called_with(
+            "Error formatting document for entity [%s]. Skipping document.", "light.light_1"
+        )
+
     async def test_reload_config_entry(self, hass, config_entry, manager, mock_loop_handler):
         """Test the reload_config_entry method of the Pipeline.Manager class."""
 
@@ -609,10 +1252,47 @@ class Test_Manager:
 
         manager._hass.config_entries.async_schedule_reload.assert_not_called()
 
+    async def test_diagnostics(self, manager):
+        """Test that the manager exposes the queue statistics."""
+        assert manager.diagnostics() == {
+            "queue": manager._queue.stats(),
+            "poll_buffer": manager._poll_buffer.stats(),
+            "listener": manager._listener.stats.return_value,
+            "filterer": manager._filterer.stats.return_value,
+            "poller": manager._poller.stats.return_value,
+            "aggregator": manager._aggregator.stats(),
+            "publisher": manager._publisher.diagnostics.return_value,
+        }
+
     async def test_stop(self, manager):
         """Ensure that stopping the manager stops active listeners."""
         manager.stop()
         manager._listener.stop.assert_called_once()
+        manager._filterer.stop.assert_called_once()
+        manager._formatter.stop.assert_called_once()
+
+    async def test_async_stop(self, manager, freeze_time: FrozenDateTimeFactory):
+        """Ensure that stopping the manager publishes the aggregation windows which are still open."""
+        manager._settings.aggregation_window = 60
+        manager._settings.aggregation_domains = ["sensor"]
+        manager._aggregator = Pipeline.Aggregator(hass=manager._hass, settings=manager._settings)
+
+        timestamp = datetime.now(tz=UTC)
+        manager._aggregator.add(timestamp, State("sensor.power", "10"), StateChangeType.STATE)
+
+        async def publish() -> None:
+            # The window has not ended, yet it is drained for publishing
+            assert [window.state.entity_id for window in manager._aggregator.flush(timestamp)] == [
+                "sensor.power"
+            ]
+
+        manager._publisher.async_stop.side_effect = publish
+
+        await manager.async_stop()
+
+        manager._publisher.async_stop.assert_awaited_once()
+        manager._listener.stop.assert_called()
+        manager._formatter.stop.assert_called_once()
 
 
 class Test_Poller:
@@ -625,7 +1305,7 @@ class Test_Poller:
             """Test the initialization of the Poller."""
 
             assert poller._hass is not None
-            assert poller._queue is not None
+            assert poller._buffer is not None
 
         async def test_async_init(self, poller: Pipeline.Poller, config_entry):
             """Test the async initialization of the Poller."""
@@ -650,6 +1330,18 @@ class Test_Poller:
 
                 loop_handler_instance.start.assert_called_once()
 
+        async def test_async_init_shards(self, poller: Pipeline.Poller, config_entry):
+            """Test that each shard is polled once per polling frequency."""
+            poller._shards = 4
+
+            with patch("custom_components.elasticsearch.es_publish_pipeline.LoopHandler") as loop_handler:
+                loop_handler.return_value.start = AsyncMock()
+                loop_handler.return_value.wait_for_first_run = AsyncMock()
+
+                await poller.async_init(config_entry=config_entry)
+
+                assert loop_handler.call_args.kwargs["frequency"] == poller._settings.polling_frequency / 4
+
     class Test_Integration_Tests:
         """Run the integration tests of the Poller class."""
 
@@ -664,7 +1356,6 @@ class Test_Poller:
         )
         async def test_poll(
             self,
-            queue,
             poller: Pipeline.Poller,
             states: list[State],
             freeze_time: FrozenDateTimeFactory,
@@ -673,9 +1364,6 @@ class Test_Poller:
             """Test polling for different quantities of states."""
             freeze_time.tick()  # use the fixture so it doesnt show type errors
 
-            # Replace the mock queue with a real queue
-            poller._queue = queue
-
             with patch.object(poller._hass, "states") as states_mock:
                 states_mock.async_all = MagicMock(return_value=states)
 
@@ -684,12 +1372,11 @@ class Test_Poller:
                 states_mock.async_all.assert_called_once()
 
                 if len(states) > 0:
-                    assert not poller._queue.empty()
+                    assert len(poller._buffer) > 0
 
                 queued_states: list[dict] = []
 
-                while not poller._queue.empty():
-                    timestamp, state, change_type = await poller._queue.get()
+                for timestamp, state, change_type in poller._buffer.drain():
                     queued_states.append(
                         {
                             "timestamp": timestamp,
@@ -699,12 +1386,160 @@ class Test_Poller:
                         },
                     )
 
-                assert poller._queue.empty()
+                assert len(poller._buffer) == 0
 
                 assert len(queued_states) == len(states)
 
                 assert queued_states == snapshot
 
+        async def test_poll_max_age(
+            self,
+            hass: HomeAssistant,
+            pipeline_settings: PipelineSettings,
+            mock_filterer,
+            poll_buffer,
+            freeze_time: FrozenDateTimeFactory,
+        ):
+            """Test that only entities without a document for the max age are polled."""
+            stale = State("light.stale", "on")
+            freeze_time.tick(timedelta(seconds=10))
+
+            pipeline_settings.polling_max_age = 300
+            last_queued: dict[str, datetime] = {}
+            poller = Pipeline.Poller(
+                hass=hass,
+                settings=pipeline_settings,
+                filterer=mock_filterer,
+                buffer=poll_buffer,
+                last_queued=last_queued,
+            )
+
+            # The listener queued an event for this entity, so it has a recent document
+            changed = State("light.changed", "on")
+            last_queued["light.changed"] = datetime.now(tz=UTC)
+
+            async def poll() -> list[str]:
+                with patch.object(poller._hass, "states") as states_mock:
+                    states_mock.async_all = MagicMock(return_value=[stale, changed])
+                    await poller.poll()
+
+                return sorted(state.entity_id for _, state, _ in poll_buffer.drain())
+
+            assert await poll() == ["light.stale"]
+
+            freeze_time.tick(timedelta(seconds=60))
+            assert await poll() == []
+
+            freeze_time.tick(timedelta(seconds=240))
+            assert await poll() == ["light.changed", "light.stale"]
+
+            assert poller.stats() == {"max_age": 300, "shards": 1, "skipped": 3}
+
+        async def test_poll_shards(
+            self, hass: HomeAssistant, pipeline_settings: PipelineSettings, mock_filterer, poll_buffer
+        ):
+            """Test that each run polls one shard, and every entity is polled once across the shards."""
+            pipeline_settings.polling_shards = 3
+            poller = Pipeline.Poller(
+                hass=hass, settings=pipeline_settings, filterer=mock_filterer, buffer=poll_buffer
+            )
+
+            states = [State(f"sensor.sensor_{i}", str(i)) for i in range(30)]
+            shards: list[set[str]] = []
+
+            with (
+                patch.object(poller._hass, "states") as states_mock,
+                patch.object(Pipeline.Poller, "shard", wraps=Pipeline.Poller.shard) as shard_mock,
+            ):
+                states_mock.async_all = MagicMock(return_value=states)
+                states_mock.get = {state.entity_id: state for state in states}.get
+
+                for _ in range(3):
+                    await poller.poll()
+                    shards.append({state.entity_id for _, state, _ in poll_buffer.drain()})
+
+                # The entities are partitioned once per polling frequency
+                assert shard_mock.call_count == len(states)
+                assert states_mock.async_all.call_count == 1
+
+                await poller.poll()
+                assert {state.entity_id for _, state, _ in poll_buffer.drain()} == shards[0]
+
+            assert all(shards)
+            assert set.union(*shards) == {state.entity_id for state in states}
+            assert sum(len(shard) for shard in shards) == len(states)
+
+            for index, shard in enumerate(shards):
+                assert all(Pipeline.Poller.shard(entity_id, 3) == index for entity_id in shard)
+
+        async def test_poll_shards_removed_entity(
+            self, hass: HomeAssistant, pipeline_settings: PipelineSettings, mock_filterer, poll_buffer
+        ):
+            """Test that an entity removed after the entities were partitioned is not polled."""
+            pipeline_settings.polling_shards = 2
+            poller = Pipeline.Poller(
+                hass=hass, settings=pipeline_settings, filterer=mock_filterer, buffer=poll_buffer
+            )
+
+            states = {f"sensor.sensor_{i}": State(f"sensor.sensor_{i}", str(i)) for i in range(10)}
+            removed = next(entity_id for entity_id in states if Pipeline.Poller.shard(entity_id, 2) == 1)
+
+            with patch.object(poller._hass, "states") as states_mock:
+                states_mock.async_all = MagicMock(return_value=list(states.values()))
+                states_mock.get = states.get
+
+                await poller.poll()
+                poll_buffer.drain()
+
+                del states[removed]
+
+                await poller.poll()
+
+            polled = {state.entity_id for _, state, _ in poll_buffer.drain()}
+
+            assert polled
+            assert removed not in polled
+            assert all(Pipeline.Poller.shard(entity_id, 2) == 1 for entity_id in polled)
+
+        async def test_poll_yields(self, poller: Pipeline.Poller):
+            """Test that polling many entities yields to the event loop between chunks."""
+            states = [State(f"sensor.sensor_{i}", str(i)) for i in range(600)]
+
+            with (
+                patch.object(poller._hass, "states") as states_mock,
+                patch("custom_components.elasticsearch.es_publish_pipeline.asyncio.sleep") as sleep,
+            ):
+                states_mock.async_all = MagicMock(return_value=states)
+
+                await poller.poll()
+
+            assert sleep.await_count == 2
+            assert len(poller._buffer) == 600
+
+        async def test_poll_max_age_dropped_events(
+            self,
+            hass: HomeAssistant,
+            pipeline_settings: PipelineSettings,
+            mock_filterer,
+            poll_buffer,
+            freeze_time: FrozenDateTimeFactory,
+        ):
+            """Test that an entity whose changes never reached the queue is still polled."""
+            pipeline_settings.polling_max_age = 300
+            poller = Pipeline.Poller(
+                hass=hass, settings=pipeline_settings, filterer=mock_filterer, buffer=poll_buffer
+            )
+            freeze_time.tick(timedelta(seconds=10))
+
+            # Changed recently, but the event was dropped by the deadband, so it was never queued
+            state = State("sensor.noisy", "20.1", last_changed=datetime.now(tz=UTC))
+
+            with patch.object(poller._hass, "states") as states_mock:
+                states_mock.async_all = MagicMock(return_value=[state])
+                await poller.poll()
+
+            assert [state.entity_id for _, state, _ in poll_buffer.drain()] == ["sensor.noisy"]
+
 
 class Test_Listener:
     """Test the Pipeline.Listener class."""
@@ -765,7 +1600,7 @@ class Test_Listener:
         await listener._handle_event(event)
 
         if change_type is None:
-            listener._queue.put_nowait.assert_not_called()
+            listener._queue.offer.assert_not_called()
             return
 
         # Ensure listener events are filtered
@@ -775,7 +1610,7 @@ class Test_Listener:
         )
 
         # Ensure the event was queued
-        listener._queue.put_nowait.assert_called_once_with(
+        listener._queue.offer.assert_called_once_with(
             (
                 event.time_fired,
                 event.data["new_state"],
@@ -783,10 +1618,141 @@ class Test_Listener:
             ),
         )
 
+    @pytest.mark.parametrize(
+        ("old_attributes", "new_attributes", "expected"),
+        [
+            ({"a": 1, "b": 2}, {"a": 1, "b": 2}, set()),
+            ({"a": 1, "b": 2}, {"a": 1, "b": 3}, {"b"}),
+            ({"a": 1}, {"a": 1, "b": 2}, {"b"}),
+            ({"a": 1, "b": 2}, {"a": 1}, {"b"}),
+        ],
+        ids=["unchanged", "changed", "added", "removed"],
+    )
+    async def test_changed_attributes(self, old_attributes, new_attributes, expected):
+        """Test finding the attributes which changed between two states."""
+        old_state = State("media_player.tv", "playing", old_attributes)
+        new_state = State("media_player.tv", "playing", new_attributes)
+
+        assert Pipeline.Listener.changed_attributes(old_state, new_state) == expected
+
+    @pytest.fixture(name="attribute_listener")
+    def attribute_listener_fixture(self, hass, mock_queue, mock_filterer, pipeline_settings, mock_logger):
+        """Return a Listener which ignores changes of the media position."""
+        pipeline_settings.ignored_attribute_changes = ["media_position", "media_position_updated_at"]
+
+        return Pipeline.Listener(
+            hass=hass, filterer=mock_filterer, queue=mock_queue, settings=pipeline_settings, log=mock_logger
+        )
+
+    def attribute_change(self, state: str, old_attributes: dict, new_attributes: dict) -> Event:
+        """Return a state_changed event for a media player."""
+        return Event(
+            "state_changed",
+            {
+                "entity_id": "media_player.tv",
+                "old_state": State("media_player.tv", "playing", old_attributes),
+                "new_state": State("media_player.tv", state, new_attributes),
+            },
+        )
+
+    async def test_ignored_attribute_changes(self, attribute_listener):
+        """Test that attribute changes limited to ignored attributes are suppressed."""
+        old_attributes = {"friendly_name": "TV", "media_title": "News", "media_position": 1}
+
+        await attribute_listener._handle_event(
+            self.attribute_change("playing", old_attributes, {**old_attributes, "media_position": 2})
+        )
+
+        attribute_listener._queue.offer.assert_not_called()
+        assert attribute_listener.stats()["suppressed"] == 1
+
+        await attribute_listener._handle_event(
+            self.attribute_change("playing", old_attributes, {**old_attributes, "media_title": "Weather"})
+        )
+        await attribute_listener._handle_event(
+            self.attribute_change("paused", old_attributes, {**old_attributes, "media_position": 2})
+        )
+
+        assert attribute_listener._queue.offer.call_count == 2
+        assert attribute_listener.stats()["suppressed"] == 1
+
+    async def test_changed_attributes_only(self, attribute_listener):
+        """Test that documents of attribute changes can carry only the changed attributes."""
+        attribute_listener._changed_attributes_only = True
+
+        old_attributes = {
+            "friendly_name": "TV",
+            "media_title": "News",
+            "volume_level": 0.5,
+            "media_position": 1,
+        }
+        event = self.attribute_change(
+            "playing", old_attributes, {**old_attributes, "volume_level": 0.6, "media_position": 2}
+        )
+
+        await attribute_listener._handle_event(event)
+
+        timestamp, state, reason = attribute_listener._queue.offer.call_args.args[0]
+
+        assert (timestamp, reason) == (event.time_fired, StateChangeType.ATTRIBUTE)
+        assert dict(state.attributes) == {"friendly_name": "TV", "volume_level": 0.6}
+        assert state.last_updated == event.data["new_state"].last_updated
+        assert state.context is event.data["new_state"].context
+
+    @pytest.mark.parametrize("queued", [True, False], ids=["queued", "dropped"])
+    async def test_last_queued(self, hass, mock_queue, mock_filterer, pipeline_settings, mock_logger, queued):
+        """Test that the time an entity was last queued is only recorded when the queue took the event."""
+        last_queued: dict[str, datetime] = {}
+        mock_queue.offer.return_value = queued
+
+        listener = Pipeline.Listener(
+            hass=hass,
+            filterer=mock_filterer,
+            queue=mock_queue,
+            settings=pipeline_settings,
+            log=mock_logger,
+            last_queued=last_queued,
+        )
+
+        event = Event(
+            "state_changed",
+            {"entity_id": "light.a", "old_state": None, "new_state": State("light.a", "on")},
+        )
+
+        await listener._handle_event(event)
+
+        assert last_queued == ({"light.a": event.time_fired} if queued else {})
+        assert mock_filterer.record_queued.call_count == (1 if queued else 0)
+
+    async def test_rate_limits(self, hass, mock_queue, mock_filterer, pipeline_settings, mock_logger):
+        """Test that events are rate limited by entity and by domain before they are queued."""
+        pipeline_settings.entity_rate_limit = 2
+        pipeline_settings.domain_rate_limit = 3
+
+        listener = Pipeline.Listener(
+            hass=hass, filterer=mock_filterer, queue=mock_queue, settings=pipeline_settings, log=mock_logger
+        )
+
+        def change(entity_id: str) -> Event:
+            return Event(
+                "state_changed",
+                {"entity_id": entity_id, "old_state": None, "new_state": State(entity_id, "on")},
+            )
+
+        with patch("custom_components.elasticsearch.es_publish_pipeline.monotonic", return_value=100.0):
+            for entity_id in ["light.a", "light.a", "light.a", "light.b", "light.b", "switch.a"]:
+                await listener._handle_event(change(entity_id))
+
+        queued = [item[1].entity_id for (item,), _ in mock_queue.offer.call_args_list]
+
+        assert queued == ["light.a", "light.a", "light.b", "switch.a"]
+        assert listener.stats()["entity_rate_limit"]["top_limited"] == {"light.a": 1}
+        assert listener.stats()["domain_rate_limit"]["top_limited"] == {"light": 1}
+
+
+class Test_Publisher:
+    """Test the Pipeline.Publisher class."""
 
-class Test_Publisher:
-    """Test the Pipeline.Publisher class."""
-
     @pytest.fixture(name="mock_document")
     def mock_document_fixture(self):
         """Return a mock entity document without ES action metadata."""
@@ -814,72 +1780,98 @@ class Test_Publisher:
         assert publisher._settings == pipeline_settings
         assert publisher._logger == mock_logger
 
-    async def test_format_datastream_name(self, publisher):
-        """Test formatting a datastream name."""
-        datastream_type = "metrics"
-        dataset = "homeassistant.light"
-        namespace = "default"
+    @pytest.fixture(name="bulk_lines")
+    def bulk_lines_fixture(self, mock_document):
+        """Return the NDJSON lines expected for the mock document."""
+        return [
+            b'{"create":{"_index":"metrics-homeassistant.light-default"}}\n',
+            Serializer().dumps(mock_document) + b"\n",
+        ]
 
-        datastream_name = publisher._format_datastream_name(datastream_type, dataset, namespace)
-        assert datastream_name == "metrics-homeassistant.light-default"
+    class Test_Publishing:
+        """Run the integration tests for publishing."""
 
-        # Now test the LRU Cache
-        publisher._format_datastream_name.cache_clear()
+        @pytest.fixture(autouse=True)
+        def populate_documents(self, publisher, mock_document):
+            """Populate the documents for publishing tests."""
+            documents = [mock_document, mock_document, mock_document]
 
-        datastream_name = publisher._format_datastream_name(datastream_type, dataset, namespace)
-        assert datastream_name == "metrics-homeassistant.light-default"
+            async def sip_queue():
+                for document in documents:
+                    yield document
 
-        assert publisher._format_datastream_name.cache_info().misses == 1
+            publisher._manager.sip_queue = MagicMock(side_effect=sip_queue)
 
-        datastream_name = publisher._format_datastream_name(datastream_type, dataset, namespace)
-        assert datastream_name == "metrics-homeassistant.light-default"
+            return documents
 
-        assert publisher._format_datastream_name.cache_info().hits == 1
+        async def test_publish(self, publisher, bulk_lines):
+            """Ensure publish translates to a pre-serialized ES Bulk request."""
+            await publisher.publish()
 
-    async def test_add_action_and_meta_data(self, publisher, mock_document):
-        """Test converting document to an elasticsearch bulk action."""
+            # Assert that the bulk method of the gateway was called with the serialized documents
+            publisher._gateway.bulk_ndjson.assert_called_once_with(body=b"".join(bulk_lines * 3))
 
-        async def yield_doc():
-            yield mock_document
+            assert publisher._manager.reload_config_entry.call_count == 0
+            assert publisher._gateway.check_connection.call_count == 1
 
-        async for action in publisher._add_action_and_meta_data(iterable=yield_doc()):
-            assert action == {
-                "_op_type": "create",
-                "_index": "metrics-homeassistant.light-default",
-                "_source": mock_document,
-            }
+        async def test_publish_chunks(self, publisher, bulk_lines):
+            """Ensure large batches are split across multiple bulk requests."""
+            publisher._bulk_builder = BulkBodyBuilder(chunk_size=2)
 
-    class Test_Publishing:
-        """Run the integration tests for publishing."""
+            await publisher.publish()
 
-        @pytest.fixture(autouse=True)
-        def populate_documents(self, publisher, mock_document):
-            """Populate the documents for publishing tests."""
-            iterable = [mock_document, mock_document, mock_document]
+            assert publisher._gateway.bulk_ndjson.call_args_list == [
+                call(body=b"".join(bulk_lines * 2)),
+                call(body=b"".join(bulk_lines)),
+            ]
 
-            publisher._add_action_and_meta_data = MagicMock(side_effect=[iterable])
+        async def test_publish_concurrently(self, publisher, mock_document):
+            """Ensure each lane is published as its own bulk request when several requests may be in flight."""
+            publisher._settings.bulk_max_in_flight = 2
 
-            return iterable
+            documents = [
+                {**mock_document, "hass.entity.id": entity_id}
+                for entity_id in ["light.a", "light.b", "light.c", "light.d"] * 2
+            ]
+            publisher._manager.sip_queue = MagicMock(return_value=agen(documents))
 
-        async def test_publish(self, publisher, populate_documents):
-            """Ensure publish translates to an ES Bulk action."""
             await publisher.publish()
 
-            # Assert that the bulk method of the gateway was called with the correct arguments
-            publisher._gateway.bulk.assert_called_once_with(
-                actions=populate_documents,
-            )
+            bodies = [kwargs["body"] for _, kwargs in publisher._gateway.bulk_ndjson.call_args_list]
+            lanes = {BulkBodyBuilder.lane(document, lanes=2) for document in documents}
 
-            assert publisher._manager.reload_config_entry.call_count == 0
-            assert publisher._gateway.check_connection.call_count == 1
+            assert len(bodies) == len(lanes)
+            for lane in lanes:
+                assert (
+                    b"".join(
+                        b"".join(publisher._bulk_builder.to_lines(document))
+                        for document in documents
+                        if BulkBodyBuilder.lane(document, lanes=2) == lane
+                    )
+                    in bodies
+                )
+
+        async def test_publish_nothing_to_do(self, publisher):
+            """Ensure no bulk request is made when there are no documents."""
+
+            async def sip_queue():
+                return
+                yield
+
+            publisher._manager.sip_queue = MagicMock(side_effect=sip_queue)
+
+            await publisher.publish()
+
+            publisher._gateway.bulk_ndjson.assert_not_called()
+            publisher._logger.debug.assert_called_with("Publish skipped, no new events to publish.")
 
         @pytest.mark.parametrize(
             ("method", "side_effect", "message", "bulk_call_count", "reload_call_count"),
             [
                 ("check_connection", [False], None, 0, 0),
                 ("check_connection", AuthenticationRequired(), None, 0, 1),
-                ("bulk", CannotConnect(), "Connection error in publishing loop.", 1, 0),
-                ("bulk", Exception(), "Unknown error while publishing documents.", 1, 0),
+                ("bulk_ndjson", CannotConnect(), "Connection error in publishing loop.", 1, 0),
+                ("bulk_ndjson", Exception(), "Unknown error while publishing documents.", 1, 0),
             ],
             ids=[
                 "Check connection fails; skip bulk",
@@ -897,24 +1889,24 @@ class Test_Publisher:
 
                 publisher._logger.error.assert_called_once_with(message) if message else None
 
-                assert publisher._gateway.bulk.call_count == bulk_call_count
+                assert publisher._gateway.bulk_ndjson.call_count == bulk_call_count
                 assert publisher._manager.reload_config_entry.call_count == reload_call_count
 
         async def test_publish_check_connection_fail(self, publisher):
             """Ensure that we avoid calling bulk if connection checking fails."""
             with patch.object(publisher._gateway, "check_connection", return_value=False):
                 await publisher.publish()
-                publisher._gateway.bulk.assert_not_called()
+                publisher._gateway.bulk_ndjson.assert_not_called()
 
         async def test_publish_bulk_connection_error(self, publisher):
             """Ensure that we gracefully handle connection errors from the ES Bulk request."""
-            with patch.object(publisher._gateway, "bulk", side_effect=CannotConnect):
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=CannotConnect):
                 await publisher.publish()
                 publisher._logger.error.assert_called_once_with("Connection error in publishing loop.")
 
         async def test_publish_unknown_error(self, publisher):
             """Ensure we gracefully handle unknown errors."""
-            with patch.object(publisher._gateway, "bulk", side_effect=Exception):
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=Exception):
                 await publisher.publish()
                 publisher._logger.error.assert_called_once_with("Unknown error while publishing documents.")
 
@@ -924,6 +1916,537 @@ class Test_Publisher:
                 await publisher.publish()
                 publisher._manager.reload_config_entry.assert_called_once()
 
+        async def test_async_stop(self, publisher, bulk_lines):
+            """Ensure stopping the publisher stops its loop and publishes the documents which are left."""
+            publisher._loop = MagicMock(spec=LoopHandler)
+
+            await publisher.async_stop()
+
+            publisher._loop.stop.assert_called_once()
+            publisher._gateway.bulk_ndjson.assert_called_once_with(body=b"".join(bulk_lines * 3))
+
+        async def test_async_stop_waits_for_publish(self, publisher):
+            """Ensure the final publish on stop starts once the publish which is running has finished."""
+            publisher._loop = MagicMock(spec=LoopHandler)
+
+            running = 0
+            overlapped = False
+            started = asyncio.Event()
+            release = asyncio.Event()
+
+            async def publish() -> None:
+                nonlocal running, overlapped
+
+                overlapped = overlapped or running > 0
+                running += 1
+                started.set()
+
+                await release.wait()
+                running -= 1
+
+            with patch.object(publisher, "_publish", side_effect=publish) as publish_mock:
+                in_flight = asyncio.create_task(publisher.publish())
+                await started.wait()
+
+                stopping = asyncio.create_task(publisher.async_stop())
+                await asyncio.sleep(0)
+
+                assert publish_mock.await_count == 1
+
+                release.set()
+                await asyncio.gather(in_flight, stopping)
+
+            assert publish_mock.await_count == 2
+            assert overlapped is False
+
+        async def test_async_stop_not_started(self, publisher):
+            """Ensure nothing is published on stop when publishing never started."""
+            await publisher.async_stop()
+
+            publisher._gateway.bulk_ndjson.assert_not_called()
+
+    class Test_Format_In_Executor:
+        """Run the tests for formatting and serializing documents in an executor."""
+
+        @pytest.fixture(autouse=True)
+        def batch(self, publisher, mock_document):
+            """Enable formatting in an executor and feed the publisher a batch of three documents."""
+            publisher._settings.format_in_executor = True
+
+            batch = [
+                (
+                    testconst.MOCK_NOON_APRIL_12TH_2023,
+                    State("light.living_room", "on"),
+                    StateChangeType.STATE,
+                    None,
+                    {},
+                )
+            ] * 3
+
+            publisher._manager.snapshot_batch = MagicMock(return_value=batch)
+            publisher._manager.format_batch = MagicMock(return_value=[mock_document] * 3)
+
+            return batch
+
+        async def test_publish(self, publisher, batch, bulk_lines):
+            """Ensure the batch is formatted and serialized in the executor and sent from the event loop."""
+            with patch.object(
+                publisher._hass, "async_add_executor_job", wraps=publisher._hass.async_add_executor_job
+            ) as executor_job:
+                await publisher.publish()
+
+            executor_job.assert_called_once_with(publisher._build_chunks, batch, 1)
+            publisher._manager.format_batch.assert_called_once_with(batch)
+            publisher._manager.sip_queue.assert_not_called()
+            publisher._gateway.bulk_ndjson.assert_called_once_with(body=b"".join(bulk_lines * 3))
+
+        async def test_publish_nothing_to_do(self, publisher):
+            """Ensure the executor is not used when there is nothing to publish."""
+            publisher._manager.snapshot_batch.return_value = []
+
+            with patch.object(publisher._hass, "async_add_executor_job") as executor_job:
+                await publisher.publish()
+
+            executor_job.assert_not_called()
+            publisher._gateway.bulk_ndjson.assert_not_called()
+
+        async def test_publish_connection_error(self, publisher):
+            """Ensure the chunks of a batch that were not sent are accounted for after a connection error."""
+            publisher._bulk_builder = BulkBodyBuilder(chunk_size=1)
+
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=CannotConnect):
+                await publisher.publish()
+
+                publisher._gateway.bulk_ndjson.assert_called_once()
+
+            publisher._logger.warning.assert_called_once_with(
+                "Discarding %d documents that were not published.", 3
+            )
+
+        async def test_spill_when_connection_unavailable(self, publisher, batch, bulk_lines):
+            """Ensure documents spilled to disk are formatted and serialized in the executor."""
+            publisher._spill_queue = AsyncMock(spec=SpillQueue)
+
+            with (
+                patch.object(publisher._gateway, "check_connection", return_value=False),
+                patch.object(
+                    publisher._hass, "async_add_executor_job", wraps=publisher._hass.async_add_executor_job
+                ) as executor_job,
+            ):
+                await publisher.publish()
+
+            executor_job.assert_called_once_with(publisher._build_chunks, batch, 1)
+            publisher._manager.sip_queue.assert_not_called()
+            publisher._spill_queue.append.assert_awaited_once_with(bulk_lines * 3)
+
+    class Test_Retry:
+        """Run the tests for requeueing and dead-lettering the documents rejected by Elasticsearch."""
+
+        @pytest.fixture(autouse=True)
+        def documents(self, publisher, mock_document):
+            """Feed the publisher three documents for different entities."""
+            documents = [
+                {**mock_document, "hass.entity.id": entity_id}
+                for entity_id in ["light.a", "light.b", "light.c"]
+            ]
+            publisher._manager.sip_queue = MagicMock(side_effect=lambda: agen(documents))
+            publisher._retry_queue = BulkRetryQueue(backoff=0)
+
+            return documents
+
+        async def test_requeue_and_dead_letter(self, publisher, documents):
+            """Ensure retryable documents are requeued and the others are dead-lettered."""
+            publisher._gateway.bulk_ndjson.return_value = BulkOutcome(
+                succeeded=1,
+                retryable=[(1, {"status": 429})],
+                rejected=[(2, {"status": 400, "error": {"type": "document_parsing_exception"}})],
+            )
+
+            await publisher.publish()
+
+            assert publisher._retry_queue.pop_due() == [(1, *publisher._bulk_builder.to_lines(documents[1]))]
+            assert publisher._dead_letters.stats() == {
+                "documents": 1,
+                "errors": {"document_parsing_exception": 1},
+                "entities": {"light.c": 1},
+            }
+            publisher._logger.warning.assert_called_once_with(
+                "Requeued %d documents rejected with a retryable error.", 1
+            )
+
+        async def test_retry_before_publishing(self, publisher, documents):
+            """Ensure documents due to be retried are sent, with their attempts, before new documents."""
+            publisher._manager.sip_queue = MagicMock(side_effect=lambda: agen([]))
+            publisher._retry_queue.add(*publisher._bulk_builder.to_lines(documents[0]), attempts=1)
+            publisher._retry_queue.add(*publisher._bulk_builder.to_lines(documents[1]), attempts=2)
+
+            publisher._gateway.bulk_ndjson.return_value = BulkOutcome(
+                succeeded=1, retryable=[(1, {"status": 503})]
+            )
+
+            await publisher.publish()
+
+            publisher._gateway.bulk_ndjson.assert_awaited_once_with(
+                body=b"".join(
+                    b"".join(publisher._bulk_builder.to_lines(document)) for document in documents[:2]
+                )
+            )
+            assert publisher._retry_queue.pop_due() == [(3, *publisher._bulk_builder.to_lines(documents[1]))]
+            assert publisher._interval.failures == 0
+
+        async def test_retries_exhausted(self, publisher, documents):
+            """Ensure documents which run out of attempts are dead-lettered."""
+            publisher._manager.sip_queue = MagicMock(side_effect=lambda: agen([]))
+            publisher._retry_queue = BulkRetryQueue(max_attempts=2, backoff=0)
+            publisher._retry_queue.add(*publisher._bulk_builder.to_lines(documents[0]), attempts=1)
+
+            publisher._gateway.bulk_ndjson.return_value = BulkOutcome(retryable=[(0, {"status": 429})])
+
+            await publisher.publish()
+
+            assert len(publisher._retry_queue) == 0
+            assert publisher._dead_letters.stats() == {
+                "documents": 1,
+                "errors": {"429": 1},
+                "entities": {"light.a": 1},
+            }
+
+        async def test_retry_connection_error(self, publisher, documents):
+            """Ensure documents which could not be retried stay in the retry queue."""
+            publisher._retry_queue.add(*publisher._bulk_builder.to_lines(documents[0]), attempts=1)
+
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=CannotConnect):
+                await publisher.publish()
+
+            assert publisher._retry_queue.pop_due() == [(1, *publisher._bulk_builder.to_lines(documents[0]))]
+            publisher._logger.error.assert_called_once_with("Connection error in publishing loop.")
+
+        async def test_dead_letter_datastream(self, publisher, documents):
+            """Ensure rejected documents are published to the dead letter datastream after the batch."""
+            publisher._dead_letters = DeadLetterSink(log=publisher._logger, datastream=True)
+
+            error = {"status": 400, "error": {"type": "document_parsing_exception", "reason": "bad value"}}
+            publisher._gateway.bulk_ndjson.side_effect = [
+                BulkOutcome(succeeded=2, rejected=[(2, error)]),
+                BulkOutcome(succeeded=1),
+            ]
+
+            await publisher.publish()
+
+            assert publisher._gateway.bulk_ndjson.await_count == 2
+
+            action, source = split_items(publisher._gateway.bulk_ndjson.await_args.kwargs["body"])[0]
+            dead_letter = json.loads(source)
+
+            assert json.loads(action) == {"create": {"_index": "metrics-homeassistant.dead_letter-default"}}
+            assert dead_letter["hass.entity.id"] == "light.c"
+            assert dead_letter["hass.entity.rejections"] == 1
+            assert dead_letter["error.type"] == "document_parsing_exception"
+            assert dead_letter["error.message"] == "bad value"
+            assert json.loads(dead_letter["event.original"]) == json.loads(
+                publisher._bulk_builder.to_lines(documents[2])[1]
+            )
+            assert publisher._dead_letters.stats()["pending"] == 0
+
+        async def test_dead_letter_datastream_failures(self, publisher, documents):
+            """Ensure dead letters are kept when they cannot be published, unless the datastream rejects them."""
+            publisher._manager.sip_queue = MagicMock(side_effect=lambda: agen([]))
+            publisher._dead_letters = DeadLetterSink(log=publisher._logger, datastream=True)
+
+            for document in documents:
+                publisher._dead_letters.add(publisher._bulk_builder.to_lines(document)[1], {"status": 400})
+
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=CannotConnect):
+                await publisher.publish()
+
+            assert publisher._dead_letters.stats()["pending"] == 3
+
+            publisher._gateway.bulk_ndjson.return_value = BulkOutcome(
+                succeeded=1, retryable=[(1, {"status": 429})], rejected=[(2, {"status": 400})]
+            )
+
+            await publisher.publish()
+
+            assert [document["hass.entity.id"] for document in publisher._dead_letters.pop_documents()] == [
+                "light.b"
+            ]
+            publisher._logger.warning.assert_called_once_with(
+                "Discarding %d documents rejected by the dead letter datastream.", 1
+            )
+
+    class Test_Adaptive_Interval:
+        """Run the tests for adapting the publish frequency to the outcome of each publish."""
+
+        @pytest.fixture(autouse=True)
+        def loop(self, publisher, pipeline_settings, mock_document):
+            """Attach a mock publish loop and allow the frequency to stretch to four times the base."""
+            publisher._interval = AdaptiveInterval(
+                frequency=pipeline_settings.publish_frequency, max_frequency=240
+            )
+            publisher._loop = MagicMock(spec=LoopHandler)
+            publisher._loop.frequency = pipeline_settings.publish_frequency
+
+            publisher._manager.sip_queue = MagicMock(return_value=agen([mock_document]))
+
+            return publisher._loop
+
+        async def test_success_keeps_frequency(self, publisher, loop):
+            """Ensure the frequency is unchanged while documents are being published."""
+            await publisher.publish()
+
+            loop.reschedule.assert_not_called()
+
+        async def test_idle_stretches_frequency(self, publisher, loop):
+            """Ensure the frequency is stretched when there is nothing to publish."""
+            publisher._manager.sip_queue = MagicMock(return_value=agen([]))
+
+            await publisher.publish()
+
+            loop.reschedule.assert_called_once_with(120)
+
+        @pytest.mark.parametrize(
+            ("method", "side_effect"),
+            [("check_connection", [False]), ("bulk_ndjson", CannotConnect())],
+            ids=["Connection unavailable", "Bulk raises CannotConnect"],
+        )
+        async def test_failure_backs_off(self, publisher, loop, method, side_effect):
+            """Ensure the frequency backs off exponentially while Elasticsearch is unreachable."""
+            with patch.object(publisher._gateway, method, side_effect=side_effect):
+                await publisher.publish()
+
+            loop.reschedule.assert_called_once_with(120)
+            assert publisher._interval.backing_off is True
+
+        async def test_flush_soon(self, publisher, loop):
+            """Ensure a flush runs the publish loop early."""
+            publisher.flush_soon()
+
+            loop.run_soon.assert_called_once()
+
+        async def test_flush_soon_while_backing_off(self, publisher, loop):
+            """Ensure a flush does not cut a backoff short."""
+            publisher._interval.failure()
+
+            publisher.flush_soon()
+
+            loop.run_soon.assert_not_called()
+
+    class Test_Spill_To_Disk:
+        """Run the tests for spilling documents to disk while Elasticsearch is unavailable."""
+
+        @pytest.fixture(autouse=True)
+        def spill_queue(self, publisher, mock_document):
+            """Enable the spill queue and feed the publisher a single document."""
+
+            async def sip_queue():
+                yield mock_document
+
+            # Share one generator across calls, the queue is empty once it has been sipped
+            publisher._manager.sip_queue = MagicMock(return_value=sip_queue())
+            publisher._spill_queue = AsyncMock(spec=SpillQueue)
+            publisher._spill_queue.empty = MagicMock(return_value=True)
+
+            return publisher._spill_queue
+
+        async def test_spill_when_connection_unavailable(self, publisher, spill_queue, bulk_lines):
+            """Ensure documents are spilled to disk instead of waiting in memory when the connection is down."""
+            with patch.object(publisher._gateway, "check_connection", return_value=False):
+                await publisher.publish()
+
+            spill_queue.append.assert_awaited_once_with(bulk_lines)
+            publisher._gateway.bulk_ndjson.assert_not_called()
+
+        async def test_replay_before_publishing(self, publisher, spill_queue, bulk_lines):
+            """Ensure spilled documents are replayed before new documents are published."""
+            spill_queue.empty.return_value = False
+
+            await publisher.publish()
+
+            spill_queue.replay.assert_awaited_once_with(publisher._bulk)
+            publisher._gateway.bulk_ndjson.assert_called_once_with(body=b"".join(bulk_lines))
+            spill_queue.append.assert_not_called()
+
+        async def test_spill_on_bulk_connection_error(self, publisher, spill_queue, bulk_lines):
+            """Ensure documents in a failed bulk request are spilled to disk."""
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=CannotConnect):
+                await publisher.publish()
+
+            spill_queue.append.assert_awaited_once_with(bulk_lines)
+
+        async def test_dead_letter_rejected_bulk_request(self, publisher, spill_queue, bulk_lines):
+            """Ensure documents of a bulk request Elasticsearch rejects as a whole are not spilled to disk."""
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=ClientError("Too large")):
+                await publisher.publish()
+
+            spill_queue.append.assert_not_called()
+            assert publisher._dead_letters.stats()["errors"] == {"request_rejected": 1}
+            assert publisher._interval.failures == 0
+
+        async def test_spill_unsent_lanes_on_bulk_connection_error(
+            self, publisher, spill_queue, mock_document
+        ):
+            """Ensure documents of every lane are spilled when a concurrent bulk request fails."""
+            publisher._settings.bulk_max_in_flight = 2
+
+            documents = [{**mock_document, "hass.entity.id": f"light.{i}"} for i in range(10)]
+            publisher._manager.sip_queue = MagicMock(return_value=agen(documents))
+
+            with patch.object(publisher._gateway, "bulk_ndjson", side_effect=CannotConnect):
+                await publisher.publish()
+
+            assert len(spill_queue.append.await_args.args[0]) == 20
+
+        async def test_spill_polled_states_on_bulk_connection_error(
+            self, hass, publisher, spill_queue, manager, mock_document
+        ):
+            """Ensure no polled state is lost when a bulk request fails after the first chunk was sent."""
+            timestamp = testconst.MOCK_NOON_APRIL_12TH_2023
+
+            for i in range(1200):
+                manager.poll_buffer.put((timestamp, State(f"light.{i}", "on"), StateChangeType.NO_CHANGE))
+
+            manager._formatter.format.side_effect = lambda time, state, reason: {
+                **mock_document,
+                "hass.entity.id": state.entity_id,
+            }
+
+            publisher._manager = manager
+
+            with patch.object(
+                publisher._gateway, "bulk_ndjson", side_effect=[BulkOutcome(succeeded=500), CannotConnect]
+            ):
+                await publisher.publish()
+
+            spilled = spill_queue.append.await_args.args[0]
+
+            assert len(spilled) == 700 * 2
+            assert json.loads(spilled[1])["hass.entity.id"] == "light.500"
+            assert json.loads(spilled[-1])["hass.entity.id"] == "light.1199"
+            assert len(manager.poll_buffer) == 0
+
+        async def test_diagnostics(self, publisher, spill_queue):
+            """Ensure the spill queue statistics are exposed."""
+            assert publisher.diagnostics() == {
+                "interval": publisher._interval.stats(),
+                "retry_queue": publisher._retry_queue.stats(),
+                "dead_letters": publisher._dead_letters.stats(),
+                "spill_queue": spill_queue.stats.return_value,
+            }
+
+
+@pytest.fixture(name="aggregator")
+def aggregator_fixture(hass: HomeAssistant, pipeline_settings: PipelineSettings, mock_logger):
+    """Return a Pipeline.Aggregator instance which aggregates sensors over a minute."""
+    pipeline_settings.aggregation_window = 60
+    pipeline_settings.aggregation_domains = ["sensor"]
+
+    return Pipeline.Aggregator(hass=hass, settings=pipeline_settings, log=mock_logger)
+
+
+class Test_Aggregator:
+    """Test the Pipeline.Aggregator class."""
+
+    START = datetime(2023, 4, 12, 12, 0, tzinfo=UTC)
+
+    @pytest.mark.parametrize(
+        ("window", "domains", "labels", "enabled"),
+        [
+            (0, ["sensor"], [], False),
+            (60, [], [], False),
+            (60, ["sensor"], [], True),
+            (60, [], ["chatty"], True),
+        ],
+    )
+    async def test_init(
+        self, hass: HomeAssistant, pipeline_settings: PipelineSettings, window, domains, labels, enabled
+    ):
+        """Test that aggregation needs a window and a domain or label."""
+        pipeline_settings.aggregation_window = window
+        pipeline_settings.aggregation_domains = domains
+        pipeline_settings.aggregation_labels = labels
+
+        aggregator = Pipeline.Aggregator(hass=hass, settings=pipeline_settings)
+
+        assert aggregator._enabled is enabled
+
+    async def test_aggregates_labels(
+        self, hass: HomeAssistant, pipeline_settings: PipelineSettings, entity_registry
+    ):
+        """Test that the entities with an aggregated label are aggregated."""
+        pipeline_settings.aggregation_window = 60
+        pipeline_settings.aggregation_labels = ["chatty"]
+
+        aggregator = Pipeline.Aggregator(hass=hass, settings=pipeline_settings)
+
+        entity_registry.async_get_or_create("sensor", "test", "power")
+        entity_registry.async_update_entity("sensor.test_power", labels={"chatty"})
+        entity_registry.async_get_or_create("sensor", "test", "energy")
+
+        assert aggregator.aggregates(State("sensor.test_power", "1")) is True
+        assert aggregator.aggregates(State("sensor.test_energy", "1")) is False
+        assert aggregator.aggregates(State("sensor.unknown", "1")) is False
+
+    async def test_add(self, aggregator: Pipeline.Aggregator):
+        """Test that numeric values of aggregated entities are rolled into windows."""
+        reason = StateChangeType.STATE
+
+        assert aggregator.add(self.START, State("light.light_1", "on"), reason) is False
+        assert aggregator.add(self.START, State("sensor.power", "unavailable"), reason) is False
+        assert aggregator.add(self.START, State("sensor.power", "10"), StateChangeType.ATTRIBUTE) is False
+        assert aggregator.add(self.START, State("sensor.power", "10"), StateChangeType.NO_CHANGE) is False
+
+        states = [State("sensor.power", value) for value in ("10", "40", "-5.5")]
+
+        for offset, state in enumerate(states):
+            assert aggregator.add(self.START + timedelta(seconds=offset * 10), state, reason) is True
+
+        window = aggregator._windows["sensor.power"]
+
+        assert window.state is states[-1]
+        assert window.time == self.START + timedelta(seconds=20)
+        assert window.to_fields() == {
+            "hass.entity.aggregation.min": -5.5,
+            "hass.entity.aggregation.max": 40,
+            "hass.entity.aggregation.avg": 14.833333333333334,
+            "hass.entity.aggregation.last": -5.5,
+            "hass.entity.aggregation.count": 3,
+            "hass.entity.aggregation.start": "2023-04-12T12:00:00+00:00",
+        }
+        assert aggregator.stats() == {"window": 60, "open": 1, "aggregated": 3}
+
+    async def test_flush(self, aggregator: Pipeline.Aggregator):
+        """Test that windows are returned once they have ended."""
+        reason = StateChangeType.STATE
+
+        aggregator.add(self.START + timedelta(seconds=30), State("sensor.power", "1"), reason)
+        aggregator.add(self.START + timedelta(seconds=50), State("sensor.energy", "1"), reason)
+
+        # A value in the next window closes the current window of the entity
+        aggregator.add(self.START + timedelta(seconds=70), State("sensor.power", "2"), reason)
+
+        closed = aggregator.flush(self.START + timedelta(seconds=59))
+        assert [(window.state.entity_id, window.start) for window in closed] == [("sensor.power", self.START)]
+
+        closed = aggregator.flush(self.START + timedelta(seconds=60))
+        assert [(window.state.entity_id, window.start) for window in closed] == [
+            ("sensor.energy", self.START)
+        ]
+
+        closed = aggregator.flush(self.START + timedelta(seconds=120))
+        assert [(window.state.entity_id, window.last) for window in closed] == [("sensor.power", 2)]
+
+        assert aggregator.stats()["open"] == 0
+
+    async def test_close(self, aggregator: Pipeline.Aggregator):
+        """Test that closed windows are flushed before they have ended."""
+        aggregator.add(self.START, State("sensor.power", "1"), StateChangeType.STATE)
+
+        aggregator.close()
+
+        closed = aggregator.flush(self.START)
+        assert [(window.state.entity_id, window.last) for window in closed] == [("sensor.power", 1)]
+        assert aggregator.stats()["open"] == 0
+
 
 class Test_Formatter:
     """Test the Pipeline.Formatter class."""
@@ -947,6 +2470,16 @@ class Test_Formatter:
         )
 
         assert formatter._static_fields == static_fields
+        assert formatter._flat_static_fields == static_fields
+        assert formatter._extended_entity_details._cancel_listeners != []
+
+    async def test_stop(self, formatter):
+        """Test that stopping the Formatter stops caching extended entity details."""
+        await formatter.async_init(static_fields={})
+
+        formatter.stop()
+
+        assert formatter._extended_entity_details._cancel_listeners == []
 
     async def test_state_to_attributes(self, formatter):
         """Test converting a state to attributes."""
@@ -989,6 +2522,34 @@ class Test_Formatter:
             assert attributes == {"brightness": 255, "color_temp": 4000}
             warning.assert_called_once()
 
+    async def test_state_to_attributes_cache(self, formatter):
+        """Test that converted attributes are reused while the attributes object is unchanged."""
+        state = State("light.living_room", "on", {"brightness": 255, "colors": {"red"}})
+
+        attributes = formatter._state_to_attributes(state)
+
+        with patch.object(formatter, "_convert_attributes") as convert_attributes:
+            # Home Assistant keeps the attributes object when only the state changes
+            assert (
+                formatter._state_to_attributes(State("light.living_room", "off", state.attributes))
+                is attributes
+            )
+
+            convert_attributes.assert_not_called()
+
+        changed = State("light.living_room", "on", {"brightness": 128, "colors": {"red"}})
+
+        assert formatter._state_to_attributes(changed) == {"brightness": 128, "colors": ["red"]}
+        assert formatter._attributes["light.living_room"][0] is changed.attributes
+
+    async def test_stop_clears_attributes_cache(self, formatter):
+        """Test that stopping the Formatter clears the converted attributes."""
+        formatter._state_to_attributes(State("light.living_room", "on", {"brightness": 255}))
+
+        formatter.stop()
+
+        assert formatter._attributes == {}
+
     async def test_state_to_attributes_objects(self, formatter):
         """Test converting a state to attributes."""
         orig_attributes = {
@@ -1065,6 +2626,83 @@ class Test_Formatter:
             "time": "12:00:00",
         }
 
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "on",
+            "off",
+            "true",
+            "unknown",
+            "unavailable",
+            "tomato",
+            "",
+            "0",
+            "-1",
+            "+21.5",
+            "21.",
+            ".5",
+            " 21.5\n",
+            "1_000.5",
+            "1__000",
+            "_1",
+            "1e5",
+            "1E-05",
+            "1e",
+            "1e999",
+            "-inf",
+            "Infinity",
+            "nan",
+            "0x10",
+            "١٢.٥",
+            "1.2.3",
+            "2023",
+            "20230412",
+            "2023-04",
+            "2023-04-12",
+            "2023-04-12T12:00:00Z",
+            "2023-04-12 12:00:00.123456+02:00",
+            "2023-13-45T12:00:00",
+            "2023 kWh",
+            "12:00",
+        ],
+    )
+    async def test_coerce_value_matches_state_coercion(self, formatter, value):
+        """Test that the cached coercion agrees with coercing the state one type at a time."""
+        state = State("sensor.test", value)
+        result: bool | float | datetime | None = None
+
+        # Coerce the state with the Home Assistant helpers: as a boolean, then a finite number, then a datetime
+        if value in TRUE_STATES or value in FALSE_STATES:
+            result = value in TRUE_STATES
+        else:
+            with contextlib.suppress(ValueError):
+                number = state_helper.state_as_number(state)
+                result = number if isfinite(number) else None
+
+            if result is None:
+                with contextlib.suppress(ValueError):
+                    result = dt_util.parse_datetime(value, raise_on_error=True)
+
+        coerced_value = formatter.coerce_value(value)
+
+        if result is None:
+            assert coerced_value == {"string": value}
+        elif isinstance(result, bool):
+            assert coerced_value == {"boolean": result}
+        elif isinstance(result, datetime):
+            assert coerced_value["datetime"] == result.isoformat()
+        else:
+            assert coerced_value == {"float": result}
+
+    async def test_coerce_value_cache(self, formatter):
+        """Test that coerced values are cached by state value."""
+        formatter.coerce_value.cache_clear()
+
+        assert formatter._state_to_coerced_value(State("sensor.a", "21.5")) == {"float": 21.5}
+        assert formatter._state_to_coerced_value(State("sensor.b", "21.5")) == {"float": 21.5}
+
+        assert formatter.coerce_value.cache_info().hits == 1
+
     async def test_domain_to_datastream(self, formatter):
         """Test converting a state to a datastream."""
         datastream = formatter.domain_to_datastream(testconst.ENTITY_DOMAIN)
@@ -1114,6 +2752,16 @@ class Test_Formatter:
         with pytest.raises(ValueError):
             formatter._state_to_extended_details(state)
 
+    async def test_state_to_extended_details_given(self, formatter):
+        """Test that given entity details are used without looking up the entity in the registries."""
+        state = State(entity_id="tomato.pancakes", state="on", attributes={"brightness": 255})
+        details = {"id": "tomato.pancakes", "domain": "tomato"}
+
+        entity_details = formatter._state_to_extended_details(state, details)
+
+        assert entity_details == {**details, "friendly_name": "pancakes"}
+        assert details == {"id": "tomato.pancakes", "domain": "tomato"}
+
     @pytest.mark.parametrize(*testconst.DEVICE_MATRIX_SIMPLE)
     @pytest.mark.parametrize(*testconst.ENTITY_MATRIX_SIMPLE)
     @pytest.mark.parametrize(*testconst.ENTITY_STATE_MATRIX_SIMPLE)
@@ -2,11 +2,11 @@
 
 import asyncio
 import time
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from custom_components.elasticsearch.logger import LOGGER as BASE_LOGGER
-from custom_components.elasticsearch.loop import LoopHandler
+from custom_components.elasticsearch.loop import AdaptiveInterval, LoopHandler
 
 
 class Test_Initialization:
@@ -188,3 +188,163 @@ class Test_Loop_Handler:
             await loop_handler._wait_for_next_run()
 
         assert loop_handler._spin.call_count >= 1
+
+    async def test_loop_handler_run_soon(self):
+        """Test that run_soon makes the loop due immediately."""
+        loop_handler = LoopHandler(MagicMock(), "test_loop", 60)
+
+        loop_handler._schedule_next_run()
+        assert loop_handler._time_to_run() is False
+
+        loop_handler.run_soon()
+
+        assert loop_handler._time_to_run() is True
+
+    async def test_loop_handler_reschedule(self):
+        """Test that reschedule changes the frequency, counted from the start of the last run."""
+        loop_handler = LoopHandler(MagicMock(), "test_loop", 60)
+
+        loop_handler._schedule_next_run()
+        last_run_time = loop_handler._last_run_time
+
+        loop_handler.reschedule(120)
+
+        assert loop_handler.frequency == 120
+        assert loop_handler._next_run_time == last_run_time + 120
+
+    async def test_loop_handler_reschedule_keeps_run_soon(self):
+        """Test that a run requested with run_soon during a run is kept when the run reschedules the loop."""
+        loop_handler = LoopHandler(MagicMock(), "test_loop", 60)
+
+        loop_handler._schedule_next_run()
+        loop_handler.run_soon()
+        loop_handler.reschedule(120)
+
+        assert loop_handler.frequency == 120
+        assert loop_handler._time_to_run() is True
+
+        # Once the requested run starts, the new frequency applies
+        loop_handler._schedule_next_run()
+        loop_handler.reschedule(120)
+
+        assert loop_handler._time_to_run() is False
+
+
+class Test_AdaptiveInterval:
+    """Test the AdaptiveInterval class."""
+
+    def test_success(self):
+        """Test that a successful run resets the interval to the base frequency."""
+        interval = AdaptiveInterval(frequency=10, max_frequency=100)
+
+        interval.failure()
+        interval.idle()
+
+        assert interval.success() == 10
+        assert interval.backing_off is False
+
+    def test_failure_backs_off(self):
+        """Test that consecutive failures back off exponentially up to the maximum frequency."""
+        interval = AdaptiveInterval(frequency=10, max_frequency=100)
+
+        assert [interval.failure() for _ in range(5)] == [20, 40, 80, 100, 100]
+        assert interval.backing_off is True
+
+    def test_idle_stretches(self):
+        """Test that idle runs stretch the interval up to the maximum frequency."""
+        interval = AdaptiveInterval(frequency=10, max_frequency=50)
+
+        assert [interval.idle() for _ in range(4)] == [20, 40, 50, 50]
+        assert interval.backing_off is False
+
+    def test_fixed(self):
+        """Test that the interval is fixed without a maximum frequency."""
+        interval = AdaptiveInterval(frequency=10)
+
+        assert interval.idle() == 10
+        assert interval.failure() == 10
+
+    def test_stats(self):
+        """Test the interval statistics."""
+        interval = AdaptiveInterval(frequency=10, max_frequency=100)
+        interval.failure()
+
+        assert interval.stats() == {"frequency": 10, "max_frequency": 100, "current": 20, "failures": 1}
+
+
+class Test_Event_Driven_Loop_Handler:
+    """Test the scheduling of the LoopHandler class."""
+
+    async def test_wait_for_first_run(self):
+        """Test that waiting for the first run returns once the first run has completed."""
+        mock_func = AsyncMock()
+        loop_handler = LoopHandler(mock_func, "test_loop", 60)
+
+        loop_task = asyncio.ensure_future(loop_handler.start())
+
+        await asyncio.wait_for(loop_handler.wait_for_first_run(), timeout=1)
+
+        assert mock_func.await_count == 1
+
+        loop_handler.stop()
+        await loop_task
+
+    async def test_stop_wakes_immediately(self):
+        """Test that stopping the loop interrupts the wait for the next run."""
+        loop_handler = LoopHandler(AsyncMock(), "test_loop", 60)
+
+        loop_task = asyncio.ensure_future(loop_handler.start())
+        await loop_handler.wait_for_first_run()
+
+        loop_handler.stop()
+
+        await asyncio.wait_for(loop_task, timeout=0.5)
+        assert loop_task.exception() is None
+
+    async def test_run_soon_wakes_immediately(self):
+        """Test that run_soon interrupts the wait for the next run."""
+        mock_func = AsyncMock()
+        loop_handler = LoopHandler(mock_func, "test_loop", 60)
+
+        loop_task = asyncio.ensure_future(loop_handler.start())
+        await loop_handler.wait_for_first_run()
+
+        loop_handler.run_soon()
+        await asyncio.sleep(0.1)
+
+        assert mock_func.await_count == 2
+
+        loop_handler.stop()
+        await loop_task
+
+    async def test_sub_second_frequency(self):
+        """Test that the loop runs at frequencies below one second."""
+        mock_func = AsyncMock()
+        loop_handler = LoopHandler(mock_func, "test_loop", 0.05)
+
+        loop_task = asyncio.ensure_future(loop_handler.start())
+        await asyncio.sleep(0.32)
+        loop_handler.stop()
+        await loop_task
+
+        assert 5 <= mock_func.await_count <= 8
+
+    def test_schedule_next_run_fixed_rate(self):
+        """Test that the next run is due one period after the previous run was due, not after it ran."""
+        loop_handler = LoopHandler(MagicMock(), "test_loop", 10)
+        loop_handler._next_run_time = 100
+
+        with patch("custom_components.elasticsearch.loop.time.monotonic", return_value=100.4):
+            loop_handler._schedule_next_run()
+
+        assert loop_handler._next_run_time == 110
+
+    def test_schedule_next_run_skips_missed_runs(self):
+        """Test that runs missed while a run overran are skipped, keeping the schedule."""
+        loop_handler = LoopHandler(MagicMock(), "test_loop", 10)
+        loop_handler._next_run_time = 100
+
+        with patch("custom_components.elasticsearch.loop.time.monotonic", return_value=125):
+            loop_handler._schedule_next_run()
+
+        assert loop_handler._next_run_time == 130
@@ -0,0 +1,259 @@
+"""Tests for the spill queue."""
+
+import gzip
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+from custom_components.elasticsearch.errors import CannotConnect
+from custom_components.elasticsearch.spill_queue import SpillQueue
+from homeassistant.core import HomeAssistant
+
+
+def bulk_lines(count: int, start: int = 0) -> list[bytes]:
+    """Return action/document line pairs for the given number of documents."""
+    lines: list[bytes] = []
+    for i in range(start, start + count):
+        lines.append(b'{"create":{"_index":"metrics-homeassistant.sensor-default"}}\n')
+        lines.append(b'{"hass.entity.value":"' + str(i).encode() + b'"}\n')
+    return lines
+
+
+@pytest.fixture(name="spill_path")
+def spill_path_fixture(tmp_path: Path) -> Path:
+    """Return the directory for the spill queue segments."""
+    return tmp_path / "spill"
+
+
+@pytest.fixture(name="spill_queue")
+async def spill_queue_fixture(hass: HomeAssistant, spill_path: Path, mock_logger) -> SpillQueue:
+    """Return an initialized spill queue."""
+    spill_queue = SpillQueue(hass=hass, path=spill_path, max_size=1024 * 1024, log=mock_logger)
+    await spill_queue.async_init()
+    return spill_queue
+
+
+class Test_SpillQueue:
+    """Test the SpillQueue class."""
+
+    async def test_append_and_replay(self, spill_queue: SpillQueue, spill_path: Path):
+        """Test that spilled batches are replayed in order and removed from disk."""
+        await spill_queue.append(bulk_lines(2))
+        await spill_queue.append(bulk_lines(3, start=2))
+
+        assert spill_queue.empty() is False
+        assert spill_queue.documents == 5
+
+        send = AsyncMock()
+        await spill_queue.replay(send)
+
+        assert send.await_count == 1
+        assert send.await_args.args[0] == b"".join(bulk_lines(5))
+
+        assert spill_queue.empty() is True
+        assert spill_queue.replayed == 5
+        assert list(spill_path.iterdir()) == []
+
+    async def test_replay_failure_keeps_segment(self, spill_queue: SpillQueue):
+        """Test that a segment is kept when sending it fails."""
+        await spill_queue.append(bulk_lines(2))
+
+        with pytest.raises(CannotConnect):
+            await spill_queue.replay(AsyncMock(side_effect=CannotConnect))
+
+        assert spill_queue.documents == 2
+        assert spill_queue.replayed == 0
+
+    async def test_segments_rotate(self, hass: HomeAssistant, spill_path: Path, mock_logger):
+        """Test that a full segment is closed and replayed as its own request."""
+        spill_queue = SpillQueue(
+            hass=hass, path=spill_path, max_size=1024 * 1024, segment_size=1, log=mock_logger
+        )
+        await spill_queue.async_init()
+
+        await spill_queue.append(bulk_lines(1))
+        await spill_queue.append(bulk_lines(1, start=1))
+
+        assert spill_queue.stats()["segments"] == 2
+
+        send = AsyncMock()
+        await spill_queue.replay(send)
+
+        assert [call.args[0] for call in send.await_args_list] == [
+            b"".join(bulk_lines(1)),
+            b"".join(bulk_lines(1, start=1)),
+        ]
+
+    async def test_append_splits_at_segment_size(self, hass: HomeAssistant, spill_path: Path, mock_logger):
+        """Test that a batch is split across segments so no segment grows past the segment size."""
+        segment_size = len(b"".join(bulk_lines(2)))
+
+        spill_queue = SpillQueue(
+            hass=hass, path=spill_path, max_size=1024 * 1024, segment_size=segment_size, log=mock_logger
+        )
+        await spill_queue.async_init()
+
+        await spill_queue.append(bulk_lines(1))
+        await spill_queue.append(bulk_lines(4, start=1))
+
+        assert spill_queue.stats()["segments"] == 3
+        assert spill_queue.documents == 5
+        assert all(path.stat().st_size <= segment_size for path in spill_path.iterdir())
+
+        send = AsyncMock()
+        await spill_queue.replay(send)
+
+        assert [call.args[0] for call in send.await_args_list] == [
+            b"".join(bulk_lines(2)),
+            b"".join(bulk_lines(2, start=2)),
+            b"".join(bulk_lines(1, start=4)),
+        ]
+
+    async def test_closed_segments_are_compacted(self, hass: HomeAssistant, spill_path: Path, mock_logger):
+        """Test that closed segments are gzipped on disk and replayed as they were written."""
+        segment_size = len(b"".join(bulk_lines(10)))
+
+        spill_queue = SpillQueue(
+            hass=hass, path=spill_path, max_size=1024 * 1024, segment_size=segment_size, log=mock_logger
+        )
+        await spill_queue.async_init()
+
+        await spill_queue.append(bulk_lines(25))
+
+        assert spill_queue.stats()["segments"] == 3
+        assert spill_queue.stats()["compacted"] == 2
+        assert spill_queue.size < len(b"".join(bulk_lines(25)))
+        assert sorted(path.name for path in spill_path.iterdir()) == [
+            "segment-000000000000.ndjson.gz",
+            "segment-000000000001.ndjson.gz",
+            "segment-000000000002.ndjson",
+        ]
+
+        send = AsyncMock()
+        await spill_queue.replay(send)
+
+        assert send.await_count == 3
+        assert b"".join(call.args[0] for call in send.await_args_list) == b"".join(bulk_lines(25))
+        assert list(spill_path.iterdir()) == []
+
+    async def test_append_while_replaying(self, spill_queue: SpillQueue, spill_path: Path):
+        """Test that documents spilled while a segment is being sent go to a new segment."""
+        await spill_queue.append(bulk_lines(2))
+
+        async def send(body: bytes) -> None:
+            if send_mock.await_count == 1:
+                await spill_queue.append(bulk_lines(1, start=2))
+
+                # The segment being sent is neither appended to nor compacted
+                assert spill_queue.stats()["compacted"] == 0
+
+        send_mock = AsyncMock(side_effect=send)
+        await spill_queue.replay(send_mock)
+
+        assert [call.args[0] for call in send_mock.await_args_list] == [
+            b"".join(bulk_lines(2)),
+            b"".join(bulk_lines(1, start=2)),
+        ]
+        assert spill_queue.replayed == 3
+        assert list(spill_path.iterdir()) == []
+
+    async def test_max_size_drops_oldest(self, hass: HomeAssistant, spill_path: Path, mock_logger):
+        """Test that the oldest segments are discarded once the size cap is exceeded."""
+        segment_size = len(b"".join(bulk_lines(1)))
+
+        spill_queue = SpillQueue(
+            hass=hass,
+            path=spill_path,
+            max_size=segment_size * 2,
+            segment_size=segment_size,
+            log=mock_logger,
+        )
+        await spill_queue.async_init()
+
+        for i in range(3):
+            await spill_queue.append(bulk_lines(1, start=i))
+
+        assert spill_queue.dropped == 1
+        assert spill_queue.documents == 2
+
+        send = AsyncMock()
+        await spill_queue.replay(send)
+
+        assert [call.args[0] for call in send.await_args_list] == [
+            b"".join(bulk_lines(1, start=1)),
+            b"".join(bulk_lines(1, start=2)),
+        ]
+
+    async def test_reload_from_disk(self, hass: HomeAssistant, spill_queue: SpillQueue, spill_path: Path):
+        """Test that spilled documents survive a restart."""
+        await spill_queue.append(bulk_lines(2))
+
+        reloaded = SpillQueue(hass=hass, path=spill_path, max_size=1024 * 1024)
+        await reloaded.async_init()
+
+        assert reloaded.documents == 2
+
+        await reloaded.append(bulk_lines(1, start=2))
+
+        send = AsyncMock()
+        await reloaded.replay(send)
+
+        assert b"".join(call.args[0] for call in send.await_args_list) == b"".join(bulk_lines(3))
+
+    @pytest.mark.parametrize(
+        "torn_tail",
+        [
+            b'{"create":{"_index":"metrics-homeassistant.sensor-default"}}\n',
+            b'{"create":{"_index":"metrics-homeassistant.sensor-default"}}\n{"hass.entity',
+            b'{"create":{"_index":',
+        ],
+        ids=["action without document", "partial document", "partial action"],
+    )
+    async def test_repair_torn_write(
+        self, hass: HomeAssistant, spill_queue: SpillQueue, spill_path: Path, torn_tail: bytes
+    ):
+        """Test that an incomplete write at the end of the last segment is discarded on load."""
+        await spill_queue.append(bulk_lines(2))
+
+        segment = next(spill_path.iterdir())
+        with segment.open("ab") as file:
+            file.write(torn_tail)
+
+        reloaded = SpillQueue(hass=hass, path=spill_path, max_size=1024 * 1024)
+        await reloaded.async_init()
+
+        assert reloaded.documents == 2
+        assert segment.read_bytes() == b"".join(bulk_lines(2))
+
+    async def test_reload_interrupted_compaction(self, hass: HomeAssistant, spill_path: Path, mock_logger):
+        """Test that a compaction interrupted before or after its copy was complete loses no documents."""
+        segment_size = len(b"".join(bulk_lines(10)))
+
+        spill_queue = SpillQueue(
+            hass=hass, path=spill_path, max_size=1024 * 1024, segment_size=segment_size, log=mock_logger
+        )
+        await spill_queue.async_init()
+        await spill_queue.append(bulk_lines(25))
+
+        # The first segment was compacted but not deleted yet, the second one was still being compacted
+        for sequence in range(2):
+            compacted = spill_path / f"segment-00000000000{sequence}.ndjson.gz"
+            compacted.with_suffix("").write_bytes(gzip.decompress(compacted.read_bytes()))
+
+        (spill_path / "segment-000000000001.ndjson.gz").rename(
+            spill_path / "segment-000000000001.ndjson.gz.partial"
+        )
+
+        reloaded = SpillQueue(
+            hass=hass, path=spill_path, max_size=1024 * 1024, segment_size=segment_size, log=mock_logger
+        )
+        await reloaded.async_init()
+
+        assert reloaded.documents == 25
+        assert reloaded.stats()["compacted"] == 2
+
+        send = AsyncMock()
+        await reloaded.replay(send)
+
+        assert b"".join(call.args[0] for call in send.await_args_list) == b"".join(bulk_lines(25))
+        assert list(spill_path.iterdir()) == []
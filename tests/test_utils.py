@@ -1,6 +1,7 @@
 """Utility functions for the Elasticsearch Integration."""
 
-from custom_components.elasticsearch.utils import flatten_dict
+import pytest
+from custom_components.elasticsearch.utils import flatten_dict, flatten_into, prepare_dict
 
 
 def test_flatten_dict():
@@ -44,3 +45,27 @@ def test_flatten_dict():
     }
 
     assert flatten_dict(nested_dict) == expected_result
+
+
+@pytest.mark.parametrize(
+    "nested_dict",
+    [
+        {"a": 1, "b": {"c": 2, "d": {"e": 3}}, "f": 4},
+        {"a": None, "b": [], "c": {}, "d": {"e": None, "f": {}}, "g": ""},
+        {"a": 0, "b": False, "c": (), "d": [None], "e": {"f": [1], "g": "text"}},
+        {"a": {"b": 1}, "a.b": None},
+        {"a.b": 1, "a": {"b": 2}},
+    ],
+    ids=["nested", "empty values", "falsy values", "later empty value", "later value"],
+)
+def test_flatten_into(nested_dict):
+    """Test that flatten_into produces the same document as prepare_dict."""
+    assert list(flatten_into({}, nested_dict).items()) == list(prepare_dict(nested_dict).items())
+
+
+def test_flatten_into_target():
+    """Test that flatten_into adds to the target under the parent key."""
+    target = {"a": 1}
+
+    assert flatten_into(target, {"b": {"c": 2}, "d": None}, parent_key="x") is target
+    assert target == {"a": 1, "x.b.c": 2}